@@ -0,0 +1,244 @@
+"""Benchmarks for the parse, apply, and end-to-end stages of the pipeline.
+
+Runs entirely against `FakeClient`, so no API key is needed:
+
+    python benchmarks/run.py                  # print results
+    python benchmarks/run.py --save-baseline  # store them in baseline.json
+    python benchmarks/run.py --check          # fail on regressions
+
+Timings depend on the machine, so the baseline stores them relative to
+`calibrate` (for parsing and applying) or to the injected latency (for end to
+end runs), which are measured on the machine running the benchmarks.
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+import timeit
+from pathlib import Path
+from typing import Callable
+
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.fake_llm import FakeClient, block
+from aiterate_resume.pipeline import Pipeline, PipelineOptions
+from aiterate_resume.reflection import apply_changes
+from aiterate_resume.search_replace_format import (
+    IncrementalParser,
+    parse_search_replace_text,
+    scan_search_replace_text,
+)
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+_TASK_RE = re.compile(r"^- Did task (\d+)\.$", re.MULTILINE)
+_TYPO_RE = re.compile(r"- Did tsak (\d+)\.")
+
+
+def make_resume(num_lines: int) -> str:
+    lines = ["Jane Doe", "", "Experience", ""]
+    for i in range(num_lines):
+        lines.append(f"- Did task {i}.")
+        if i % 10 == 9:
+            lines.extend(["", f"Job {i // 10}", ""])
+    return "\n".join(lines) + "\n"
+
+
+def make_response(num_blocks: int, search_lines: int = 3) -> str:
+    return "\n".join(
+        block(
+            "\n".join(
+                f"- Did task {i * search_lines + j}." for j in range(search_lines)
+            ),
+            "\n".join(
+                f"- Completed task {i * search_lines + j}." for j in range(search_lines)
+            ),
+            f"Block {i} makes the wording stronger.",
+        )
+        for i in range(num_blocks)
+    )
+
+
+def scripted_editor(with_repair: bool) -> Callable[[list], str]:
+    """Responds with a change for every task line in the latest message. If
+    `with_repair`, the first change of each conversation misspells its
+    SEARCH section and is only fixed when reflected on."""
+
+    def respond(messages: list) -> str:
+        content = messages[-1]["content"]
+        typo = _TYPO_RE.search(content)
+        if typo:
+            number = typo.group(1)
+            return block(f"- Did task {number}.", f"- Completed task {number}.")
+
+        numbers = _TASK_RE.findall(content)
+        if not numbers:
+            return block("", "")
+
+        blocks = []
+        for i, number in enumerate(numbers):
+            search = f"- Did {'tsak' if with_repair and i == 0 else 'task'} {number}."
+            blocks.append(block(search, f"- Completed task {number}."))
+        return "\n".join(blocks)
+
+    return respond
+
+
+def best_of(repeat: int, fn: Callable[[], object]) -> float:
+    """The fastest time per call, timing enough calls at once to be
+    measurable."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def parse_by_lines(text: str) -> list:
+    parser = IncrementalParser()
+    return parser.feed(text) + parser.close()
+
+
+def calibrate(repeat: int) -> float:
+    """Seconds taken by a fixed, pure Python workload, to tell how fast this
+    machine is."""
+    words = [f"word {i}" for i in range(10000)]
+    return best_of(repeat, lambda: sorted(" ".join(words).split(), reverse=True))
+
+
+def relative(
+    results: dict[str, float], reference: float, latency: float
+) -> dict[str, float]:
+    """`results` in units that don't depend on the machine."""
+    relative_results = {}
+    for name, value in results.items():
+        if name.endswith("_mb_per_s"):
+            value *= reference
+        elif name.endswith("_ms"):
+            value /= reference * 1e3
+        elif name.endswith("_s"):
+            value /= latency
+        relative_results[name] = value
+    return relative_results
+
+
+def bench_parser(repeat: int) -> dict[str, float]:
+    parsers = {
+        # The line-by-line parser used for streamed responses, for comparison
+        "lines": parse_by_lines,
+        "scan": scan_search_replace_text,
+        "parse": parse_search_replace_text,
+    }
+
+    results = {}
+    for num_blocks in [100, 1000, 10000]:
+        text = make_response(num_blocks)
+        for name, parse in parsers.items():
+            seconds = best_of(repeat, lambda: parse(text))
+            results[f"{name}_{num_blocks}_blocks_mb_per_s"] = len(text) / seconds / 1e6
+    return results
+
+
+def bench_apply(repeat: int) -> dict[str, float]:
+    results = {}
+    for num_lines in [300, 3000, 30000]:
+        resume = make_resume(num_lines)
+        for num_blocks in [10, 100]:
+            changes = parse_search_replace_text(make_response(num_blocks))
+            changes = [c for c in changes if c.search in resume]
+            seconds = best_of(repeat, lambda: apply_changes(changes, resume))
+            results[f"apply_{num_lines}_lines_{num_blocks}_blocks_ms"] = seconds * 1e3
+    return results
+
+
+def bench_end_to_end(latency: float) -> dict[str, float]:
+    resume = make_resume(60)
+    scenarios = {
+        "clean": (False, PipelineOptions()),
+        "repair": (True, PipelineOptions()),
+        "repair_stream": (True, PipelineOptions(stream=True)),
+        "repair_compact": (True, PipelineOptions(compact_budget=2000)),
+        "repair_sharded": (True, PipelineOptions(shard_jobs=4)),
+    }
+
+    results = {}
+    for name, (with_repair, options) in scenarios.items():
+        client = FakeClient(scripted_editor(with_repair), latency=latency)
+        session = ChatSession(client, Console(quiet=True))
+        start = time.perf_counter()
+        changed = Pipeline(session, options).run(resume)
+        seconds = time.perf_counter() - start
+        if "Did task" in changed:
+            raise AssertionError(f"The {name} scenario left changes unapplied.")
+
+        results[f"e2e_{name}_s"] = seconds
+        results[f"e2e_{name}_requests"] = len(client.requests)
+    return results
+
+
+def is_regression(name: str, value: float, baseline: float, tolerance: float) -> bool:
+    if name.endswith("_requests"):
+        return value > baseline
+    if name.endswith("_mb_per_s"):
+        return value < baseline / (1 + tolerance)
+    return value > baseline * (1 + tolerance)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=(__doc__ or "").split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Seconds of latency injected into every fake request",
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with an error if a result regressed past the tolerance",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.0,
+        help="Allowed slowdown relative to the baseline (default: 1.0, so only"
+        " timings that double count as regressions, not noise)",
+    )
+    args = parser.parse_args()
+
+    results = {
+        **bench_parser(args.repeat),
+        **bench_apply(args.repeat),
+        **bench_end_to_end(args.latency),
+    }
+    relative_results = relative(results, calibrate(args.repeat), args.latency)
+
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+
+    regressions = []
+    for name, value in results.items():
+        line = f"{name:<42} {value:>12.3f}"
+        if name in baseline:
+            value = relative_results[name]
+            change = (value - baseline[name]) / baseline[name] if baseline[name] else 0
+            line += f"   vs baseline {change:+.0%}"
+            if is_regression(name, value, baseline[name], args.tolerance):
+                regressions.append(name)
+                line += "  REGRESSED"
+        print(line)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(relative_results, indent=2) + "\n")
+        print(f"Saved baseline to {args.baseline}")
+
+    if args.check and regressions:
+        print(f"{len(regressions)} results regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
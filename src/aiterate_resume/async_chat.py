@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Callable
+
+from .cache import ResponseCache
+from .chat import BaseChatSession, ChatClient, Console
+from .deadline import Deadline
+from .metrics import Metrics
+from .routing import ModelRoutes, Phase
+from .scheduler import AsyncRequestScheduler
+from .tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletion
+    from openai.types.chat.chat_completion_message_param import (
+        ChatCompletionMessageParam,
+    )
+
+
+class AsyncChatSession(BaseChatSession):
+    """A `ChatSession` for asyncio applications, built on `AsyncOpenAI`.
+
+    Requests don't hold a thread while waiting, so one event loop can drive
+    many sessions at once (see `reflection.modify_resume_async`). Cancelling
+    the task sending a request cancels the request, and `request_timeout`
+    (in seconds) is passed to the client as each request's timeout.
+    Responses can't be streamed.
+    """
+
+    def __init__(
+        self,
+        client: ChatClient,
+        console: Console,
+        cache: ResponseCache | None = None,
+        metrics: Metrics | None = None,
+        scheduler: AsyncRequestScheduler | None = None,
+        models: ModelRoutes = ModelRoutes(),
+        request_timeout: float | None = None,
+    ):
+        super().__init__(console, cache, metrics, models)
+        self.client = client
+        self.scheduler = scheduler
+        self.request_timeout = request_timeout
+
+    def fork(self, console: Console | None = None) -> AsyncChatSession:
+        """A new, empty session sharing this one's client, cache, metrics,
+        scheduler, models, and timeout."""
+        return AsyncChatSession(
+            self.client,
+            console or self.console,
+            self.cache,
+            self.metrics,
+            self.scheduler,
+            self.models,
+            self.request_timeout,
+        )
+
+    async def send_messages(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        isolated: bool = False,
+        n: int = 1,
+        choose: Callable[[ChatCompletion], int] | None = None,
+        model: str | None = None,
+        phase: Phase = Phase.INITIAL,
+        extra_params: dict[str, Any] | None = None,
+        deadline: Deadline | None = None,
+    ) -> ChatCompletion:
+        """Send messages and return the response, the same as
+        `ChatSession.send_messages`. With a `deadline`, the request's timeout
+        is the smaller of `request_timeout` and the time left.
+
+        If the request is cancelled, its messages stay in the conversation
+        without a response.
+        """
+        conversation, params = self._start_request(
+            messages, isolated, model, n, extra_params
+        )
+        with self.metrics.span(
+            "request", n=n, stream=False, phase=phase.value, model=params["model"]
+        ) as span:
+            key, response = self._cached(params, span)
+            if response is None:
+                response = await self._send(params, deadline)
+                self._received(key, response, span)
+
+        self._finish_request(conversation, response, choose)
+        return response
+
+    def _timeout(self, deadline: Deadline | None) -> dict[str, Any]:
+        if deadline is not None:
+            return {"timeout": deadline.request_timeout(self.request_timeout)}
+        if self.request_timeout is not None:
+            return {"timeout": self.request_timeout}
+        return {}
+
+    async def _send(self, params: dict[str, Any], deadline: Deadline | None) -> Any:
+        """Request a completion, through the scheduler if there is one."""
+        if self.scheduler is None:
+            return await self.client.chat.completions.create(
+                **params, **self._timeout(deadline)
+            )
+
+        return await self.scheduler.run(
+            self._counting_retries(
+                lambda: self.client.chat.completions.with_raw_response.create(
+                    **params, **self._timeout(deadline)
+                )
+            ),
+            estimate_tokens(params["messages"]),
+            self.metrics,
+            deadline,
+        )
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import glob
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import NamedTuple
+
+from .cache import ResponseCache
+from .chat import ChatClient, ChatSession, Console
+from .metrics import Metrics
+from .pipeline import Pipeline, PipelineOptions
+from .routing import ModelRoutes
+from .scheduler import RequestScheduler
+from .search_replace import describe_tier_counts
+
+
+class BatchItemResult(NamedTuple):
+    source: Path
+    output: Path
+    pipeline: Pipeline
+    error: Exception | None = None
+
+    @property
+    def requests(self) -> int:
+        "How many requests were sent for this resume, including reflections."
+        return self.pipeline.session.requests_sent
+
+    @property
+    def extra_requests(self) -> int:
+        """Requests sent beyond the first, for reflections, sections, and
+        further rounds."""
+        return max(self.requests - 1, 0)
+
+    @property
+    def retries(self) -> int:
+        "Requests the scheduler retried after a transient failure."
+        return self.pipeline.session.retries
+
+
+def expand_inputs(pattern: str) -> list[Path]:
+    """Find the resumes given by a directory or a glob pattern."""
+    path = Path(pattern)
+    if path.is_dir():
+        return sorted(child for child in path.iterdir() if child.is_file())
+
+    return sorted(
+        Path(match)
+        for match in glob.glob(pattern, recursive=True)
+        if Path(match).is_file()
+    )
+
+
+def output_paths(inputs: list[Path], out_dir: Path) -> list[Path]:
+    """Map each input to a path in `out_dir`, keeping any subdirectories
+    that are needed to tell inputs with the same name apart."""
+    if not inputs:
+        return []
+
+    root = Path(os.path.commonpath([path.parent.resolve() for path in inputs]))
+    return [out_dir / path.resolve().relative_to(root) for path in inputs]
+
+
+def process_resume(
+    client: ChatClient,
+    source: Path,
+    output: Path,
+    console: Console,
+    cache: ResponseCache | None,
+    options: PipelineOptions,
+    metrics: Metrics | None = None,
+    scheduler: RequestScheduler | None = None,
+    models: ModelRoutes = ModelRoutes(),
+) -> BatchItemResult:
+    pipeline = Pipeline(
+        ChatSession(client, console, cache, metrics, scheduler, models), options
+    )
+    try:
+        changed_contents = pipeline.run(source.read_text())
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(changed_contents)
+    except Exception as e:
+        return BatchItemResult(source, output, pipeline, e)
+
+    return BatchItemResult(source, output, pipeline)
+
+
+def run_batch(
+    client: ChatClient,
+    inputs: list[Path],
+    out_dir: Path,
+    jobs: int,
+    console: Console,
+    cache: ResponseCache | None = None,
+    options: PipelineOptions = PipelineOptions(),
+    metrics: Metrics | None = None,
+    scheduler: RequestScheduler | None = None,
+    models: ModelRoutes = ModelRoutes(),
+) -> list[BatchItemResult]:
+    """Improve every resume in `inputs`, running at most `jobs` at a time.
+
+    All resumes share `client` (and therefore its connection pool), `cache`,
+    and `metrics` and `scheduler` (if given), so every request waits in the
+    same queue for the same rate limits. Messages for individual resumes
+    aren't printed since they'd be interleaved.
+    """
+    job_console = Console(quiet=True)
+    results: list[BatchItemResult] = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(
+                process_resume,
+                client,
+                source,
+                output,
+                job_console,
+                cache,
+                options,
+                metrics,
+                scheduler,
+                models,
+            )
+            for source, output in zip(inputs, output_paths(inputs, out_dir))
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            status = "failed" if result.error else "done"
+            console.print_status(
+                f"[{len(results) + 1}/{len(inputs)}] {result.source}: {status}"
+            )
+            results.append(result)
+
+    # Report in input order rather than completion order
+    order = {source: i for i, source in enumerate(inputs)}
+    return sorted(results, key=lambda result: order[result.source])
+
+
+def print_summary(
+    console: Console, results: list[BatchItemResult], elapsed: float
+) -> None:
+    failures = [result for result in results if result.error]
+    requests = sum(result.requests for result in results)
+    extra_requests = sum(result.extra_requests for result in results)
+    retries = sum(result.retries for result in results)
+
+    console.print_status(
+        f"Processed {len(results)} resumes in {elapsed:.1f}s: "
+        f"{len(results) - len(failures)} succeeded, {len(failures)} failed, "
+        f"{requests} requests ({extra_requests} extra requests, "
+        f"{retries} retries)."
+    )
+    console.print_status(
+        describe_tier_counts(
+            sum((result.pipeline.tier_counts for result in results), Counter())
+        )
+    )
+    compactors = [
+        result.pipeline.compactor for result in results if result.pipeline.compactor
+    ]
+    if compactors:
+        full_tokens = sum(compactor.full_tokens for compactor in compactors)
+        compact_tokens = sum(compactor.compact_tokens for compactor in compactors)
+        console.print_status(
+            f"Compacted repair rounds sent ~{compact_tokens} prompt tokens "
+            f"instead of ~{full_tokens}."
+        )
+    for result in results:
+        if result.extra_requests or result.retries:
+            console.print_status(
+                f"  {result.source}: {result.extra_requests} extra requests, "
+                f"{result.retries} retries"
+            )
+    for result in failures:
+        console.print_status(f"  {result.source} failed: {result.error!r}")
+
+
+def batch_main(
+    client: ChatClient,
+    args,
+    console: Console,
+    cache: ResponseCache | None = None,
+    options: PipelineOptions = PipelineOptions(),
+    metrics: Metrics | None = None,
+    scheduler: RequestScheduler | None = None,
+    models: ModelRoutes = ModelRoutes(),
+) -> bool:
+    """Run the batch command. Returns whether every resume succeeded."""
+    inputs = expand_inputs(args.inputs)
+    if not inputs:
+        console.quit(f"No resumes found matching {args.inputs}")
+
+    start = time.monotonic()
+    results = run_batch(
+        client,
+        inputs,
+        Path(args.out),
+        args.jobs,
+        console,
+        cache,
+        options,
+        metrics,
+        scheduler,
+        models,
+    )
+    print_summary(console, results, time.monotonic() - start)
+
+    return all(result.error is None for result in results)
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from enum import Enum
+from pathlib import Path
+from typing import Any
+
+
+class CacheMode(Enum):
+    READ_WRITE = "read-write"
+    "Serve hits from the cache and store misses."
+
+    READ_ONLY = "read-only"
+    "Serve hits from the cache but never store anything."
+
+    REFRESH = "refresh"
+    "Ignore existing entries but store every response."
+
+    REPLAY = "replay"
+    "Serve hits from the cache and fail on any miss (ie: offline mode)."
+
+
+class CacheMissError(Exception):
+    """Raised in replay mode when a response isn't in the cache."""
+
+    def __init__(self, key: str):
+        self.key = key
+        super().__init__(f"No cached response for request {key} in replay mode.")
+
+
+class ResponseCache:
+    """A content-addressed on-disk cache of chat completions.
+
+    Entries are keyed by a hash of the request's parameters (model, messages,
+    sampling parameters) and evicted least-recently-used first once the
+    cache grows past `max_bytes`. The cache's size is scanned once and then
+    kept up to date as entries are stored, so the directory is only scanned
+    again when the size goes over.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        mode: CacheMode = CacheMode.READ_WRITE,
+        max_bytes: int = 100 * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # The total size of the entries, if it's been scanned
+        self._size: int | None = None
+
+    @staticmethod
+    def key(params: dict[str, Any]) -> str:
+        encoded = json.dumps(params, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Look up a response, returning None on a miss.
+
+        Raises:
+            CacheMissError: If in replay mode and the response isn't cached.
+        """
+        if self.mode != CacheMode.REFRESH:
+            path = self._path(key)
+            try:
+                with path.open("r") as file:
+                    value = json.load(file)
+
+                # Reads count as uses for the sake of LRU eviction
+                os.utime(path)
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+            else:
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+
+        if self.mode == CacheMode.REPLAY:
+            raise CacheMissError(key)
+
+        return None
+
+    def put(self, key: str, value: dict[str, Any]) -> None:
+        if self.mode in (CacheMode.READ_ONLY, CacheMode.REPLAY):
+            return
+
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            replaced_size = path.stat().st_size
+        except FileNotFoundError:
+            replaced_size = 0
+
+        # Write to a temporary file first so readers never see partial entries
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(value, file)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        with self._lock:
+            if self._size is not None:
+                self._size += size - replaced_size
+            over = self._size is None or self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self) -> None:
+        """Delete least-recently-used entries until under `max_bytes`."""
+        with self._lock:
+            entries = []
+            total_size = 0
+            for path in self.directory.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total_size <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total_size -= size
+
+            self._size = total_size
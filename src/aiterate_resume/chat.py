@@ -1,27 +1,58 @@
-from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
-from openai import OpenAI
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Callable, Generator, NoReturn, Protocol
 import sys
 
-from rich import print as rprint
-from rich.markup import escape
+from .cache import ResponseCache
+from .deadline import Deadline
+from .events import Event, EventConsumer, RichRenderer
+from .metrics import Metrics
+from .routing import ModelRoutes, Phase
+from .scheduler import RequestScheduler
+from .tokens import estimate_tokens
+
+# openai and rich take a while to import, so they're only imported once a
+# request is sent or something is printed. That keeps `--help` and other quick
+# invocations fast.
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletion
+    from openai.types.chat.chat_completion_message_param import (
+        ChatCompletionMessageParam,
+    )
+    from openai.types.completion_usage import CompletionUsage
 
 
 class Console:
-    def __init__(self, verbose: bool = False):
+    """Reports what happens during a run as events (see `events.Event`).
+
+    Events are rendered as rich text by default, or given to `consumer`.
+    """
+
+    def __init__(
+        self,
+        verbose: bool = False,
+        quiet: bool = False,
+        consumer: EventConsumer | None = None,
+    ):
         self.verbose = verbose
+        self.quiet = quiet
+        self.consumer = consumer if consumer is not None else RichRenderer(verbose)
 
-    def print_message(self, message: ChatCompletionMessageParam, verbose_level=False):
-        if verbose_level and not self.verbose:
-            return
+    def emit(self, event: Event) -> None:
+        if not self.quiet:
+            self.consumer(event)
 
-        role = message["role"]
+    def print_message(self, message: ChatCompletionMessageParam, verbose_level=False):
         content = message.get("content")
         if isinstance(content, str):
-            rprint(f"[underline]{role}[/underline]")
-
-            color = "green" if role == "assistant" else "blue"
-            for line in content.splitlines():
-                rprint(f"[{color}]> {escape(line)}[/{color}]")
+            self.emit(
+                {
+                    "event": "message",
+                    "role": message["role"],
+                    "content": content,
+                    "verbose": verbose_level,
+                }
+            )
 
     def print_messages(
         self, messages: list[ChatCompletionMessageParam], verbose_level=False
@@ -29,31 +60,328 @@ class Console:
         for message in messages:
             self.print_message(message, verbose_level)
 
-    def quit(self, message: str) -> None:
-        rprint(f"[red]{message}[/red]")
+    def print_status(self, message: str) -> None:
+        self.emit({"event": "status", "message": message})
+
+    def print_document(self, content: str) -> None:
+        self.emit({"event": "document", "content": content})
+
+    def close(self) -> None:
+        self.consumer.close()
+
+    def quit(self, message: str) -> NoReturn:
+        self.consumer({"event": "error", "message": message})
+        self.close()
         sys.exit(1)
 
 
-class ChatSession:
-    def __init__(self, client: OpenAI, console: Console):
-        self.client = client
+class BaseChatSession:
+    """What `ChatSession` and `AsyncChatSession` share: the conversation,
+    the response cache, metrics, and models. Only sending requests differs
+    between them."""
+
+    def __init__(
+        self,
+        console: Console,
+        cache: ResponseCache | None = None,
+        metrics: Metrics | None = None,
+        models: ModelRoutes = ModelRoutes(),
+    ):
         self.console = console
+        self.cache = cache
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.models = models
         self.messages: list[ChatCompletionMessageParam] = []
 
-    def send_messages(self, messages: list[ChatCompletionMessageParam]):
-        self.messages.extend(messages)
+        self.requests_sent = 0
+        "Completions requested so far, including any served from the cache."
+
+        self.retries = 0
+        """Times the scheduler retried one of this session's requests after a
+        transient failure. These aren't counted in `requests_sent`."""
+
+    def _start_request(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        isolated: bool,
+        model: str | None,
+        n: int = 1,
+        extra_params: dict[str, Any] | None = None,
+    ) -> tuple[list[ChatCompletionMessageParam], dict[str, Any]]:
+        """Record a request that's about to be sent, returning the
+        conversation it's part of and its parameters."""
+        conversation = self._conversation(messages, isolated)
         self.console.print_messages(messages)
 
-        response = self.client.chat.completions.create(
-            model="gpt-4o",
-            messages=self.messages,
-        )
+        self.requests_sent += 1
+        params = self._request_params(conversation, model)
+        params.update(extra_params or {})
+        if n > 1:
+            params["n"] = n
+        return conversation, params
 
+    def _finish_request(
+        self,
+        conversation: list[ChatCompletionMessageParam],
+        response: ChatCompletion,
+        choose: Callable[[ChatCompletion], int] | None,
+    ) -> None:
+        """Record the chosen choice of `response` in `conversation`."""
+        chosen = choose(response) if choose else 0
         response_message: ChatCompletionMessageParam = {
             "role": "assistant",
-            "content": response.choices[0].message.content,
+            "content": response.choices[chosen].message.content,
         }
-        self.messages.append(response_message)
+        conversation.append(response_message)
         self.console.print_message(response_message)
 
+    def _conversation(
+        self, messages: list[ChatCompletionMessageParam], isolated: bool
+    ) -> list[ChatCompletionMessageParam]:
+        if isolated:
+            return list(messages)
+
+        self.messages.extend(messages)
+        return self.messages
+
+    def _request_params(
+        self, conversation: list[ChatCompletionMessageParam], model: str | None
+    ) -> dict[str, Any]:
+        return {"model": model or self.models.initial, "messages": conversation}
+
+    def _record_usage(self, usage: CompletionUsage | None, span: dict[str, Any]):
+        if usage is None:
+            return
+
+        span["prompt_tokens"] = usage.prompt_tokens
+        span["completion_tokens"] = usage.completion_tokens
+        self.metrics.record_usage(usage.prompt_tokens, usage.completion_tokens)
+
+    def _counting_retries(self, send: Callable[[], Any]) -> Callable[[], Any]:
+        """`send`, counting every call after the first in `self.retries`
+        (the scheduler calls it once per attempt)."""
+        calls = 0
+
+        def counted() -> Any:
+            nonlocal calls
+            if calls:
+                self.retries += 1
+            calls += 1
+            return send()
+
+        return counted
+
+    def _timeout(self, deadline: Deadline | None) -> dict[str, Any]:
+        """The timeout to send a request with now, as keyword arguments."""
+        if deadline is None:
+            return {}
+
+        return {"timeout": deadline.request_timeout()}
+
+    def _cached(
+        self, params: dict[str, Any], span: dict[str, Any]
+    ) -> tuple[str | None, ChatCompletion | None]:
+        """The cache key for `params` (if there's a cache) and the cached
+        response, if there is one."""
+        span["cached"] = False
+        if self.cache is None:
+            return None, None
+
+        key = self.cache.key(params)
+        cached = self.cache.get(key)
+        if cached is None:
+            return key, None
+
+        from openai.types.chat import ChatCompletion
+
+        span["cached"] = True
+        return key, ChatCompletion.model_validate(cached)
+
+    def _received(
+        self, key: str | None, response: ChatCompletion, span: dict[str, Any]
+    ) -> None:
+        """Record a response that was sent by the server."""
+        self._record_usage(response.usage, span)
+        if self.cache is not None and key is not None:
+            self.cache.put(key, response.model_dump(mode="json"))
+
+
+class ChatClient(Protocol):
+    """The part of a client a session uses: `OpenAI` (or `AsyncOpenAI` for an
+    `AsyncChatSession`), or a stand-in such as `fake_llm.FakeClient`."""
+
+    @property
+    def chat(self) -> Any: ...
+
+
+class ChatSession(BaseChatSession):
+    def __init__(
+        self,
+        client: ChatClient,
+        console: Console,
+        cache: ResponseCache | None = None,
+        metrics: Metrics | None = None,
+        scheduler: RequestScheduler | None = None,
+        models: ModelRoutes = ModelRoutes(),
+    ):
+        super().__init__(console, cache, metrics, models)
+        self.client = client
+        self.scheduler = scheduler
+
+    def fork(self, console: Console | None = None) -> "ChatSession":
+        """A new, empty session sharing this one's client, cache, metrics,
+        scheduler, and models."""
+        return ChatSession(
+            self.client,
+            console or self.console,
+            self.cache,
+            self.metrics,
+            self.scheduler,
+            self.models,
+        )
+
+    def send_messages(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        isolated: bool = False,
+        n: int = 1,
+        choose: Callable[[ChatCompletion], int] | None = None,
+        model: str | None = None,
+        phase: Phase = Phase.INITIAL,
+        extra_params: dict[str, Any] | None = None,
+        deadline: Deadline | None = None,
+    ):
+        """Send messages and return the response.
+
+        The request goes to `model`, or the initial model if it's None.
+        `phase` is only used to label the request in the metrics.
+        `extra_params` are added to the request (ex: a `response_format`).
+        If `deadline` is given, the time left until it is the request's
+        timeout (including any retries).
+
+        If `isolated`, `messages` are sent as a conversation of their own and
+        neither they nor the response are recorded in `self.messages`.
+
+        If `n` is more than 1, that many candidate choices are requested and
+        `choose` picks the index of the one to record as the response (the
+        first one by default).
+        """
+        conversation, params = self._start_request(
+            messages, isolated, model, n, extra_params
+        )
+        with self.metrics.span(
+            "request", n=n, stream=False, phase=phase.value, model=params["model"]
+        ) as span:
+            key, response = self._cached(params, span)
+            if response is None:
+                response = self._send(params, deadline)
+                self._received(key, response, span)
+
+        self._finish_request(conversation, response, choose)
         return response
+
+    def stream_messages(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        isolated: bool = False,
+        model: str | None = None,
+        phase: Phase = Phase.INITIAL,
+        deadline: Deadline | None = None,
+    ) -> Generator[str, None, None]:
+        """Send messages and yield the response's content as it arrives.
+
+        Closing the generator early stops the stream. Whatever content was
+        received up to that point is recorded as the response. `isolated`,
+        `model`, `phase`, and `deadline` work the same as in `send_messages`.
+        """
+        conversation, params = self._start_request(messages, isolated, model)
+        content: list[str] = []
+        try:
+            with self.metrics.span(
+                "request", n=1, stream=True, phase=phase.value, model=params["model"]
+            ) as span:
+                for delta in self._create_stream(params, span, deadline):
+                    content.append(delta)
+                    yield delta
+        finally:
+            response_message: ChatCompletionMessageParam = {
+                "role": "assistant",
+                "content": "".join(content),
+            }
+            conversation.append(response_message)
+            self.console.print_message(response_message)
+
+    def _send(
+        self, params: dict[str, Any], deadline: Deadline | None, **kwargs: Any
+    ) -> Any:
+        """Request a completion, through the scheduler if there is one."""
+        if self.scheduler is None:
+            return self.client.chat.completions.create(
+                **params, **kwargs, **self._timeout(deadline)
+            )
+
+        # The timeout is worked out when each attempt is sent, so retries get
+        # whatever time is left
+        return self.scheduler.run(
+            self._counting_retries(
+                lambda: self.client.chat.completions.with_raw_response.create(
+                    **params, **kwargs, **self._timeout(deadline)
+                )
+            ),
+            estimate_tokens(params["messages"]),
+            self.metrics,
+            deadline,
+            stream=kwargs.get("stream", False),
+        )
+
+    def _create_stream(
+        self, params: dict[str, Any], span: dict[str, Any], deadline: Deadline | None
+    ) -> Generator[str, None, None]:
+        # Streamed and non-streamed requests share cache entries
+        key, cached = self._cached(params, span)
+        if cached is not None:
+            cached_content = cached.choices[0].message.content
+            if cached_content:
+                yield cached_content
+            return
+
+        stream = self._send(
+            params, deadline, stream=True, stream_options={"include_usage": True}
+        )
+
+        content: list[str] = []
+        last_chunk = None
+        try:
+            for chunk in stream:
+                last_chunk = chunk
+                if chunk.usage:
+                    # Only sent in a final chunk without any choices
+                    self._record_usage(chunk.usage, span)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    delta = chunk.choices[0].delta.content
+                    content.append(delta)
+                    yield delta
+        finally:
+            stream.close()
+
+        # Only reached if the stream was read to the end
+        if self.cache is not None and key is not None and last_chunk is not None:
+            self.cache.put(
+                key,
+                {
+                    "id": last_chunk.id,
+                    "object": "chat.completion",
+                    "created": last_chunk.created,
+                    "model": last_chunk.model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {
+                                "role": "assistant",
+                                "content": "".join(content),
+                            },
+                        }
+                    ],
+                },
+            )
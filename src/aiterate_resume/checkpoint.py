@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from .search_replace import SearchReplaceResult
+
+if TYPE_CHECKING:
+    from openai.types.chat.chat_completion_message_param import (
+        ChatCompletionMessageParam,
+    )
+
+CHECKPOINT_VERSION = 1
+
+
+class CheckpointError(Exception):
+    """Raised when a checkpoint can't be used to continue a run."""
+
+
+class RestoredError(Exception):
+    """Why a change failed to apply, as recorded in a checkpoint.
+
+    Only the message and the name of the original error's type (`cause`)
+    are kept, which is all a reflection needs.
+    """
+
+    def __init__(self, cause: str, message: str):
+        self.cause = cause
+        super().__init__(message)
+
+
+class Checkpoint(NamedTuple):
+    """The state of `modify_resume` after a completed round."""
+
+    resume_contents: str
+    "The resume the run started from."
+
+    messages: list[ChatCompletionMessageParam]
+    "The session's conversation so far."
+
+    changed_contents: str
+    remaining_requests: int
+
+    failures: list[tuple[SearchReplaceResult, Exception]]
+    "Changes that still need to be reflected on."
+
+    def save(self, path: Path) -> None:
+        """Write the checkpoint atomically, so an interrupted write never
+        leaves a partial checkpoint behind."""
+        data: dict[str, Any] = {
+            "version": CHECKPOINT_VERSION,
+            "resume_contents": self.resume_contents,
+            "messages": self.messages,
+            "changed_contents": self.changed_contents,
+            "remaining_requests": self.remaining_requests,
+            "failures": [
+                {
+                    **change._asdict(),
+                    "cause": getattr(error, "cause", type(error).__name__),
+                    "error": str(error),
+                }
+                for change, error in self.failures
+            ],
+        }
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(data, file)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @staticmethod
+    def load(path: Path) -> Checkpoint:
+        """Read a checkpoint written by `save`.
+
+        Raises:
+            CheckpointError: If the file isn't a checkpoint this version can
+                read.
+        """
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, json.JSONDecodeError) as e:
+            raise CheckpointError(f"Could not read checkpoint {path}: {e}") from e
+
+        if not isinstance(data, dict) or data.get("version") != CHECKPOINT_VERSION:
+            raise CheckpointError(f"{path} is not a supported checkpoint.")
+
+        try:
+            return Checkpoint._from_json(data)
+        except (KeyError, TypeError) as e:
+            raise CheckpointError(f"{path} is not a valid checkpoint: {e!r}") from e
+
+    @staticmethod
+    def _from_json(data: dict[str, Any]) -> Checkpoint:
+        return Checkpoint(
+            resume_contents=data["resume_contents"],
+            messages=data["messages"],
+            changed_contents=data["changed_contents"],
+            remaining_requests=data["remaining_requests"],
+            failures=[
+                (
+                    SearchReplaceResult(
+                        failure["search"], failure["replace"], failure["reason"]
+                    ),
+                    RestoredError(failure["cause"], failure["error"]),
+                )
+                for failure in data["failures"]
+            ],
+        )
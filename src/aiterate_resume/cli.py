@@ -1,22 +1,349 @@
+from __future__ import annotations
+
 import argparse
 import os
+import sys
 from pathlib import Path
-from openai import OpenAI
+from typing import TYPE_CHECKING
+
+from .batch import batch_main
+from .cache import CacheMode, ResponseCache
+from .chat import ChatSession, Console
+from .daemon import JobServer
+from .edit_formats import EditFormat
+from .daemon_client import DEFAULT_DAEMON_URL, DaemonClient, DaemonError
+from .events import NdjsonWriter
+from .checkpoint import Checkpoint, CheckpointError
+from .metrics import Metrics, json_lines_hook
+from .pipeline import Pipeline, PipelineOptions
+from .project import Project, ProjectError
+from .routing import ModelConfigError, ModelRoutes
+from .scheduler import RequestScheduler
+from .search_replace import describe_tier_counts
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+def add_output_arguments(arg_parser: argparse.ArgumentParser) -> None:
+    arg_parser.add_argument(
+        "--output",
+        choices=["text", "ndjson"],
+        default="text",
+        help="Print colored text, or write an NDJSON stream of events "
+        "(messages, parsed blocks, applied and rejected edits, status, and the "
+        "final resume) for other tools to read (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--output-fd",
+        type=int,
+        default=1,
+        help="File descriptor to write NDJSON events to (default: %(default)s, stdout)",
+    )
+
+
+def add_common_arguments(arg_parser: argparse.ArgumentParser) -> None:
+    arg_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream responses and apply each change as soon as it arrives",
+    )
+    arg_parser.add_argument(
+        "--candidates",
+        type=int,
+        default=1,
+        help="Request this many candidate responses up front and use the first "
+        "that parses and applies cleanly, trading tokens for fewer reflection "
+        "rounds (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--edit-format",
+        choices=[edit_format.value for edit_format in EditFormat],
+        default=EditFormat.SEARCH_REPLACE.value,
+        help="Ask for changes as free-form *SEARCH/REPLACE blocks*, as JSON "
+        "matching a schema, which avoids most format repair rounds, or as "
+        "replacements for ranges of anchored lines, which uses fewer output "
+        "tokens. Only *SEARCH/REPLACE blocks* can be streamed, and lines can't "
+        "be used with --compact (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--rounds",
+        type=int,
+        default=1,
+        help="Improve the resume up to this many times, feeding each round's "
+        "output into the next (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--min-changed-lines",
+        type=int,
+        default=1,
+        help="With --rounds, stop early once a round adds or removes fewer "
+        "than this many lines (default: %(default)s, only stop once a round "
+        "changes nothing)",
+    )
+    arg_parser.add_argument(
+        "--deadline",
+        type=float,
+        metavar="SECONDS",
+        help="Give each resume at most this long, across every round and "
+        "request, and use the best result so far once it's up",
+    )
+    arg_parser.add_argument(
+        "--best-effort",
+        action="store_true",
+        help="Use the best result so far when a resume runs out of attempts, "
+        "rather than failing (implied by --deadline)",
+    )
+    arg_parser.add_argument(
+        "--shard",
+        action="store_true",
+        help="Split the resume into sections and improve them concurrently",
+    )
+    arg_parser.add_argument(
+        "--shard-jobs",
+        type=int,
+        default=4,
+        help="Maximum number of sections to improve at once (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--incremental",
+        type=str,
+        metavar="DIR",
+        help="Store the edits accepted for each section of the resume in DIR "
+        "and reuse them for sections that haven't changed since an earlier run, "
+        "so only changed sections are sent to the model",
+    )
+    arg_parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Send only the failed changes and nearby text in repair rounds "
+        "rather than the whole conversation",
+    )
+    arg_parser.add_argument(
+        "--compact-budget",
+        type=int,
+        default=2000,
+        help="Approximate token budget for each compacted repair round "
+        "(default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="Cache responses in this directory and reuse them for identical requests",
+    )
+    arg_parser.add_argument(
+        "--cache-mode",
+        choices=[mode.value for mode in CacheMode],
+        default=CacheMode.READ_WRITE.value,
+        help="How to use the response cache (default: %(default)s). "
+        "'replay' fails instead of sending a request on a cache miss",
+    )
+    arg_parser.add_argument(
+        "--cache-max-size",
+        type=int,
+        default=100,
+        help="Maximum size of the response cache in MB (default: %(default)s)",
+    )
+    add_output_arguments(arg_parser)
+    arg_parser.add_argument(
+        "--models-config",
+        type=str,
+        metavar="PATH",
+        help="Read the model to use for each phase from the [models] table of "
+        "this TOML file (keys: initial, format_repair, apply_repair, escalation)",
+    )
+    arg_parser.add_argument(
+        "--model",
+        type=str,
+        help=f"Model for the initial request (default: {ModelRoutes().initial})",
+    )
+    arg_parser.add_argument(
+        "--format-repair-model",
+        type=str,
+        help="Model for asking to fix responses that couldn't be parsed "
+        f"(default: {ModelRoutes().format_repair})",
+    )
+    arg_parser.add_argument(
+        "--apply-repair-model",
+        type=str,
+        help="Model for asking to fix changes that couldn't be applied "
+        f"(default: {ModelRoutes().apply_repair})",
+    )
+    arg_parser.add_argument(
+        "--escalation-model",
+        type=str,
+        help="Model to switch a phase to once one of its requests fails "
+        f"(default: {ModelRoutes().escalation})",
+    )
+    arg_parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=4,
+        help="Maximum number of requests to send at once, across all sessions "
+        "(default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=5,
+        help="Retry rate limited, timed out, and failed requests this many times "
+        "with jittered exponential backoff (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--metrics",
+        choices=["table", "jsonl"],
+        help="Report request, parse, and apply timings, token usage, "
+        "reflection and retry causes, and each phase's success rate, either as a summary table at the end or as JSON "
+        "lines while running",
+    )
+    arg_parser.add_argument(
+        "--metrics-file",
+        type=str,
+        help="Write metrics to this file rather than stderr",
+    )
+
+
+def check_common_arguments(arg_parser: argparse.ArgumentParser, args) -> None:
+    if args.max_in_flight < 1:
+        arg_parser.error("--max-in-flight must be at least 1")
+    if args.rounds < 1:
+        arg_parser.error("--rounds must be at least 1")
+    if args.deadline is not None and args.deadline <= 0:
+        arg_parser.error("--deadline must be positive")
+    if args.compact and args.edit_format == EditFormat.LINES.value:
+        arg_parser.error("--edit-format lines can't be used with --compact")
+
+
+def create_cache(args) -> ResponseCache | None:
+    if not args.cache_dir:
+        return None
+
+    return ResponseCache(
+        Path(args.cache_dir),
+        CacheMode(args.cache_mode),
+        max_bytes=args.cache_max_size * 1024 * 1024,
+    )
+
+
+def create_console(args, verbose: bool = False) -> Console:
+    if args.output == "ndjson":
+        return Console(verbose, consumer=NdjsonWriter.open_fd(args.output_fd))
+
+    return Console(verbose)
+
+
+def create_metrics(args) -> Metrics | None:
+    if not args.metrics:
+        return None
 
-from aiterate_resume.reflection import modify_resume
-from .system_prompts import system_prompt
-from . import search_replace_prompts
-from .chat import Console, ChatSession
+    metrics = Metrics()
+    if args.metrics == "jsonl" and args.metrics_file:
+        file = open(args.metrics_file, "a")
+        metrics.add_hook(json_lines_hook(file), file.close)
+    elif args.metrics == "jsonl":
+        metrics.add_hook(json_lines_hook(sys.stderr))
+
+    return metrics
+
+
+def report_metrics(args, metrics: Metrics | None) -> None:
+    """Print the metrics' summary table (if asked to) and close any file the
+    metrics were being written to."""
+    if metrics is None:
+        return
+
+    metrics.close()
+    if args.metrics != "table":
+        return
+
+    table = metrics.summary_table()
+    if args.metrics_file:
+        Path(args.metrics_file).write_text(table + "\n")
+    else:
+        print(table, file=sys.stderr)
+
+
+def create_models(args, console: Console) -> ModelRoutes:
+    """The models from --models-config, overridden by any given as flags."""
+    models = ModelRoutes()
+    if args.models_config:
+        try:
+            models = ModelRoutes.load(Path(args.models_config))
+        except ModelConfigError as e:
+            console.quit(str(e))
+
+    return models.with_overrides(
+        initial=args.model,
+        format_repair=args.format_repair_model,
+        apply_repair=args.apply_repair_model,
+        escalation=args.escalation_model,
+    )
+
+
+def create_scheduler(args) -> RequestScheduler:
+    return RequestScheduler(
+        max_in_flight=args.max_in_flight, max_retries=args.max_retries
+    )
+
+
+def pipeline_options(args) -> PipelineOptions:
+    return PipelineOptions(
+        stream=args.stream,
+        compact_budget=args.compact_budget if args.compact else None,
+        candidates=args.candidates,
+        shard_jobs=args.shard_jobs if args.shard or args.incremental else None,
+        section_store=Path(args.incremental) if args.incremental else None,
+        rounds=args.rounds,
+        min_changed_lines=args.min_changed_lines,
+        edit_format=EditFormat(args.edit_format),
+        deadline=args.deadline,
+        best_effort=args.best_effort or args.deadline is not None,
+    )
 
 
 def parse_args():
     # Set up argument parser
-    arg_parser = argparse.ArgumentParser(description="Iterate on a resume with an AI.")
+    arg_parser = argparse.ArgumentParser(
+        description="Iterate on a resume with an AI.",
+        epilog="Run `%(prog)s batch --help` to process many resumes at once, or "
+        "`%(prog)s serve --help` to run a daemon that `%(prog)s client` submits "
+        "resumes to.",
+    )
     arg_parser.add_argument("resume", type=str, help="Path to the file to be processed")
     arg_parser.add_argument(
         "-v", "--verbose", action="store_true", help="Enable verbose output"
     )
+    arg_parser.add_argument(
+        "--project",
+        action="store_true",
+        help="Treat the file as the root of a LaTeX or HTML project: improve "
+        "it along with every file it includes (via \\input, \\include, or "
+        "<!--#include -->) and write changed files back in place rather than "
+        "printing the result",
+    )
+    arg_parser.add_argument(
+        "--checkpoint",
+        type=str,
+        help="Save progress to this file after every round, so an interrupted "
+        "run can be continued with --resume-from",
+    )
+    arg_parser.add_argument(
+        "--resume-from",
+        type=str,
+        help="Continue an interrupted run from this checkpoint file (which "
+        "keeps being updated unless --checkpoint is given)",
+    )
+    add_common_arguments(arg_parser)
     args = arg_parser.parse_args()
+    if (args.shard or args.incremental) and (args.checkpoint or args.resume_from):
+        arg_parser.error(
+            "--shard and --incremental can't be used with --checkpoint or --resume-from"
+        )
+    if args.project and (args.shard or args.incremental):
+        arg_parser.error("--project can't be used with --shard or --incremental")
+    if args.rounds > 1 and (args.checkpoint or args.resume_from):
+        arg_parser.error("--rounds can't be used with --checkpoint or --resume-from")
+    check_common_arguments(arg_parser, args)
 
     # Read the contents of the specified file
     resume = Path(args.resume)
@@ -26,27 +353,250 @@ def parse_args():
     return args, resume_contents
 
 
-def main():
-    args, resume_contents = parse_args()
-    console = Console(verbose=args.verbose)
+def parse_batch_args(argv: list[str]):
+    arg_parser = argparse.ArgumentParser(
+        prog="aiterate-resume batch",
+        description="Iterate on many resumes concurrently with an AI.",
+    )
+    arg_parser.add_argument(
+        "inputs", type=str, help="Directory of resumes or a glob matching them"
+    )
+    arg_parser.add_argument(
+        "--out", type=str, required=True, help="Directory to write results to"
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=4,
+        help="Maximum number of resumes to process at once (default: %(default)s)",
+    )
+    add_common_arguments(arg_parser)
+    args = arg_parser.parse_args(argv)
+    if args.jobs < 1:
+        arg_parser.error("--jobs must be at least 1")
+    check_common_arguments(arg_parser, args)
+
+    return args
+
+
+def parse_serve_args(argv: list[str]):
+    arg_parser = argparse.ArgumentParser(
+        prog="aiterate-resume serve",
+        description="Run a daemon that iterates on resumes submitted over local "
+        "HTTP, keeping one warm client and cache for every job.",
+        epilog="Run `aiterate-resume client --help` to submit resumes to it.",
+    )
+    arg_parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Address to listen on (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--port",
+        type=int,
+        default=8765,
+        help="Port to listen on (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=4,
+        help="Maximum number of resumes to process at once (default: %(default)s)",
+    )
+    add_common_arguments(arg_parser)
+    args = arg_parser.parse_args(argv)
+    if args.jobs < 1:
+        arg_parser.error("--jobs must be at least 1")
+    check_common_arguments(arg_parser, args)
+
+    return args
+
+
+def parse_client_args(argv: list[str]):
+    arg_parser = argparse.ArgumentParser(
+        prog="aiterate-resume client",
+        description="Iterate on a resume using a running `aiterate-resume serve` "
+        "daemon.",
+    )
+    arg_parser.add_argument("resume", type=str, help="Path to the file to be processed")
+    arg_parser.add_argument(
+        "--server",
+        type=str,
+        default=DEFAULT_DAEMON_URL,
+        help="URL of the daemon (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Enable verbose output"
+    )
+    add_output_arguments(arg_parser)
+    return arg_parser.parse_args(argv)
 
+
+def create_client(console: Console) -> OpenAI:
     if "OPENAI_API_KEY" not in os.environ:
         console.quit("OPENAI_API_KEY environment variable is not set")
 
-    session = ChatSession(OpenAI(api_key=os.environ["OPENAI_API_KEY"]), console)
+    # openai takes a while to import, so it's only imported once it's needed
+    from openai import OpenAI
 
-    changed_contents = modify_resume(
-        session,
-        resume_contents,
-        [
-            {"role": "system", "content": system_prompt},
-            {"role": "system", "content": search_replace_prompts.format_prompt},
-            *search_replace_prompts.examples,
-            {
-                "role": "user",
-                "content": f"Provide changes to improve the following resume:\n\n{resume_contents}",
-            },
-        ],
-    )
+    # Retries are left to the RequestScheduler, which shares its backoff and
+    # rate limits across sessions
+    return OpenAI(api_key=os.environ["OPENAI_API_KEY"], max_retries=0)
+
+
+def batch():
+    args = parse_batch_args(sys.argv[2:])
+    console = create_console(args)
+    client = create_client(console)
+    models = create_models(args, console)
+    metrics = create_metrics(args)
+
+    try:
+        succeeded = batch_main(
+            client,
+            args,
+            console,
+            create_cache(args),
+            pipeline_options(args),
+            metrics,
+            create_scheduler(args),
+            models,
+        )
+    finally:
+        console.close()
+        report_metrics(args, metrics)
+    if not succeeded:
+        sys.exit(1)
+
+
+def serve():
+    args = parse_serve_args(sys.argv[2:])
+    console = create_console(args)
+    client = create_client(console)
+    models = create_models(args, console)
+    metrics = create_metrics(args) or Metrics()
+    try:
+        session = ChatSession(
+            client,
+            console,
+            create_cache(args),
+            metrics,
+            create_scheduler(args),
+            models,
+        )
+        server = JobServer(
+            session, pipeline_options(args), args.jobs, args.host, args.port
+        )
+        console.print_status(f"Listening on {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            console.close()
+    finally:
+        report_metrics(args, metrics)
+
+
+def client():
+    args = parse_client_args(sys.argv[2:])
+    console = create_console(args, args.verbose)
+    with open(args.resume, "r") as file:
+        resume_contents = file.read()
+
+    daemon = DaemonClient(args.server)
+    try:
+        job = daemon.submit(resume_contents)
+        for event in daemon.events(job["id"]):
+            console.emit(event)
+        failed = daemon.status(job["id"])["status"] == "failed"
+    except DaemonError as e:
+        console.quit(str(e))
+
+    console.close()
+    if failed:
+        sys.exit(1)
+
+
+def main():
+    if sys.argv[1:2] == ["batch"]:
+        return batch()
+    if sys.argv[1:2] == ["serve"]:
+        return serve()
+    if sys.argv[1:2] == ["client"]:
+        return client()
+
+    args, resume_contents = parse_args()
+    console = create_console(args, args.verbose)
+    project = None
+    if args.project:
+        try:
+            project = Project.load(Path(args.resume))
+        except ProjectError as e:
+            console.quit(str(e))
+        resume_contents = project.combined()
+    resume_from = None
+    if args.resume_from:
+        try:
+            resume_from = Checkpoint.load(Path(args.resume_from))
+        except CheckpointError as e:
+            console.quit(str(e))
+    checkpoint_path = args.checkpoint or args.resume_from
+
+    chat_client = create_client(console)
+    models = create_models(args, console)
+    metrics = create_metrics(args)
+    # Whatever way the run ends (including `console.quit`), the metrics are
+    # reported and any --metrics-file closed
+    try:
+        session = ChatSession(
+            chat_client,
+            console,
+            create_cache(args),
+            metrics,
+            create_scheduler(args),
+            models,
+        )
+        pipeline = Pipeline(session, pipeline_options(args))
+
+        try:
+            changed_contents = pipeline.run(
+                resume_contents,
+                Path(checkpoint_path) if checkpoint_path else None,
+                resume_from,
+                project,
+            )
+        except CheckpointError as e:
+            console.quit(str(e))
+        except BaseException:
+            console.close()
+            raise
 
-    print(changed_contents)
+        if pipeline.compactor and pipeline.compactor.rounds:
+            console.print_status(pipeline.compactor.report())
+        edit_tokens = session.metrics.describe_edit_tokens()
+        if edit_tokens:
+            console.print_status(edit_tokens)
+        if args.verbose:
+            console.print_status(describe_tier_counts(pipeline.tier_counts))
+        if project is None:
+            console.print_document(changed_contents)
+        else:
+            try:
+                written = project.write_back(changed_contents)
+            except ProjectError as e:
+                console.quit(str(e))
+            if written:
+                console.print_status(
+                    f"Wrote {len(written)} of {len(project.files)} files: "
+                    f"{', '.join(str(path) for path in written)}."
+                )
+            else:
+                console.print_status("No files changed.")
+        console.close()
+    finally:
+        report_metrics(args, metrics)
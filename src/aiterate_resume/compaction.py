@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Iterable
+
+from .chat import BaseChatSession
+from .edit_formats import EditCodec, SearchReplaceCodec
+from .search_replace import SearchReplaceResult
+from .tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    from openai.types.chat.chat_completion_message_param import (
+        ChatCompletionMessageParam,
+    )
+
+
+def locate_lines(search: str, lines: list[str]) -> list[tuple[int, int]]:
+    """Find the line ranges of `lines` that `search` most likely refers to.
+
+    Exact occurrences are returned if there are any. Otherwise the range with
+    the most lines in common with `search` (ignoring indentation) is used,
+    falling back to the line with the most words in common.
+    """
+    search_lines = search.split("\n")
+    document = "\n".join(lines)
+
+    # Exact (possibly multiple) occurrences
+    ranges = []
+    start = document.find(search) if search else -1
+    while start != -1:
+        first_line = document.count("\n", 0, start)
+        ranges.append((first_line, first_line + len(search_lines)))
+        start = document.find(search, start + 1)
+    if ranges:
+        return ranges
+
+    wanted = {line.strip() for line in search_lines if line.strip()}
+    hits = [1 if line.strip() in wanted else 0 for line in lines]
+    width = min(len(search_lines), len(lines))
+    if width and any(hits):
+        best_start = max(
+            range(len(lines) - width + 1), key=lambda i: sum(hits[i : i + width])
+        )
+        return [(best_start, best_start + width)]
+
+    words = set(search.split())
+    if not words or not lines:
+        return []
+
+    best_line = max(range(len(lines)), key=lambda i: len(words & set(lines[i].split())))
+    if not words & set(lines[best_line].split()):
+        return []
+
+    return [(best_line, best_line + 1)]
+
+
+def merge_ranges(ranges: Iterable[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Merge overlapping or touching ranges."""
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+class Compactor:
+    """Builds small, self-contained conversations for repair rounds.
+
+    Rather than resending the whole conversation (system prompts, few-shot
+    examples, the full resume, and every earlier round) a repair round only
+    sends the format rules, the failed changes, and a window of the resume
+    around each intended edit. The rules and changes are written in the
+    format of the `EditCodec` in use. Token estimates for both approaches are kept
+    so the savings can be reported.
+    """
+
+    def __init__(
+        self, token_budget: int = 2000, window_lines: int = 8, max_excerpts: int = 3
+    ):
+        self.token_budget = token_budget
+        self.window_lines = window_lines
+        self.max_excerpts = max_excerpts
+
+        self.full_tokens = 0
+        "Estimated prompt tokens if the whole conversation had been resent."
+
+        self.compact_tokens = 0
+        "Estimated prompt tokens actually sent for repair rounds."
+
+        self.rounds = 0
+
+        # How much repair rounds would have grown the full conversation by
+        self._history_growth = 0
+
+        # Sharded runs record rounds from several threads
+        self._lock = threading.Lock()
+
+    def format_repair_messages(
+        self,
+        session: BaseChatSession,
+        raw_text: str,
+        error: Exception,
+        full_messages: list[ChatCompletionMessageParam],
+        num_handled: int = 0,
+        codec: EditCodec = SearchReplaceCodec(),
+    ) -> list[ChatCompletionMessageParam]:
+        """Messages asking the model to fix the format of `raw_text`, which
+        should have been in `codec`'s format."""
+        format_name = codec.format_name
+        content = f"Your previous response was not in the correct {format_name} format. Trying to parse it gave the error: {error}\n\nRewrite the response below so every change follows the {format_name} format. Do not make any other changes."
+        if num_handled:
+            content += f" The first {num_handled} *SEARCH/REPLACE blocks* were already handled, do not repeat them."
+
+        compact = [
+            self._rules_message(codec),
+            {"role": "user", "content": f"{content}\n\n{raw_text}"},
+        ]
+        self._record(session, full_messages, compact)
+        return compact
+
+    def apply_repair_messages(
+        self,
+        session: BaseChatSession,
+        failures: list[tuple[SearchReplaceResult, Exception]],
+        document: str,
+        full_messages: list[ChatCompletionMessageParam],
+        codec: EditCodec = SearchReplaceCodec(),
+    ) -> list[ChatCompletionMessageParam]:
+        """Messages asking the model to fix changes that failed to apply,
+        written in `codec`'s format."""
+        lines = document.split("\n")
+        window_lines = self.window_lines
+        while True:
+            sections = []
+            for suggestion, error in failures:
+                windows = merge_ranges(
+                    (max(start - window_lines, 0), end + window_lines)
+                    for start, end in locate_lines(suggestion.search, lines)[
+                        : self.max_excerpts
+                    ]
+                )
+                excerpts = ["\n".join(lines[start:end]) for start, end in windows]
+                excerpt_text = "\n...\n".join(excerpts) or "(no similar text found)"
+                sections.append(
+                    f"{codec.format_edit(suggestion)}\nApplying it failed with the error: {error}\n\nThe closest part of the resume currently reads:\n\n{excerpt_text}"
+                )
+
+            compact = [
+                self._rules_message(codec),
+                {
+                    "role": "user",
+                    "content": f"The following changes could not be applied to the resume. Provide them again, corrected to match the current resume exactly, in the {codec.format_name} format.\n\n"
+                    + "\n\n".join(sections),
+                },
+            ]
+
+            if estimate_tokens(compact) <= self.token_budget or window_lines == 0:
+                break
+            window_lines //= 2
+
+        self._record(session, full_messages, compact)
+        return compact
+
+    def record_response(self, text: str) -> None:
+        """Record a repair response, which a full conversation would resend."""
+        tokens = estimate_tokens([{"role": "assistant", "content": text}])
+        with self._lock:
+            self._history_growth += tokens
+
+    def report(self) -> str:
+        saved = self.full_tokens - self.compact_tokens
+        percent = 100 * saved / self.full_tokens if self.full_tokens else 0
+        return f"Compacted {self.rounds} repair rounds: ~{self.compact_tokens} prompt tokens sent instead of ~{self.full_tokens} (saved ~{saved}, {percent:.0f}%)."
+
+    def _rules_message(self, codec: EditCodec) -> ChatCompletionMessageParam:
+        return {"role": "system", "content": codec.rules_prompt}
+
+    def _record(
+        self,
+        session: BaseChatSession,
+        full_messages: list[ChatCompletionMessageParam],
+        compact: list[ChatCompletionMessageParam],
+    ) -> None:
+        with self._lock:
+            self.rounds += 1
+            self._history_growth += estimate_tokens(full_messages)
+            self.full_tokens += estimate_tokens(session.messages) + self._history_growth
+            self.compact_tokens += estimate_tokens(compact)
@@ -0,0 +1,245 @@
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from .chat import ChatSession, Console
+from .events import Event
+from .pipeline import Pipeline, PipelineOptions
+
+
+class JobStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class Job:
+    """A resume submitted to a `JobServer`.
+
+    A job is also the event consumer for its run's console, so every event
+    is kept (for callers that stream them) until the job is evicted.
+    """
+
+    def __init__(self, resume_contents: str):
+        self.id = uuid.uuid4().hex
+        self.resume_contents = resume_contents
+        self.status = JobStatus.QUEUED
+        self.result: str | None = None
+        self.error: str | None = None
+        self.events: list[Event] = []
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.DONE, JobStatus.FAILED)
+
+    def __call__(self, event: Event) -> None:
+        with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    def close(self) -> None:
+        pass
+
+    def set_status(
+        self, status: JobStatus, result: str | None = None, error: str | None = None
+    ) -> None:
+        with self._changed:
+            self.status = status
+            self.result = result
+            self.error = error
+            self._changed.notify_all()
+
+    def wait_for_events(
+        self, start: int, timeout: float | None = None
+    ) -> tuple[list[Event], bool]:
+        """The events after the first `start`, waiting up to `timeout` for
+        there to be any, and whether the job had finished."""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: len(self.events) > start or self.finished, timeout
+            )
+            return self.events[start:], self.finished
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status.value,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobServer:
+    """Runs resumes through a `Pipeline` for callers over local HTTP.
+
+    The server keeps one warm session (so one `OpenAI` client, with its
+    pool of keep-alive connections, and one cache, scheduler, and set of
+    metrics) that every job forks, and runs at most `jobs` at a time.
+
+    - `POST /jobs` with `{"resume": "..."}` queues a job and returns it.
+    - `GET /jobs/<id>` returns a job's status, and its result once done.
+    - `GET /jobs/<id>/events` streams its events as NDJSON until it's done.
+    - `GET /metrics` returns the metrics summary table for every job so far.
+
+    Use it as a context manager to start and stop it.
+    """
+
+    def __init__(
+        self,
+        session: ChatSession,
+        options: PipelineOptions = PipelineOptions(),
+        jobs: int = 4,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        max_finished_jobs: int = 1000,
+    ):
+        self.session = session
+        self.options = options
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=jobs)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "JobServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def serve_forever(self) -> None:
+        """Handle requests in this thread until interrupted, rather than in
+        the background like the context manager."""
+        self._server.serve_forever()
+
+    def close(self) -> None:
+        """Stop accepting requests and wait for running jobs to finish."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, resume_contents: str) -> Job:
+        job = Job(resume_contents)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._evict_finished()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _evict_finished(self) -> None:
+        """Forget the oldest finished jobs once there are too many."""
+        finished = [job.id for job in self.jobs.values() if job.finished]
+        for job_id in finished[: max(len(finished) - self.max_finished_jobs, 0)]:
+            del self.jobs[job_id]
+
+    def _run(self, job: Job) -> None:
+        job.set_status(JobStatus.RUNNING)
+        console = Console(consumer=job)
+        pipeline = Pipeline(self.session.fork(console), self.options)
+        try:
+            result = pipeline.run(job.resume_contents)
+        except Exception as e:
+            console.emit({"event": "error", "message": f"{type(e).__name__}: {e}"})
+            job.set_status(JobStatus.FAILED, error=str(e))
+            return
+
+        console.print_document(result)
+        job.set_status(JobStatus.DONE, result=result)
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                if self.path != "/jobs":
+                    return self._send_json(404, {"error": "Not found."})
+
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    body = json.loads(self.rfile.read(length))
+                    resume_contents = body["resume"]
+                    if not isinstance(resume_contents, str):
+                        raise TypeError("resume must be a string")
+                except (ValueError, KeyError, TypeError) as e:
+                    return self._send_json(400, {"error": f"Bad job: {e!r}"})
+
+                job = server.submit(resume_contents)
+                self._send_json(202, job.to_json())
+
+            def do_GET(self) -> None:
+                if self.path == "/metrics":
+                    data = (server.session.metrics.summary_table() + "\n").encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; charset=utf-8")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+
+                parts = self.path.strip("/").split("/")
+                job = (
+                    server.get(parts[1])
+                    if parts[:1] == ["jobs"] and len(parts) > 1
+                    else None
+                )
+                if job is None or len(parts) > 3:
+                    return self._send_json(404, {"error": "Not found."})
+
+                if len(parts) == 2:
+                    self._send_json(200, job.to_json())
+                elif parts[2] == "events":
+                    self._stream_events(job)
+                else:
+                    self._send_json(404, {"error": "Not found."})
+
+            def _stream_events(self, job: Job) -> None:
+                # The connection is closed once the job is done, so no length
+                # is needed
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+
+                sent = 0
+                finished = False
+                while not finished:
+                    events, finished = job.wait_for_events(sent)
+                    sent += len(events)
+                    self.wfile.write(
+                        "".join(
+                            json.dumps(event, ensure_ascii=False) + "\n"
+                            for event in events
+                        ).encode()
+                    )
+                    self.wfile.flush()
+
+            def _send_json(self, status: int, data: dict[str, Any]) -> None:
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -0,0 +1,55 @@
+import json
+import urllib.error
+import urllib.request
+from typing import Any, Iterator
+
+from .events import Event
+
+DEFAULT_DAEMON_URL = "http://127.0.0.1:8765"
+
+
+class DaemonError(Exception):
+    """Raised when the daemon can't be reached or rejects a request."""
+
+
+class DaemonClient:
+    """Talks to a running `JobServer`.
+
+    Only the standard library is used, so the `client` command starts
+    quickly.
+    """
+
+    def __init__(self, url: str = DEFAULT_DAEMON_URL):
+        self.url = url.rstrip("/")
+
+    def submit(self, resume_contents: str) -> dict[str, Any]:
+        """Queue a resume and return the new job."""
+        return json.load(
+            self._open(
+                "/jobs",
+                json.dumps({"resume": resume_contents}).encode(),
+            )
+        )
+
+    def status(self, job_id: str) -> dict[str, Any]:
+        return json.load(self._open(f"/jobs/{job_id}"))
+
+    def events(self, job_id: str) -> Iterator[Event]:
+        """Yield a job's events, from the first, as they happen. Stops once
+        the job is done."""
+        with self._open(f"/jobs/{job_id}/events") as response:
+            for line in response:
+                yield json.loads(line)
+
+    def _open(self, path: str, data: bytes | None = None) -> Any:
+        request = urllib.request.Request(
+            self.url + path,
+            data,
+            {"Content-Type": "application/json"} if data is not None else {},
+        )
+        try:
+            return urllib.request.urlopen(request)
+        except urllib.error.HTTPError as e:
+            raise DaemonError(f"{self.url}{path}: {e.code} {e.read().decode()}") from e
+        except urllib.error.URLError as e:
+            raise DaemonError(f"Could not reach {self.url}: {e.reason}") from e
@@ -0,0 +1,31 @@
+import time
+from typing import Callable
+
+
+class BudgetExhausted(RuntimeError):
+    """Raised when a run is out of attempts or out of time."""
+
+
+class Deadline:
+    """When a run has to be finished by.
+
+    Every request in the run gets the time remaining as its timeout, so the
+    run as a whole can't go (much) over.
+    """
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - self.clock(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def request_timeout(self, limit: float | None = None) -> float:
+        """The timeout for a request sent now: the time remaining, but no
+        more than `limit`."""
+        remaining = self.remaining()
+        return remaining if limit is None else min(remaining, limit)
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Callable, Protocol, cast
+
+from . import search_replace_prompts
+from .line_format import (
+    LineAnchors,
+    LineFormatError,
+    lines_example,
+    lines_format_prompt,
+)
+from .metrics import Metrics
+from .search_replace import SearchReplaceResult
+from .search_replace_format import (
+    UnexpectedEndOfInput,
+    UnexpectedFenceError,
+    parse_search_replace_text,
+)
+from .structured_format import (
+    RESPONSE_FORMAT,
+    StructuredFormatError,
+    edits_json,
+    parse_structured_edits,
+    structured_format_prompt,
+)
+
+if TYPE_CHECKING:
+    from openai.types.chat.chat_completion_message_param import (
+        ChatCompletionMessageParam,
+    )
+
+
+class EditFormat(Enum):
+    """How the model is asked to write its changes."""
+
+    SEARCH_REPLACE = "search-replace"
+    "Free-form *SEARCH/REPLACE blocks*."
+
+    JSON = "json"
+    """A JSON object matching `structured_format.EDITS_SCHEMA`, enforced with
+    a `response_format`. Falls back to *SEARCH/REPLACE blocks* for responses
+    that aren't JSON."""
+
+    LINES = "lines"
+    """*LINES blocks* that replace ranges of anchored lines (see
+    `line_format.LineAnchors`), so unchanged text is never copied back."""
+
+
+FORMAT_ERRORS = (
+    UnexpectedFenceError,
+    UnexpectedEndOfInput,
+    StructuredFormatError,
+    LineFormatError,
+)
+"Errors raised when a response can't be parsed in any edit format."
+
+FormatError = (
+    UnexpectedFenceError
+    | UnexpectedEndOfInput
+    | StructuredFormatError
+    | LineFormatError
+)
+
+
+class EditCodec(Protocol):
+    """How changes are asked for and read back in one run, in one edit
+    format. Messages are written for *SEARCH/REPLACE blocks* and rewritten
+    by `convert_messages` before they're sent."""
+
+    streamable: bool
+    "Whether responses can be parsed as they arrive."
+
+    format_name: str
+    "What the format is called in messages to the model."
+
+    rules_prompt: str
+    """The format's instructions on their own, sent in place of the whole
+    conversation by compacted repairs (see `compaction.Compactor`)."""
+
+    def format_reflection(self, error: Exception) -> str:
+        """What to tell the model when its response can't be parsed."""
+        ...
+
+    def format_edit(self, edit: SearchReplaceResult) -> str:
+        """`edit` written in this format, to show the model one of its
+        changes."""
+        ...
+
+    def request_params(self) -> dict[str, Any]:
+        """Extra parameters to send with each request."""
+        ...
+
+    def convert_messages(
+        self, messages: list[ChatCompletionMessageParam]
+    ) -> list[ChatCompletionMessageParam]: ...
+
+    def parse(self, text: str) -> list[SearchReplaceResult]: ...
+
+    def record_used(self, text: str) -> None:
+        """Called with each parsed response whose edits are used, which with
+        several candidates is only the chosen one."""
+        ...
+
+    def update(self, document: str) -> None:
+        """Called with the document after each round of changes is
+        applied."""
+        ...
+
+
+def format_replacements(
+    format_prompt: str, convert_example: Callable[[str], str]
+) -> list[tuple[str, str]]:
+    """What to replace the *SEARCH/REPLACE block* format instructions and
+    example responses with to ask for another format."""
+    return [
+        (search_replace_prompts.format_prompt, format_prompt),
+        *(
+            (content, convert_example(content))
+            for example in search_replace_prompts.examples
+            if example["role"] == "assistant"
+            and isinstance(content := example.get("content"), str)
+        ),
+    ]
+
+
+def replace_in_messages(
+    messages: list[ChatCompletionMessageParam],
+    replacements: list[tuple[str, str]],
+    convert: Callable[[str], str] | None = None,
+) -> list[ChatCompletionMessageParam]:
+    """`messages` with every replacement made in their text, which is then
+    passed through `convert` (if given)."""
+    converted: list[ChatCompletionMessageParam] = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            for old, new in replacements:
+                content = content.replace(old, new)
+            if convert is not None:
+                content = convert(content)
+            message = cast(
+                "ChatCompletionMessageParam", {**message, "content": content}
+            )
+        converted.append(message)
+    return converted
+
+
+_STRUCTURED_REPLACEMENTS = format_replacements(
+    structured_format_prompt,
+    lambda example: edits_json(parse_search_replace_text(example)),
+)
+
+_LINES_REPLACEMENTS = format_replacements(lines_format_prompt, lines_example)
+
+
+class SearchReplaceCodec:
+    streamable = True
+    format_name = "*SEARCH/REPLACE block*"
+    rules_prompt = f"{search_replace_prompts.format_prompt}\n{search_replace_prompts.reminder_prompt}"
+
+    def format_reflection(self, error: Exception) -> str:
+        return f"Your response was not in the correct *SEARCH/REPLACE block* format. Trying to parse it gave the error: {error}. Please try again, ensuring your response follows the correct format."
+
+    def format_edit(self, edit: SearchReplaceResult) -> str:
+        return edit.to_block()
+
+    def request_params(self) -> dict[str, Any]:
+        return {}
+
+    def convert_messages(
+        self, messages: list[ChatCompletionMessageParam]
+    ) -> list[ChatCompletionMessageParam]:
+        return messages
+
+    def parse(self, text: str) -> list[SearchReplaceResult]:
+        return parse_search_replace_text(text)
+
+    def record_used(self, text: str) -> None:
+        pass
+
+    def update(self, document: str) -> None:
+        pass
+
+
+class StructuredCodec(SearchReplaceCodec):
+    streamable = False
+    format_name = "JSON"
+    rules_prompt = structured_format_prompt
+
+    def format_reflection(self, error: Exception) -> str:
+        return f"Your response was not a JSON object of edits in the correct format. Trying to parse it gave the error: {error}. Please try again, responding with only the JSON object described in the instructions."
+
+    def format_edit(self, edit: SearchReplaceResult) -> str:
+        return edits_json([edit]) + "\n"
+
+    def request_params(self) -> dict[str, Any]:
+        return {"response_format": RESPONSE_FORMAT}
+
+    def convert_messages(
+        self, messages: list[ChatCompletionMessageParam]
+    ) -> list[ChatCompletionMessageParam]:
+        """`messages` with the *SEARCH/REPLACE block* format instructions and
+        examples replaced by their JSON equivalents."""
+        return replace_in_messages(messages, _STRUCTURED_REPLACEMENTS)
+
+    def parse(self, text: str) -> list[SearchReplaceResult]:
+        return parse_structured_edits(text)
+
+
+class LinesCodec(LineAnchors):
+    """Asks for changes as *LINES blocks*, resolved by `LineAnchors`."""
+
+    streamable = False
+    format_name = "*LINES block*"
+    rules_prompt = lines_format_prompt
+
+    def format_reflection(self, error: Exception) -> str:
+        return f"Your *LINES blocks* could not be used. Reading them gave the error: {error}. Please try again, ensuring your response follows the *LINES block* format and only uses the anchors that lines have now."
+
+    def format_edit(self, edit: SearchReplaceResult) -> str:
+        # Edits are resolved to *SEARCH/REPLACE blocks* as they're parsed,
+        # and the lines they covered may have moved since, so that's how
+        # they're shown
+        return edit.to_block()
+
+    def request_params(self) -> dict[str, Any]:
+        return {}
+
+    def convert_messages(
+        self, messages: list[ChatCompletionMessageParam]
+    ) -> list[ChatCompletionMessageParam]:
+        """`messages` with the *SEARCH/REPLACE block* format instructions and
+        examples replaced by their *LINES block* equivalents, and the
+        document anchored wherever a message ends with it."""
+        return replace_in_messages(messages, _LINES_REPLACEMENTS, self._anchor)
+
+    def _anchor(self, content: str) -> str:
+        if self.document.strip() and content.endswith(self.document):
+            return content[: -len(self.document)] + self.anchored()
+        return content
+
+
+def create_codec(
+    edit_format: EditFormat, document: str, metrics: Metrics | None = None
+) -> EditCodec:
+    """A codec for a run that starts editing `document`."""
+    if edit_format == EditFormat.JSON:
+        return StructuredCodec()
+    if edit_format == EditFormat.LINES:
+        return LinesCodec(document, metrics)
+
+    return SearchReplaceCodec()
@@ -0,0 +1,187 @@
+import bisect
+from collections import Counter
+from typing import NamedTuple, Sequence
+
+from .search_replace import (
+    MatchTier,
+    MultipleReplacementsError,
+    NoReplacementError,
+    SearchReplaceResult,
+    find_match,
+)
+
+
+class OverlappingEditError(Exception):
+    """Raised when a change's SEARCH text overlaps an earlier change's."""
+
+    def __init__(self, other: SearchReplaceResult):
+        self.other = other
+        first_line = other.search.strip().split("\n")[0]
+        super().__init__(
+            f"The text in the SEARCH section overlaps with the SEARCH section of another *SEARCH/REPLACE block* in the same response (the one whose SEARCH section starts with {first_line!r}). Each block must change a separate part of the resume, combine overlapping changes into a single block."
+        )
+
+
+class ProtectedTextError(Exception):
+    """Raised when a change's SEARCH text includes text that mustn't be
+    changed (ex: the line marking where a file of a project starts)."""
+
+    def __init__(self):
+        super().__init__(
+            "The text in the SEARCH section includes a line marking where a file of the resume starts. Those lines can't be changed: each *SEARCH/REPLACE block* must only change text within a single file and must not include the marker lines."
+        )
+
+
+def _overlaps_protected(
+    protected: Sequence[tuple[int, int]], start: int, end: int
+) -> bool:
+    """Whether `start:end` overlaps any of the sorted, non-overlapping
+    `protected` ranges."""
+    i = bisect.bisect_right(protected, (start, float("inf")))
+    if i > 0 and protected[i - 1][1] > start:
+        return True
+    return i < len(protected) and protected[i][0] < end
+
+
+class PlannedEdit(NamedTuple):
+    start: int
+    end: int
+    change: SearchReplaceResult
+    tier: MatchTier
+
+    replace: str
+    "The replacement, with its indentation re-based to the matched region."
+
+
+class EditPlan(NamedTuple):
+    edits: list[PlannedEdit]
+    "Non-overlapping edits against the original text, sorted by position."
+
+    deferred: list[SearchReplaceResult]
+    "Changes whose SEARCH text wasn't in the original text, in order."
+
+    failures: list[tuple[SearchReplaceResult, Exception]]
+
+    protected: Sequence[tuple[int, int]] = ()
+    "Ranges of the original text that no change may overlap."
+
+    def apply(
+        self, source: str, tier_counts: Counter[MatchTier] | None = None
+    ) -> tuple[list[tuple[SearchReplaceResult, Exception]], str]:
+        """Apply the plan to the text it was made for.
+
+        All planned edits are spliced in at once. Deferred changes are then
+        tried one at a time, since they may match text introduced by earlier
+        changes. The tier each applied change was matched with is counted in
+        `tier_counts`.
+
+        Returns the changes that failed (along with why) and the changed text.
+        """
+        pieces = []
+        position = 0
+        # Where the protected ranges end up in the changed text
+        protected: list[tuple[int, int]] = []
+        shift = 0
+        i = 0
+        for edit in self.edits:
+            while i < len(self.protected) and self.protected[i][1] <= edit.start:
+                start, end = self.protected[i]
+                protected.append((start + shift, end + shift))
+                i += 1
+            pieces.append(source[position : edit.start])
+            pieces.append(edit.replace)
+            position = edit.end
+            shift += len(edit.replace) - (edit.end - edit.start)
+        pieces.append(source[position:])
+        changed = "".join(pieces)
+        protected.extend(
+            (start + shift, end + shift) for start, end in self.protected[i:]
+        )
+
+        tiers = [edit.tier for edit in self.edits]
+        failures = list(self.failures)
+        for change in self.deferred:
+            try:
+                match = find_match(change, changed)
+            except (MultipleReplacementsError, NoReplacementError) as e:
+                failures.append((change, e))
+                continue
+
+            if _overlaps_protected(protected, match.start, match.end):
+                failures.append((change, ProtectedTextError()))
+                continue
+
+            changed = changed[: match.start] + match.replace + changed[match.end :]
+            tiers.append(match.tier)
+            shift = len(match.replace) - (match.end - match.start)
+            protected = [
+                (start + shift, end + shift) if start >= match.end else (start, end)
+                for start, end in protected
+            ]
+
+        if tier_counts is not None:
+            tier_counts.update(tiers)
+
+        return failures, changed
+
+
+def plan_edits(
+    changes: list[SearchReplaceResult],
+    source: str,
+    protected: Sequence[tuple[int, int]] = (),
+) -> EditPlan:
+    """Locate every change in `source` and check them against each other.
+
+    Nothing is modified: uniqueness and overlaps are checked for all changes
+    against the original text first, so each failure describes the actual
+    problem with that change rather than a side effect of an earlier one.
+    When two changes overlap the earlier one in the response wins. Changes
+    that wouldn't change anything are skipped once their SEARCH text is
+    found, and changes that overlap one of the sorted `protected` ranges of
+    `source` fail.
+    """
+    located: list[PlannedEdit] = []
+    deferred: list[SearchReplaceResult] = []
+    failures: list[tuple[SearchReplaceResult, Exception]] = []
+    for change in changes:
+        if not change.search and not change.replace:
+            # Nothing to do (ex: how a section that needs no changes is
+            # answered when editing in shards)
+            continue
+
+        no_op = change.search == change.replace
+        try:
+            match = find_match(change, source)
+        except NoReplacementError:
+            deferred.append(change)
+        except MultipleReplacementsError as e:
+            # Where a no-op matches makes no difference
+            if not no_op:
+                failures.append((change, e))
+        else:
+            if no_op:
+                continue
+            if _overlaps_protected(protected, match.start, match.end):
+                failures.append((change, ProtectedTextError()))
+                continue
+
+            located.append(
+                PlannedEdit(match.start, match.end, change, match.tier, match.replace)
+            )
+
+    # Response order decides which of two overlapping changes wins. The
+    # accepted edits never overlap each other, so only the neighbors of where
+    # an edit would be inserted need to be checked.
+    edits: list[PlannedEdit] = []
+    starts: list[int] = []
+    for edit in located:
+        i = bisect.bisect_right(starts, edit.start)
+        if i > 0 and edits[i - 1].end > edit.start:
+            failures.append((edit.change, OverlappingEditError(edits[i - 1].change)))
+        elif i < len(edits) and edits[i].start < edit.end:
+            failures.append((edit.change, OverlappingEditError(edits[i].change)))
+        else:
+            edits.insert(i, edit)
+            starts.insert(i, edit.start)
+
+    return EditPlan(edits, deferred, failures, protected)
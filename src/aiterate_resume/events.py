@@ -0,0 +1,119 @@
+import io
+import json
+import os
+import threading
+from typing import Any, Protocol, TextIO
+
+Event = dict[str, Any]
+"""Something that happened during a run, as a JSON-serializable dict.
+
+Every event has an `"event"` key saying what kind it is:
+
+- `message`: A chat message sent or received (`role`, `content`, and
+  `verbose`, which is true for messages only shown in verbose mode).
+- `block`: A *SEARCH/REPLACE block* parsed from a response (`search`,
+  `replace`, `reason`).
+- `edit`: A block applied to the resume or rejected (`status` is `"applied"`
+  or `"rejected"`, plus `search`, `replace`, and `error` if rejected).
+- `round`: A round of a multi-round run finished (`number`,
+  `changed_lines`, and `diff`, a unified diff of what it changed).
+- `status`: A progress or summary message (`message`).
+- `error`: A fatal error (`message`).
+- `document`: The final resume (`content`).
+"""
+
+
+class EventConsumer(Protocol):
+    def __call__(self, event: Event) -> None: ...
+
+    def close(self) -> None:
+        """Flush anything buffered. Called once the run is over."""
+        ...
+
+
+class RichRenderer:
+    """Renders events as colored text for people to read."""
+
+    def __init__(self, verbose: bool = False):
+        self.verbose = verbose
+        self._console = None
+
+    def __call__(self, event: Event) -> None:
+        kind = event["event"]
+        if kind == "document":
+            print(event["content"])
+            return
+
+        # rich takes a while to import, so it's only imported once something
+        # is actually rendered
+        from rich.text import Text
+
+        if kind == "message":
+            if event["verbose"] and not self.verbose:
+                return
+
+            color = "green" if event["role"] == "assistant" else "blue"
+            text = Text(event["role"], style="underline")
+            if event["content"]:
+                text.append("\n")
+                text.append(
+                    "\n".join(f"> {line}" for line in event["content"].splitlines()),
+                    style=color,
+                )
+            self._print(text)
+        elif kind == "round":
+            self._print(
+                Text(
+                    f"Round {event['number']}: {event['changed_lines']} lines changed.",
+                    style="dim",
+                )
+            )
+            if self.verbose and event["diff"]:
+                text = Text()
+                for line in event["diff"].splitlines():
+                    style = {"+": "green", "-": "red", "@": "cyan"}.get(line[:1])
+                    text.append(line + "\n", style=style)
+                self._print(text)
+        elif kind == "status":
+            self._print(Text(event["message"], style="dim"))
+        elif kind == "error":
+            self._print(Text(event["message"], style="red"))
+
+    def close(self) -> None:
+        pass
+
+    def _print(self, text: Any) -> None:
+        if self._console is None:
+            from rich.console import Console
+
+            self._console = Console()
+        self._console.print(text)
+
+
+class NdjsonWriter:
+    """Writes each event as a line of JSON (NDJSON).
+
+    Writes are buffered, so the output is only complete once `close()` has
+    been called. Events may be written from several threads at once.
+    """
+
+    def __init__(self, file: TextIO):
+        self.file = file
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def open_fd(fd: int, buffer_size: int = 64 * 1024) -> "NdjsonWriter":
+        """Write to an already open file descriptor (ex: 1 for stdout),
+        which is left open."""
+        raw = os.fdopen(fd, "wb", buffering=0, closefd=False)
+        buffered = io.BufferedWriter(raw, buffer_size=buffer_size)
+        return NdjsonWriter(io.TextIOWrapper(buffered, encoding="utf-8"))
+
+    def __call__(self, event: Event) -> None:
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.file.write(line)
+
+    def close(self) -> None:
+        with self._lock:
+            self.file.flush()
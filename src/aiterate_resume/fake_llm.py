@@ -0,0 +1,390 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Callable, Iterable, Iterator, Mapping, NamedTuple
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
+
+from .tokens import estimate_tokens
+from .search_replace import SearchReplaceResult
+
+Responder = Callable[[list[ChatCompletionMessageParam]], str]
+
+
+def block(search: str, replace: str, reason: str = "Reason.") -> str:
+    """A well-formed *SEARCH/REPLACE block* for scripting responses."""
+    return SearchReplaceResult(search, replace, reason).to_block()
+
+
+class FakeStream:
+    def __init__(self, chunks: list[ChatCompletionChunk], chunk_latency: float):
+        self.chunks = chunks
+        self.chunk_latency = chunk_latency
+        self.closed = False
+
+    def __iter__(self) -> Iterator[ChatCompletionChunk]:
+        for chunk in self.chunks:
+            if self.closed:
+                return
+            if self.chunk_latency:
+                time.sleep(self.chunk_latency)
+            yield chunk
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def completion_payload(
+    model: str, messages: list[ChatCompletionMessageParam], contents: list[str]
+) -> dict[str, Any]:
+    """A chat completion with a choice for each of `contents`, as JSON."""
+    return {
+        "id": "fake",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [
+            {
+                "index": i,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }
+            for i, content in enumerate(contents)
+        ],
+        "usage": _usage(messages, contents),
+    }
+
+
+def chunk_payloads(
+    model: str,
+    messages: list[ChatCompletionMessageParam],
+    content: str,
+    chunk_size: int,
+    include_usage: bool,
+) -> list[dict[str, Any]]:
+    """The chunks of a streamed chat completion, as JSON."""
+    chunks: list[dict[str, Any]] = [
+        {
+            "id": "fake",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": model,
+            "choices": [
+                {"index": 0, "delta": {"content": content[i : i + chunk_size]}}
+            ],
+        }
+        for i in range(0, len(content), chunk_size)
+    ]
+    if include_usage:
+        chunks.append(
+            {
+                "id": "fake",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": model,
+                "choices": [],
+                "usage": _usage(messages, [content]),
+            }
+        )
+
+    return chunks
+
+
+def _usage(
+    messages: list[ChatCompletionMessageParam], contents: list[str]
+) -> dict[str, int]:
+    prompt_tokens = estimate_tokens(messages)
+    completion_tokens = sum(
+        estimate_tokens([{"role": "assistant", "content": content}])
+        for content in contents
+    )
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+class FakeRawResponse:
+    """What `with_raw_response.create` returns, minus the HTTP details."""
+
+    def __init__(self, parsed: Any, headers: Mapping[str, str]):
+        self.headers = headers
+        self._parsed = parsed
+
+    def parse(self) -> Any:
+        return self._parsed
+
+
+class FakeCompletions:
+    def __init__(self, client: "FakeClient"):
+        self.client = client
+        self.with_raw_response = SimpleNamespace(create=self._create_raw)
+
+    def create(
+        self,
+        *,
+        model: str,
+        messages: list[ChatCompletionMessageParam],
+        n: int = 1,
+        stream: bool = False,
+        **kwargs: Any,
+    ) -> ChatCompletion | FakeStream:
+        client = self.client
+        contents = [client.next_response(messages) for _ in range(n)]
+        with client.lock:
+            client.requests.append(
+                {"model": model, "messages": list(messages), "n": n, **kwargs}
+            )
+
+        if client.latency:
+            timeout = kwargs.get("timeout")
+            if timeout is not None and timeout < client.latency:
+                time.sleep(timeout)
+                raise TimeoutError("The fake request timed out.")
+            time.sleep(client.latency)
+
+        if stream:
+            chunks = chunk_payloads(
+                model,
+                messages,
+                contents[0],
+                client.chunk_size,
+                kwargs.get("stream_options", {}).get("include_usage", False),
+            )
+            return FakeStream(
+                [ChatCompletionChunk.model_validate(chunk) for chunk in chunks],
+                client.chunk_latency,
+            )
+
+        return ChatCompletion.model_validate(
+            completion_payload(model, messages, contents)
+        )
+
+    def _create_raw(self, **kwargs: Any) -> FakeRawResponse:
+        return FakeRawResponse(self.create(**kwargs), self.client.headers)
+
+
+class FakeClient:
+    """A deterministic stand-in for `OpenAI` that replays scripted responses.
+
+    It supports the same `client.chat.completions.create(...)` interface
+    `ChatSession` uses, so the whole pipeline can be tested and benchmarked
+    without calling OpenAI.
+
+    `responses` is either a sequence of response texts (which may include
+    malformed fences or searches that don't match, to exercise reflection)
+    or a function that builds a response from the request's messages.
+
+    `latency` is slept before every response, and `chunk_latency` before
+    every streamed chunk of `chunk_size` characters. Requests whose `timeout`
+    is shorter than `latency` raise `TimeoutError` once it's up.
+    """
+
+    def __init__(
+        self,
+        responses: Iterable[str] | Responder,
+        latency: float = 0.0,
+        chunk_size: int = 16,
+        chunk_latency: float = 0.0,
+        headers: Mapping[str, str] | None = None,
+    ):
+        self.responder = responses if callable(responses) else None
+        self.responses = [] if callable(responses) else list(responses)
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_latency = chunk_latency
+
+        self.headers = dict(headers or {})
+        "Headers of every raw response (ex: rate limits)."
+
+        self.requests: list[dict[str, Any]] = []
+        "The parameters of every request made, in order."
+
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=FakeCompletions(self))
+
+    def next_response(self, messages: list[ChatCompletionMessageParam]) -> str:
+        if self.responder:
+            return self.responder(messages)
+
+        with self.lock:
+            if not self.responses:
+                raise RuntimeError("The fake LLM ran out of scripted responses.")
+            return self.responses.pop(0)
+
+
+class FakeAsyncCompletions:
+    def __init__(self, client: "FakeClient"):
+        self.client = client
+        self.with_raw_response = SimpleNamespace(create=self._create_raw)
+
+    async def create(
+        self,
+        *,
+        model: str,
+        messages: list[ChatCompletionMessageParam],
+        n: int = 1,
+        **kwargs: Any,
+    ) -> ChatCompletion:
+        client = self.client
+        contents = [client.next_response(messages) for _ in range(n)]
+        with client.lock:
+            client.requests.append(
+                {"model": model, "messages": list(messages), "n": n, **kwargs}
+            )
+
+        if client.latency:
+            timeout = kwargs.get("timeout")
+            if timeout is not None and timeout < client.latency:
+                await asyncio.sleep(timeout)
+                raise TimeoutError("The fake request timed out.")
+            await asyncio.sleep(client.latency)
+
+        return ChatCompletion.model_validate(
+            completion_payload(model, messages, contents)
+        )
+
+    async def _create_raw(self, **kwargs: Any) -> FakeRawResponse:
+        return FakeRawResponse(await self.create(**kwargs), self.client.headers)
+
+
+class FakeAsyncClient(FakeClient):
+    """A `FakeClient` with the interface of `AsyncOpenAI` that
+    `AsyncChatSession` uses. Responses can't be streamed, and `latency` is
+    awaited rather than slept."""
+
+    def __init__(
+        self,
+        responses: Iterable[str] | Responder,
+        latency: float = 0.0,
+        headers: Mapping[str, str] | None = None,
+    ):
+        super().__init__(responses, latency, headers=headers)
+        self.chat = SimpleNamespace(completions=FakeAsyncCompletions(self))
+
+
+class FakeHTTPError(NamedTuple):
+    """A scripted error reply from `FakeLLMServer`."""
+
+    status: int
+    headers: dict[str, str] = {}
+    message: str = "Scripted error."
+
+
+class FakeLLMServer:
+    """A local HTTP server that speaks enough of the chat completions API for
+    a real `OpenAI` client (pointed at `url`) to talk to it.
+
+    Each request gets the next of `replies`: response text, or a
+    `FakeHTTPError` to exercise rate limiting and retries. `headers` are sent
+    with every successful reply. Use it as a context manager to start and
+    stop it.
+    """
+
+    def __init__(
+        self,
+        replies: Iterable[str | FakeHTTPError],
+        headers: Mapping[str, str] | None = None,
+    ):
+        self.replies = list(replies)
+        self.headers = dict(headers or {})
+
+        self.requests: list[dict[str, Any]] = []
+        "The JSON body of every request received, in order."
+
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "FakeLLMServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next_reply(self, body: dict[str, Any]) -> str | FakeHTTPError:
+        with self.lock:
+            self.requests.append(body)
+            if not self.replies:
+                return FakeHTTPError(500, message="Out of scripted replies.")
+            return self.replies.pop(0)
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length))
+                reply = server._next_reply(body)
+
+                if isinstance(reply, FakeHTTPError):
+                    self._send(
+                        reply.status,
+                        "application/json",
+                        json.dumps({"error": {"message": reply.message}}),
+                        reply.headers,
+                    )
+                elif body.get("stream"):
+                    chunks = chunk_payloads(
+                        body["model"],
+                        body["messages"],
+                        reply,
+                        16,
+                        body.get("stream_options", {}).get("include_usage", False),
+                    )
+                    events = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks)
+                    self._send(
+                        200,
+                        "text/event-stream",
+                        events + "data: [DONE]\n\n",
+                        server.headers,
+                    )
+                else:
+                    contents = [reply]
+                    for _ in range(body.get("n", 1) - 1):
+                        extra = server._next_reply(body)
+                        contents.append(extra if isinstance(extra, str) else reply)
+                    self._send(
+                        200,
+                        "application/json",
+                        json.dumps(
+                            completion_payload(
+                                body["model"], body["messages"], contents
+                            )
+                        ),
+                        server.headers,
+                    )
+
+            def _send(
+                self,
+                status: int,
+                content_type: str,
+                text: str,
+                headers: Mapping[str, str],
+            ) -> None:
+                data = text.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import difflib
+import re
+import zlib
+from typing import NamedTuple
+
+from .metrics import Metrics
+from .search_replace import SearchReplaceResult
+from .search_replace_format import parse_search_replace_text
+from .tokens import estimate_tokens
+
+
+class LineFormatError(Exception):
+    """Raised when a response's *LINES blocks* can't be read, or refer to
+    lines that don't exist or have changed since they were shown."""
+
+
+_BLOCK_START_RE = re.compile(
+    r"<<<<<<< LINES (?:NONE|(\d+):([0-9a-f]{3})(?:-(\d+):([0-9a-f]{3}))?)[ \t]*"
+)
+_BLOCK_START = "<<<<<<< LINES"
+_BLOCK_END = ">>>>>>> END"
+
+
+def line_hash(line: str) -> str:
+    """A short hash of a line's content, so anchors to lines that have
+    changed since they were shown can be detected."""
+    return f"{zlib.crc32(line.encode()) & 0xFFF:03x}"
+
+
+def anchor(line_id: int, line: str) -> str:
+    return f"{line_id}:{line_hash(line)}"
+
+
+class LineEdit(NamedTuple):
+    """A *LINES block*, before its anchors are resolved."""
+
+    start: tuple[int, str] | None
+    "The id and hash of the first line to replace, or None for no change."
+
+    end: tuple[int, str] | None
+    replace: list[str]
+    reason: str
+
+
+def parse_line_edits(text: str) -> list[LineEdit]:
+    """Parse the *LINES blocks* in a response.
+
+    Raises:
+        LineFormatError: If a block isn't closed or its start line is
+            malformed, or there are no blocks at all.
+    """
+    edits: list[LineEdit] = []
+    header: re.Match[str] | None = None
+    body: list[str] = []
+    reason: list[str] = []
+
+    def finish_reason() -> None:
+        if edits and reason:
+            edits[-1] = edits[-1]._replace(reason="\n".join(reason).strip())
+        reason.clear()
+
+    for line in text.split("\n"):
+        if line.startswith(_BLOCK_START):
+            if header is not None:
+                raise LineFormatError(
+                    f"A new `{_BLOCK_START}` line came before the last block's "
+                    f"`{_BLOCK_END}` line."
+                )
+            header = _BLOCK_START_RE.fullmatch(line.rstrip())
+            if header is None:
+                raise LineFormatError(
+                    f"`{line}` is not a valid block start. It must be "
+                    f"`{_BLOCK_START} ` followed by an anchor (ex: `12:a3f`), a "
+                    "range of anchors (ex: `12:a3f-14:0bc`), or `NONE`."
+                )
+            finish_reason()
+            body = []
+        elif header is not None and line.rstrip() == _BLOCK_END:
+            start_id, start_hash, end_id, end_hash = header.groups()
+            start = (int(start_id), start_hash) if start_id else None
+            end = (int(end_id), end_hash) if end_id else start
+            edits.append(LineEdit(start, end, body, ""))
+            header = None
+        elif header is not None:
+            body.append(line)
+        else:
+            reason.append(line)
+
+    if header is not None:
+        raise LineFormatError(
+            f"The response ended before the last block's `{_BLOCK_END}` line."
+        )
+    if not edits:
+        if "<<<<<<< SEARCH" in text:
+            raise LineFormatError(
+                "Changes must be written as *LINES blocks*, not *SEARCH/REPLACE "
+                "blocks*."
+            )
+        raise LineFormatError(f"No `{_BLOCK_START}` blocks were found.")
+    finish_reason()
+
+    return edits
+
+
+lines_format_prompt: str = f"""Each line of the resume is shown after an anchor: its line number and a short hash of its content, followed by `|` (ex: `12:a3f|  <li>Led a team of four.</li>`). Anchors are not part of the resume.
+
+Once you understand the request you MUST provide each change as a *LINES block* that replaces a range of lines, per the examples below:
+1. The start of the block: `{_BLOCK_START} ` followed by the anchor of the first line to replace and, to replace more than one line, `-` and the anchor of the last line (ex: `{_BLOCK_START} 12:a3f-14:0bc`)
+2. The lines to replace them with, without anchors (no lines at all deletes them)
+3. The end of the block: {_BLOCK_END}
+4. The reason for the change.
+
+Only include the lines that change, never unchanged lines around them. Copy each anchor exactly as shown.
+
+A *LINES block* takes the place of a *SEARCH/REPLACE block*. A *SEARCH/REPLACE block* with empty SEARCH and REPLACE sections is written as `{_BLOCK_START} NONE` followed by `{_BLOCK_END}`.
+
+You MUST provide a reason why each change is needed. Reference specific resume-writing guidelines in each reason. Provide that reason after each *LINES block*. Do not write `Reason:` or any other markup to denote that the text is the reason.
+
+Do not provide any other text or formatting outside of the *LINES blocks* and reasons.
+"""
+
+
+def lines_example(fence_text: str) -> str:
+    """Rewrite an example response as *LINES blocks* that replace only the
+    lines that changed."""
+    blocks = []
+    line_id = 14
+    for result in parse_search_replace_text(fence_text):
+        search = result.search.split("\n")
+        replace = result.replace.split("\n")
+        opcodes = [
+            opcode
+            for opcode in difflib.SequenceMatcher(
+                None, search, replace, autojunk=False
+            ).get_opcodes()
+            if opcode[0] != "equal"
+        ]
+        first, last = opcodes[0], opcodes[-1]
+        start, end = first[1], max(last[2] - 1, first[1])
+        header = anchor(line_id + start, search[start])
+        if end > start:
+            header += f"-{anchor(line_id + end, search[end])}"
+        replacement = replace[first[3] : last[4]]
+        blocks.append(
+            "\n".join([f"{_BLOCK_START} {header}", *replacement, _BLOCK_END])
+            + f"\n\n{result.reason}\n"
+        )
+        line_id += 17
+
+    return "\n".join(blocks)
+
+
+def _split_lines(document: str) -> list[str]:
+    lines = document.split("\n")
+    if document.endswith("\n"):
+        # Not a line, just the end of the last one
+        lines.pop()
+    return lines
+
+
+class LineAnchors:
+    """Anchors a document's lines and resolves *LINES blocks* against the
+    document they were made to (see `edit_formats.LinesCodec` for the codec
+    that asks for them).
+
+    Each line keeps the id it was first shown with for the rest of the run,
+    even as lines are added and removed around it, so anchors the model saw
+    earlier in the conversation stay valid. Call `update` with the document
+    after each round of changes is applied. Anchors whose hash no longer
+    matches their line (because it has since changed) or to lines that don't
+    exist are rejected with a `LineFormatError`, which is reflected on like
+    any other format error.
+
+    Each parsed response is converted into the equivalent
+    *SEARCH/REPLACE blocks*, so they're applied like any others. How many
+    output tokens a response whose edits are used took compared to those
+    blocks is recorded in `metrics` by `record_used`.
+    """
+
+    def __init__(self, document: str, metrics: Metrics | None = None):
+        self.metrics = metrics
+        self.document = ""
+        self._lines: list[str] = []
+        self._ids: list[int] = []
+        self._positions: dict[int, int] = {}
+        self._next_id = 1
+        self.update(document)
+
+    def update(self, document: str) -> None:
+        """Carry line ids over to the changed `document`, giving new ids to
+        added lines."""
+        lines = _split_lines(document)
+        ids: list[int] = []
+        matcher = difflib.SequenceMatcher(None, self._lines, lines, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            # Changed lines keep their ids (so anchors to them are caught by
+            # their hashes), and only added lines get new ones
+            kept = min(i2 - i1, j2 - j1)
+            ids.extend(self._ids[i1 : i1 + kept])
+            added = j2 - j1 - kept
+            ids.extend(range(self._next_id, self._next_id + added))
+            self._next_id += added
+
+        self.document = document
+        self._lines = lines
+        self._ids = ids
+        self._positions = {line_id: i for i, line_id in enumerate(ids)}
+
+    def anchored(self) -> str:
+        """The document with every line anchored."""
+        return "\n".join(
+            f"{anchor(line_id, line)}|{line}"
+            for line_id, line in zip(self._ids, self._lines)
+        )
+
+    def parse(self, text: str) -> list[SearchReplaceResult]:
+        """Parse a response and resolve its anchors.
+
+        Raises:
+            LineFormatError: If the response can't be parsed or any anchor is
+                stale, listing every bad anchor.
+        """
+        results = []
+        errors = []
+        for edit in parse_line_edits(text):
+            try:
+                results.append(self._resolve(edit))
+            except LineFormatError as e:
+                errors.append(str(e))
+
+        if errors:
+            raise LineFormatError(" ".join(errors))
+        return results
+
+    def record_used(self, text: str) -> None:
+        """Record the output tokens saved by a response whose edits are used
+        (`text` must have been parsed against the current document).
+
+        This is separate from `parse`, so responses that are parsed but not
+        used (ex: candidates that weren't chosen) aren't counted.
+        """
+        if self.metrics is None:
+            return
+
+        written = [self._written(edit) for edit in parse_line_edits(text)]
+        self.metrics.record_edit_tokens(
+            estimate_tokens([{"role": "assistant", "content": text}]),
+            estimate_tokens(
+                [
+                    {
+                        "role": "assistant",
+                        "content": "\n".join(result.to_block() for result in written),
+                    }
+                ]
+            ),
+        )
+
+    def _position(self, line: tuple[int, str]) -> int:
+        line_id, given_hash = line
+        position = self._positions.get(line_id)
+        if position is None:
+            raise LineFormatError(f"Line {line_id} doesn't exist.")
+
+        actual_hash = line_hash(self._lines[position])
+        if actual_hash != given_hash:
+            raise LineFormatError(
+                f"The anchor {line_id}:{given_hash} is stale, line {line_id} is "
+                f"now {line_id}:{actual_hash}|{self._lines[position]}"
+            )
+        return position
+
+    def _written(self, edit: LineEdit) -> SearchReplaceResult:
+        """The *SEARCH/REPLACE block* the model would have written instead."""
+        if edit.start is None or edit.end is None:
+            return SearchReplaceResult("", "", edit.reason)
+
+        lines = self._lines[self._position(edit.start) : self._position(edit.end) + 1]
+        return SearchReplaceResult(
+            "\n".join(lines), "\n".join(edit.replace), edit.reason
+        )
+
+    def _resolve(self, edit: LineEdit) -> SearchReplaceResult:
+        """The *SEARCH/REPLACE block* that makes `edit`, with whole lines of
+        context added before it until its *SEARCH* section is unique."""
+        if edit.start is None or edit.end is None:
+            return SearchReplaceResult("", "", edit.reason)
+
+        start = self._position(edit.start)
+        end = self._position(edit.end)
+        if end < start:
+            raise LineFormatError(
+                f"The range {edit.start[0]}-{edit.end[0]} ends before it starts."
+            )
+
+        search = "\n".join(self._lines[start : end + 1])
+        replace = "\n".join(edit.replace)
+        if end < len(self._lines) - 1 or self.document.endswith("\n"):
+            # Include the line break, so deleting lines doesn't leave blank
+            # ones behind
+            search += "\n"
+            replace = replace + "\n" if edit.replace else ""
+        elif not edit.replace and start > 0:
+            # Deleting the last line, which has no line break after it, so
+            # the one before it is removed instead
+            start -= 1
+            search = self._lines[start] + "\n" + search
+            replace = self._lines[start]
+
+        while self.document.count(search) > 1:
+            if start > 0:
+                start -= 1
+                search = self._lines[start] + "\n" + search
+                replace = self._lines[start] + "\n" + replace
+            elif search.endswith("\n") and end < len(self._lines) - 1:
+                # Already at the start of the document, so add the line after
+                end += 1
+                line = self._lines[end]
+                if end < len(self._lines) - 1 or self.document.endswith("\n"):
+                    line += "\n"
+                search += line
+                replace += line
+            else:
+                break
+
+        return SearchReplaceResult(search, replace, edit.reason)
@@ -0,0 +1,161 @@
+import difflib
+import heapq
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+from .search_replace import SearchReplaceResult
+
+GRAM_SIZE = 3
+
+# How many of the most similar lines each SEARCH line votes for
+_VOTES_PER_LINE = 5
+
+
+def _grams(line: str) -> set[str]:
+    """The character trigrams of a line, ignoring indentation. Lines too short
+    to have any are their own gram."""
+    line = line.strip()
+    if len(line) < GRAM_SIZE:
+        return {line} if line else set()
+    return {line[i : i + GRAM_SIZE] for i in range(len(line) - GRAM_SIZE + 1)}
+
+
+class Region(NamedTuple):
+    start: int
+    end: int
+    "The line range of the region, end exclusive."
+
+    similarity: float
+    "How similar the region is to the search, from 0 to 1."
+
+
+class MatchIndex:
+    """An index of a document's lines by their character trigrams.
+
+    Used to find what a SEARCH section that failed to match was most likely
+    meant to match. Each line of the search votes for where a region could
+    start based on the lines it shares the most trigrams with, and only the
+    few best starts are compared in full. The document is never diffed as a
+    whole, so this stays fast on long resumes.
+    """
+
+    def __init__(self, document: str):
+        self.lines = document.split("\n")
+        self._line_grams = [_grams(line) for line in self.lines]
+        self._postings: defaultdict[str, list[int]] = defaultdict(list)
+        for i, grams in enumerate(self._line_grams):
+            for gram in grams:
+                self._postings[gram].append(i)
+
+        self._stripped: defaultdict[str, list[int]] = defaultdict(list)
+        for i, line in enumerate(self.lines):
+            self._stripped[line.strip()].append(i)
+
+    def text(self, start: int, end: int) -> str:
+        return "\n".join(self.lines[start:end])
+
+    def closest(
+        self, search: str, limit: int = 3, min_similarity: float = 0.3
+    ) -> list[Region]:
+        """The non-overlapping regions most similar to `search`, best first."""
+        search_lines = search.split("\n")
+        votes: defaultdict[int, float] = defaultdict(float)
+        for offset, line in enumerate(search_lines):
+            grams = _grams(line)
+            if not grams:
+                continue
+
+            shared: Counter[int] = Counter()
+            for gram in grams:
+                shared.update(self._postings.get(gram, ()))
+            for i, count in shared.most_common(_VOTES_PER_LINE):
+                votes[i - offset] += 2 * count / (len(grams) + len(self._line_grams[i]))
+
+        # Compare the best starts in full, allowing for a line more or less
+        # than the search has
+        width = len(search_lines)
+        regions = []
+        for start in heapq.nlargest(limit * 3, votes, key=votes.__getitem__):
+            for size in (width - 1, width, width + 1):
+                first = max(start, 0)
+                end = min(start + size, len(self.lines))
+                if end <= first:
+                    continue
+                similarity = difflib.SequenceMatcher(
+                    None, search, self.text(first, end), autojunk=False
+                ).ratio()
+                if similarity >= min_similarity:
+                    regions.append(Region(first, end, similarity))
+
+        chosen: list[Region] = []
+        for region in sorted(regions, key=lambda region: -region.similarity):
+            if all(
+                region.end <= other.start or other.end <= region.start
+                for other in chosen
+            ):
+                chosen.append(region)
+                if len(chosen) == limit:
+                    break
+        return chosen
+
+    def occurrences(self, search: str) -> list[tuple[int, int]]:
+        """The line ranges `search` occurs at, exactly or ignoring
+        indentation (the same as the tiers of `search_replace.find_match`)."""
+        # A search ending in a newline ends with its last line, not the
+        # empty one after it
+        search_lines = search.removesuffix("\n").split("\n")
+        document = "\n".join(self.lines)
+        ranges = []
+        start = document.find(search) if search else -1
+        while start != -1:
+            first = document.count("\n", 0, start)
+            ranges.append((first, first + len(search_lines)))
+            start = document.find(search, start + 1)
+        if ranges:
+            return ranges
+
+        wanted = [line.strip() for line in search_lines]
+        if not any(wanted):
+            return []
+        return [
+            (i, i + len(wanted))
+            for i in self._stripped.get(wanted[0], ())
+            if [line.strip() for line in self.lines[i : i + len(wanted)]] == wanted
+        ]
+
+    def distinguishing_context(
+        self, ranges: list[tuple[int, int]], max_context: int = 3
+    ) -> list[str]:
+        """The text of each range along with the fewest surrounding lines (up
+        to `max_context` on each side) that make it occur only once."""
+        document = "\n".join(self.lines)
+        excerpts = []
+        for start, end in ranges:
+            excerpt = self.text(start, end)
+            for context in range(1, max_context + 1):
+                excerpt = self.text(max(start - context, 0), end + context)
+                if document.count(excerpt) == 1:
+                    break
+            excerpts.append(excerpt)
+        return excerpts
+
+
+def describe_no_match(index: MatchIndex, change: SearchReplaceResult) -> str:
+    regions = index.closest(change.search, limit=1)
+    if not regions:
+        return "Nothing similar to the SEARCH section was found in the resume."
+
+    best = regions[0]
+    return f"The most similar text in the resume is below. If this is the text you meant to change, the SEARCH section must match it exactly:\n\n{index.text(best.start, best.end)}"
+
+
+def describe_multiple_matches(index: MatchIndex, change: SearchReplaceResult) -> str:
+    ranges = index.occurrences(change.search)
+    if len(ranges) < 2:
+        return ""
+
+    excerpts = "\n\n".join(
+        f"Occurrence {i}:\n{excerpt}"
+        for i, excerpt in enumerate(index.distinguishing_context(ranges), 1)
+    )
+    return f"The SEARCH section matches each of the parts of the resume below. Include some of the lines around the one you meant to change so only it matches:\n\n{excerpts}"
@@ -0,0 +1,241 @@
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, NamedTuple, TextIO
+
+MetricsHook = Callable[[dict[str, Any]], None]
+
+
+class Span(NamedTuple):
+    name: str
+    "What was timed (ex: request, parse, apply)."
+
+    start: float
+    "Seconds since the metrics started being collected."
+
+    duration: float
+    attributes: dict[str, Any]
+
+
+class Metrics:
+    """Collects timing, token usage, reflection and retry causes, how often
+    each phase's requests succeed, and the output tokens saved by
+    line-anchored edits for a run.
+
+    Every span, usage report, reflection, retry, outcome, and edit token
+    count is also passed to each hook as an event (a JSON-serializable dict
+    with an `"event"` key) as soon as it's recorded, so it can be forwarded
+    to another collector. Hooks may be called from several threads at once.
+    """
+
+    def __init__(self):
+        self.spans: list[Span] = []
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+        self.reflections: Counter[str] = Counter()
+        """How many reflections were needed, by the name of the error's type
+        (or its `cause`, for errors restored from a checkpoint)."""
+
+        self.retries: Counter[str] = Counter()
+        "How many transport retries were needed, by the name of the error's type."
+
+        self.outcomes: Counter[tuple[str, str, bool]] = Counter()
+        """How many requests' responses did and didn't parse and apply
+        cleanly, by phase, model, and whether they did."""
+
+        self.edit_tokens = 0
+        "Estimated output tokens used to write line-anchored edits."
+
+        self.search_replace_tokens = 0
+        """Estimated output tokens the same edits would have used as
+        *SEARCH/REPLACE blocks*."""
+
+        self.hooks: list[MetricsHook] = []
+        self._closers: list[Callable[[], None]] = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_hook(
+        self, hook: MetricsHook, close: Callable[[], None] | None = None
+    ) -> None:
+        """Pass events to `hook`. `close` (ex: closing the file the hook
+        writes to) is called by `close`."""
+        self.hooks.append(hook)
+        if close is not None:
+            self._closers.append(close)
+
+    def close(self) -> None:
+        """Release whatever the hooks hold. Called once the run is over."""
+        for close in self._closers:
+            close()
+        self._closers.clear()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[dict[str, Any]]:
+        """Time the body of a `with` block.
+
+        The span's attributes are yielded, so more can be added once they're
+        known (ex: how many changes failed).
+        """
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self.record_span(name, start, time.perf_counter() - start, **attributes)
+
+    def record_span(
+        self, name: str, start: float, duration: float, **attributes: Any
+    ) -> None:
+        """Record a span that was timed elsewhere. `start` is a
+        `time.perf_counter()` value."""
+        span = Span(name, start - self._started, duration, attributes)
+        with self._lock:
+            self.spans.append(span)
+        self._emit(
+            {
+                "event": "span",
+                "name": name,
+                "start": span.start,
+                "duration": duration,
+                **attributes,
+            }
+        )
+
+    def record_usage(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        self._emit(
+            {
+                "event": "usage",
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+            }
+        )
+
+    def record_reflection(self, error: Exception) -> None:
+        cause = getattr(error, "cause", type(error).__name__)
+        with self._lock:
+            self.reflections[cause] += 1
+        self._emit({"event": "reflection", "cause": cause, "message": str(error)})
+
+    def record_retry(self, error: Exception, delay: float) -> None:
+        cause = type(error).__name__
+        with self._lock:
+            self.retries[cause] += 1
+        self._emit(
+            {"event": "retry", "cause": cause, "message": str(error), "delay": delay}
+        )
+
+    def record_outcome(self, phase: str, model: str, succeeded: bool) -> None:
+        with self._lock:
+            self.outcomes[phase, model, succeeded] += 1
+        self._emit(
+            {
+                "event": "outcome",
+                "phase": phase,
+                "model": model,
+                "succeeded": succeeded,
+            }
+        )
+
+    def record_edit_tokens(self, edit_tokens: int, search_replace_tokens: int) -> None:
+        """Record how many output tokens a response's edits took, and how
+        many they would have taken as *SEARCH/REPLACE blocks*."""
+        with self._lock:
+            self.edit_tokens += edit_tokens
+            self.search_replace_tokens += search_replace_tokens
+        self._emit(
+            {
+                "event": "edit_tokens",
+                "edit_tokens": edit_tokens,
+                "search_replace_tokens": search_replace_tokens,
+            }
+        )
+
+    def describe_edit_tokens(self) -> str | None:
+        """A summary of the output tokens saved by line-anchored edits, if
+        there were any."""
+        with self._lock:
+            edit_tokens = self.edit_tokens
+            search_replace_tokens = self.search_replace_tokens
+        if not search_replace_tokens:
+            return None
+
+        saved = 1 - edit_tokens / search_replace_tokens
+        return (
+            f"Line-anchored edits: ~{edit_tokens} output tokens, instead of "
+            f"~{search_replace_tokens} as SEARCH/REPLACE blocks ({saved:.0%} saved)."
+        )
+
+    def summary_table(self) -> str:
+        with self._lock:
+            spans = list(self.spans)
+            reflections = Counter(self.reflections)
+            retries = Counter(self.retries)
+            outcomes = Counter(self.outcomes)
+
+        by_name: dict[str, list[float]] = {}
+        for span in spans:
+            by_name.setdefault(span.name, []).append(span.duration)
+
+        rows = [f"{'span':<12} {'count':>6} {'total s':>9} {'mean s':>9} {'max s':>9}"]
+        for name, durations in by_name.items():
+            total = sum(durations)
+            rows.append(
+                f"{name:<12} {len(durations):>6} {total:>9.3f} "
+                f"{total / len(durations):>9.3f} {max(durations):>9.3f}"
+            )
+
+        latencies: dict[tuple[str, str], list[float]] = {}
+        for span in spans:
+            if span.name == "request" and "phase" in span.attributes:
+                key = (span.attributes["phase"], span.attributes["model"])
+                latencies.setdefault(key, []).append(span.duration)
+        if latencies:
+            rows.append("")
+            rows.append(
+                f"{'phase':<14} {'model':<20} {'count':>6} {'mean s':>9} {'success':>8}"
+            )
+            for (phase, model), durations in latencies.items():
+                succeeded = outcomes[phase, model, True]
+                decided = succeeded + outcomes[phase, model, False]
+                success = f"{succeeded / decided:.0%}" if decided else "-"
+                rows.append(
+                    f"{phase:<14} {model:<20} {len(durations):>6} "
+                    f"{sum(durations) / len(durations):>9.3f} {success:>8}"
+                )
+
+        rows.append("")
+        rows.append(
+            f"Tokens: {self.prompt_tokens} prompt, {self.completion_tokens} completion."
+        )
+        for label, counts in (("Reflections", reflections), ("Retries", retries)):
+            causes = ", ".join(
+                f"{count} {cause}" for cause, count in counts.most_common()
+            )
+            rows.append(f"{label}: {causes or 'none'}.")
+        edit_tokens = self.describe_edit_tokens()
+        if edit_tokens:
+            rows.append(edit_tokens)
+
+        return "\n".join(rows)
+
+    def _emit(self, event: dict[str, Any]) -> None:
+        for hook in self.hooks:
+            hook(event)
+
+
+def json_lines_hook(file: TextIO) -> MetricsHook:
+    """A hook that writes each event to `file` as a line of JSON."""
+    lock = threading.Lock()
+
+    def write(event: dict[str, Any]) -> None:
+        with lock:
+            file.write(json.dumps(event) + "\n")
+            file.flush()
+
+    return write
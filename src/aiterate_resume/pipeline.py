@@ -0,0 +1,197 @@
+from collections import Counter
+from pathlib import Path
+from typing import NamedTuple
+
+from . import search_replace_prompts
+from .chat import ChatSession
+from .checkpoint import Checkpoint
+from .compaction import Compactor
+from .deadline import Deadline
+from .edit_formats import EditCodec, EditFormat, create_codec
+from .project import Project
+from .reflection import modify_resume
+from .rounds import RoundReport, diff_round
+from .search_replace import MatchTier, SearchReplaceResult
+from .section_store import SectionStore
+from .sharding import modify_resume_sharded
+
+
+class PipelineOptions(NamedTuple):
+    stream: bool = False
+    "Stream responses and apply each change as soon as it arrives."
+
+    compact_budget: int | None = None
+    "If set, repair rounds are compacted to about this many tokens."
+
+    candidates: int = 1
+    "How many candidate responses to request up front."
+
+    shard_jobs: int | None = None
+    "If set, the resume is split into sections edited this many at a time."
+
+    section_store: Path | None = None
+    """If set, the resume is split into sections and the edits accepted for
+    each are stored in this directory, so unchanged sections aren't sent to
+    the model again on later runs."""
+
+    rounds: int = 1
+    "The most rounds to run, each improving the previous round's output."
+
+    min_changed_lines: int = 1
+    """Stop before running out of rounds once a round adds or removes fewer
+    than this many lines."""
+
+    edit_format: EditFormat = EditFormat.SEARCH_REPLACE
+    "How the model is asked to write its changes."
+
+    deadline: float | None = None
+    """If set, how many seconds each resume has, across every round,
+    section, and request."""
+
+    best_effort: bool = False
+    """Once a resume runs out of time or attempts, use it with the changes
+    applied so far rather than failing."""
+
+
+class Pipeline:
+    """Improves a resume with the given options and keeps stats on how it
+    went."""
+
+    def __init__(
+        self, session: ChatSession, options: PipelineOptions = PipelineOptions()
+    ):
+        self.session = session
+        self.options = options
+        self.compactor = (
+            Compactor(token_budget=options.compact_budget)
+            if options.compact_budget is not None
+            else None
+        )
+        self.tier_counts: Counter[MatchTier] = Counter()
+        self.section_store = (
+            SectionStore(options.section_store)
+            if options.section_store is not None
+            else None
+        )
+        self.rounds: list[RoundReport] = []
+
+        self.rejected: list[tuple[SearchReplaceResult, Exception]] = []
+        "The changes that still couldn't be applied when each run finished."
+
+    def run(
+        self,
+        resume_contents: str,
+        checkpoint_path: Path | None = None,
+        resume_from: Checkpoint | None = None,
+        project: Project | None = None,
+    ) -> str:
+        """Improve `resume_contents`, checkpointing and resuming as described
+        in `modify_resume` (which sharded and multi-round runs don't
+        support).
+
+        If `project` is given, `resume_contents` is its combined text, and
+        changes that touch its file markers fail. Project runs can't be
+        sharded.
+
+        With more than one round, each round's output is improved again by
+        the next, until a round changes fewer than `min_changed_lines` lines.
+        Unsharded rounds continue the same conversation, so the system prompt
+        and examples are shared rather than starting over. What each round
+        changed is reported as a `round` event and kept in `self.rounds`.
+
+        With a deadline, no more rounds are started once it passes.
+        """
+        deadline = (
+            Deadline(self.options.deadline)
+            if self.options.deadline is not None
+            else None
+        )
+        if self.options.rounds == 1:
+            return self._run_round(
+                1, resume_contents, deadline, checkpoint_path, resume_from, project
+            )
+        if checkpoint_path is not None or resume_from is not None:
+            raise ValueError("Multi-round runs can't be checkpointed.")
+
+        # Unsharded rounds continue the same conversation, so they share a
+        # codec and the lines it anchored keep their ids between rounds
+        codec = create_codec(
+            self.options.edit_format, resume_contents, self.session.metrics
+        )
+        contents = resume_contents
+        for number in range(1, self.options.rounds + 1):
+            changed_contents = self._run_round(
+                number, contents, deadline, project=project, codec=codec
+            )
+            report = diff_round(number, contents, changed_contents)
+            self.rounds.append(report)
+            self.session.console.emit({"event": "round", **report._asdict()})
+
+            contents = changed_contents
+            if report.changed_lines < self.options.min_changed_lines:
+                break
+            if deadline is not None and deadline.expired:
+                break
+
+        return contents
+
+    def _run_round(
+        self,
+        number: int,
+        resume_contents: str,
+        deadline: Deadline | None,
+        checkpoint_path: Path | None = None,
+        resume_from: Checkpoint | None = None,
+        project: Project | None = None,
+        codec: EditCodec | None = None,
+    ) -> str:
+        if self.options.shard_jobs is not None or self.section_store is not None:
+            if checkpoint_path is not None or resume_from is not None:
+                raise ValueError("Sharded runs can't be checkpointed.")
+            if project is not None:
+                raise ValueError("Projects can't be sharded.")
+
+            return modify_resume_sharded(
+                self.session,
+                resume_contents,
+                jobs=self.options.shard_jobs or 1,
+                # Only tiny sections are merged when storing edits, so section
+                # boundaries stay the same between runs
+                max_shards=8 if self.section_store is None else None,
+                store=self.section_store,
+                stream=self.options.stream,
+                compactor=self.compactor,
+                tier_counts=self.tier_counts,
+                candidates=self.options.candidates,
+                edit_format=self.options.edit_format,
+                deadline=deadline,
+                best_effort=self.options.best_effort,
+                rejected=self.rejected,
+            )
+
+        if number > 1:
+            messages = search_replace_prompts.next_round_messages(resume_contents)
+        elif project is not None:
+            messages = search_replace_prompts.project_messages(
+                resume_contents, project.marker(project.files[0].name)
+            )
+        else:
+            messages = search_replace_prompts.initial_messages(resume_contents)
+
+        return modify_resume(
+            self.session,
+            resume_contents,
+            messages,
+            stream=self.options.stream,
+            compactor=self.compactor,
+            tier_counts=self.tier_counts,
+            candidates=self.options.candidates,
+            checkpoint_path=checkpoint_path,
+            resume_from=resume_from,
+            protected_ranges=project.protected_ranges if project else None,
+            edit_format=self.options.edit_format,
+            codec=codec,
+            deadline=deadline,
+            best_effort=self.options.best_effort,
+            rejected=self.rejected,
+        )
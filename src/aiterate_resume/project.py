@@ -0,0 +1,247 @@
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+
+from .sections import Markup, detect_markup
+
+
+class ProjectError(Exception):
+    """Raised when a project can't be read or written back."""
+
+
+_LATEX_COMMENT_RE = re.compile(r"(?<!\\)%.*")
+_LATEX_INCLUDE_RE = re.compile(r"\\(?:input|include)\s*\{\s*([^}]+?)\s*\}")
+_HTML_INCLUDE_RE = re.compile(
+    r"<!--#include\s+(?:file|virtual)\s*=\s*\"([^\"]+)\"\s*-->", re.IGNORECASE
+)
+
+_SUFFIX_MARKUP = {
+    ".tex": Markup.LATEX,
+    ".ltx": Markup.LATEX,
+    ".html": Markup.HTML,
+    ".htm": Markup.HTML,
+    ".shtml": Markup.HTML,
+}
+
+
+class ProjectFile(NamedTuple):
+    path: Path
+
+    name: str
+    "The path relative to the root file's directory, as shown to the model."
+
+    text: str
+    mtime_ns: int
+
+
+class FileSpan(NamedTuple):
+    """Where a file is in a project's combined text."""
+
+    name: str
+
+    marker_start: int
+    "Where the line marking the start of the file starts."
+
+    start: int
+    "Where the file's text starts (just after the marker line)."
+
+    end: int
+
+
+def _includes(text: str, markup: Markup) -> list[str]:
+    if markup == Markup.LATEX:
+        return [
+            match.group(1)
+            for line in text.splitlines()
+            for match in _LATEX_INCLUDE_RE.finditer(_LATEX_COMMENT_RE.sub("", line))
+        ]
+
+    return _HTML_INCLUDE_RE.findall(text)
+
+
+def _resolve(root: Path, including: Path, target: str, markup: Markup) -> Path:
+    if markup == Markup.LATEX:
+        # LaTeX looks up inputs from the main file's directory, and adds .tex
+        # if there's no extension
+        path = root.parent / target
+        if not path.suffix:
+            path = path.with_suffix(".tex")
+    else:
+        path = including.parent / target
+
+    # Changes are written back to every file, so only follow includes within
+    # the project's directory
+    if not path.resolve().is_relative_to(root.parent.resolve()):
+        raise ProjectError(
+            f"{including} includes {target}, which is outside of {root.parent}."
+        )
+
+    return path
+
+
+class Project:
+    """A LaTeX or HTML resume split across several files.
+
+    The files are found by following `\\input`/`\\include` (or server side
+    `<!--#include file="..." -->`) directives from the root file. The model
+    is shown every file at once, each starting with a marker line naming it,
+    and changes are mapped back to their files using where the markers are
+    in the changed text.
+    """
+
+    def __init__(self, root: Path, markup: Markup, files: list[ProjectFile]):
+        self.root = root
+        self.markup = markup
+        self.files = files
+
+    @staticmethod
+    def load(root: Path) -> "Project":
+        """Read `root` and every file it includes, directly or not.
+
+        Raises:
+            ProjectError: If a file can't be read, a file includes one outside
+                of the root's directory, or the root isn't LaTeX or HTML.
+        """
+        try:
+            root_text = root.read_text()
+        except OSError as e:
+            raise ProjectError(f"Could not read {root}: {e}") from e
+
+        markup = _SUFFIX_MARKUP.get(root.suffix.lower(), detect_markup(root_text))
+        if markup == Markup.PLAIN:
+            raise ProjectError(f"{root} is not a LaTeX or HTML file.")
+
+        # Each file is included once, in the order it's first reached
+        files: list[ProjectFile] = []
+        seen: set[Path] = set()
+        to_visit = [root]
+        while to_visit:
+            path = to_visit.pop()
+            resolved = path.resolve()
+            if resolved in seen:
+                continue
+            seen.add(resolved)
+
+            try:
+                text = path.read_text()
+                mtime_ns = path.stat().st_mtime_ns
+            except OSError as e:
+                raise ProjectError(f"Could not read {path}: {e}") from e
+
+            name = Path(os.path.relpath(path, root.parent)).as_posix()
+            files.append(ProjectFile(path, name, text, mtime_ns))
+            to_visit.extend(
+                reversed(
+                    [
+                        _resolve(root, path, target, markup)
+                        for target in _includes(text, markup)
+                    ]
+                )
+            )
+
+        return Project(root, markup, files)
+
+    def marker(self, name: str) -> str:
+        if self.markup == Markup.LATEX:
+            return f"%%% FILE: {name} %%%"
+        return f"<!-- FILE: {name} -->"
+
+    def combined(self) -> str:
+        """Every file's text, each after a marker line naming it."""
+        pieces = []
+        for file in self.files:
+            pieces.append(self.marker(file.name) + "\n")
+            pieces.append(file.text)
+            if file.text and not file.text.endswith("\n"):
+                pieces.append("\n")
+        return "".join(pieces)
+
+    def index(self, text: str) -> list[FileSpan]:
+        """Find each file in `text` (the combined text, or a changed version
+        of it).
+
+        Raises:
+            ProjectError: If a marker line is missing.
+        """
+        marker_spans = []
+        position = 0
+        for file in self.files:
+            marker = self.marker(file.name) + "\n"
+            marker_start = text.find(marker, position)
+            if marker_start == -1:
+                raise ProjectError(f"The marker for {file.name} is missing.")
+            position = marker_start + len(marker)
+            marker_spans.append((marker_start, position))
+
+        ends = [start for start, _ in marker_spans[1:]] + [len(text)]
+        return [
+            FileSpan(file.name, marker_start, start, end)
+            for file, (marker_start, start), end in zip(self.files, marker_spans, ends)
+        ]
+
+    def protected_ranges(self, text: str) -> list[tuple[int, int]]:
+        """The marker lines in `text`, which changes mustn't touch."""
+        return [(span.marker_start, span.start) for span in self.index(text)]
+
+    def split(self, text: str) -> dict[Path, str]:
+        """Each file's text in `text`, by path."""
+        contents = {}
+        for file, span in zip(self.files, self.index(text)):
+            file_text = text[span.start : span.end]
+            if file.text and not file.text.endswith("\n") and file_text.endswith("\n"):
+                # Remove the newline added by `combined`
+                file_text = file_text[:-1]
+            contents[file.path] = file_text
+        return contents
+
+    def write_back(self, text: str) -> list[Path]:
+        """Write each file whose text changed in `text` (the changed combined
+        text) back in place, leaving unchanged files (and their mtimes)
+        alone.
+
+        Every changed file's new text is written to a temporary file before
+        any file is replaced, so failing to write one (ex: the disk is full)
+        leaves every file as it was. Each file is then replaced atomically,
+        though not all of them at once.
+
+        Returns the paths that were written.
+
+        Raises:
+            ProjectError: If a marker line is missing or a file changed on disk
+                since it was read, in which case nothing is written.
+        """
+        contents = self.split(text)
+        changed = [file for file in self.files if contents[file.path] != file.text]
+
+        modified = [
+            file.name
+            for file in changed
+            if file.path.stat().st_mtime_ns != file.mtime_ns
+        ]
+        if modified:
+            raise ProjectError(
+                f"Changed on disk since being read: {', '.join(modified)}."
+            )
+
+        temp_paths: list[str] = []
+        try:
+            for file in changed:
+                fd, temp_path = tempfile.mkstemp(
+                    dir=file.path.parent, prefix=f".{file.path.name}.", suffix=".tmp"
+                )
+                temp_paths.append(temp_path)
+                with os.fdopen(fd, "w") as temp_file:
+                    temp_file.write(contents[file.path])
+                shutil.copymode(file.path, temp_path)
+        except BaseException:
+            for temp_path in temp_paths:
+                os.unlink(temp_path)
+            raise
+
+        for file, temp_path in zip(changed, temp_paths):
+            os.replace(temp_path, file.path)
+
+        return [file.path for file in changed]
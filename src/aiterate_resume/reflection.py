@@ -1,59 +1,522 @@
-from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
+from __future__ import annotations
 
+import time
+from collections import Counter
+from contextlib import closing
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Generator,
+    Iterator,
+    NamedTuple,
+    Sequence,
+    TypeVar,
+)
+
+from .edit_plan import plan_edits
 from .search_replace import (
+    MatchTier,
     MultipleReplacementsError,
     NoReplacementError,
     SearchReplaceResult,
-    execute_search_replace,
 )
 
-from .chat import ChatSession
+from .chat import BaseChatSession, ChatSession
+from .checkpoint import Checkpoint, CheckpointError
+from .compaction import Compactor
+from .deadline import BudgetExhausted, Deadline
+from .edit_formats import (
+    FORMAT_ERRORS,
+    EditCodec,
+    EditFormat,
+    FormatError,
+    SearchReplaceCodec,
+    create_codec,
+)
+from .match_index import MatchIndex, describe_multiple_matches, describe_no_match
+from .routing import ModelRouter, Phase
 from .search_replace_format import (
+    IncrementalParser,
     UnexpectedEndOfInput,
     UnexpectedFenceError,
     parse_search_replace_text,
 )
 
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletion
+    from openai.types.chat.chat_completion_message_param import (
+        ChatCompletionMessageParam,
+    )
+
+    from .async_chat import AsyncChatSession
+
+T = TypeVar("T")
+
+
+class SendRequest(NamedTuple):
+    """A request for a session to send: the arguments to its
+    `send_messages`."""
+
+    messages: list[ChatCompletionMessageParam]
+    isolated: bool
+    n: int
+    choose: Callable[[ChatCompletion], int] | None
+    model: str
+    phase: Phase
+    extra_params: dict[str, Any]
+    deadline: Deadline | None
+
+
+Exchange = Generator[SendRequest, "ChatCompletion", T]
+"""Logic that talks to the model without doing any I/O itself: it yields
+each request to send and is sent back the response (or has the error sending
+it raised where it yielded), then returns its result. Exchanges are shared by
+sync and async sessions (see `run_exchange` and `run_exchange_async`)."""
+
+
+def run_exchange(session: ChatSession, exchange: Exchange[T]) -> T:
+    """Run `exchange` to the end, sending its requests with `session`."""
+    with closing(exchange):
+        response: ChatCompletion | None = None
+        error: Exception | None = None
+        while True:
+            try:
+                if error is not None:
+                    request = exchange.throw(error)
+                else:
+                    request = exchange.send(response)  # type: ignore[arg-type]
+            except StopIteration as e:
+                return e.value
+
+            response, error = None, None
+            try:
+                response = session.send_messages(**request._asdict())
+            except Exception as e:
+                error = e
+
+
+async def run_exchange_async(session: AsyncChatSession, exchange: Exchange[T]) -> T:
+    """Run `exchange` to the end, sending its requests with `session`.
+
+    If the task is cancelled (or times out) while a request is in flight,
+    the exchange is closed where it's waiting for the response.
+    """
+    with closing(exchange):
+        response: ChatCompletion | None = None
+        error: Exception | None = None
+        while True:
+            try:
+                if error is not None:
+                    request = exchange.throw(error)
+                else:
+                    request = exchange.send(response)  # type: ignore[arg-type]
+            except StopIteration as e:
+                return e.value
+
+            response, error = None, None
+            try:
+                response = await session.send_messages(**request._asdict())
+            except Exception as e:
+                error = e
+
+
+class CandidateChooser:
+    """Picks the best of a response's choices.
+
+    Choices are checked in order and the first one that parses and has no
+    failures wins. Otherwise the one that parsed with the fewest failures is
+    used, and if none parsed the first choice is used.
+    """
+
+    def __init__(
+        self,
+        count_failures: Callable[[list[SearchReplaceResult]], int] | None,
+        parse: Callable[[str], list[SearchReplaceResult]] = parse_search_replace_text,
+    ):
+        self.count_failures = count_failures
+        self.parse = parse
+        self.index = 0
+        self.results: list[SearchReplaceResult] | None = None
+
+    def __call__(self, response: ChatCompletion) -> int:
+        if len(response.choices) == 1:
+            return 0
+
+        best: tuple[int, int, list[SearchReplaceResult]] | None = None
+        for i, choice in enumerate(response.choices):
+            if not choice.message.content:
+                continue
+
+            try:
+                results = self.parse(choice.message.content)
+            except FORMAT_ERRORS:
+                continue
+
+            failures = self.count_failures(results) if self.count_failures else 0
+            if best is None or failures < best[0]:
+                best = (failures, i, results)
+            if failures == 0:
+                break
+
+        if best:
+            _, self.index, self.results = best
 
-class FormatMiddleware:
-    """Handles parsing, retry counting, and format reflection."""
+        return self.index
 
-    def __init__(self, session: ChatSession, max_requests: int):
+
+class BaseFormatMiddleware:
+    """Handles parsing, retry counting, format reflection, and picking the
+    model for each request (see `ModelRouter`).
+
+    Messages are written for *SEARCH/REPLACE blocks* and rewritten by
+    `codec` before they're sent. No request is sent once `deadline` passes.
+    """
+
+    def __init__(
+        self,
+        session: BaseChatSession,
+        max_requests: int,
+        compactor: Compactor | None = None,
+        codec: EditCodec | None = None,
+        deadline: Deadline | None = None,
+    ):
         self.session = session
         self.remaining_requests = max_requests
+        self.compactor = compactor
+        self.codec = codec if codec is not None else SearchReplaceCodec()
+        self.deadline = deadline
+        self.router = ModelRouter(session.models, session.metrics)
 
-    def send_messages(
-        self, messages: list[ChatCompletionMessageParam]
-    ) -> list[SearchReplaceResult]:
+        self.last_request: tuple[Phase, str] | None = None
+        "The phase and model of the request whose response was last parsed."
+
+    def record_applied(self, succeeded: bool) -> None:
+        """Record whether the changes from the last parsed response all
+        applied."""
+        if self.last_request is not None:
+            self.router.record_outcome(*self.last_request, succeeded)
+            self.last_request = None
+
+    def _start_attempt(self) -> None:
+        """Use up an attempt.
+
+        Raises:
+            BudgetExhausted: If there are no attempts or time left.
+        """
+        if self.remaining_requests == 0:
+            raise BudgetExhausted("Out of attempts.")
+        if self.deadline is not None and self.deadline.expired:
+            raise BudgetExhausted("Out of time.")
+
+        self.remaining_requests -= 1
+
+    def _check_deadline(self, error: Exception) -> None:
+        """Called with an error from sending a request.
+
+        Raises:
+            BudgetExhausted: If the deadline has passed, so the error was
+                likely the request timing out.
+        """
+        if self.deadline is not None and self.deadline.expired:
+            raise BudgetExhausted("Out of time.") from error
+
+    def exchange(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        isolated: bool = False,
+        candidates: int = 1,
+        count_failures: Callable[[list[SearchReplaceResult]], int] | None = None,
+        phase: Phase = Phase.INITIAL,
+    ) -> Exchange[list[SearchReplaceResult]]:
         """Send messages and parse the result.
 
         This will send reflection messages if the response is not in the
-        correct format, and error if we've run out of request attempts.
+        correct format, and raise `BudgetExhausted` if we've run out of
+        request attempts or the deadline has passed. With
+        a compactor, reflections are sent as compact isolated conversations.
+        `messages` are sent for `phase` and reflections as format repairs.
+
+        If `candidates` is more than 1, the first request asks for that many
+        candidate responses and uses the first one that parses and for which
+        `count_failures` (ex: the number of changes that fail to apply) is
+        0, falling back to the one with the fewest failures. This costs more
+        tokens but avoids many reflection rounds.
+
+        This is an exchange (see `Exchange`), so the same logic is used by
+        sync and async sessions.
         """
         # This may get set to reflection messages (ie: messages telling the
         # model to try again due to a parsing error).
         to_send: list[ChatCompletionMessageParam] = messages
 
         while True:
-            if self.remaining_requests == 0:
-                raise RuntimeError("Out of attempts.")
+            self._start_attempt()
 
-            self.remaining_requests -= 1
+            chosen = CandidateChooser(count_failures, self.codec.parse)
+            model = self.router.model_for(phase)
+            try:
+                response = yield SendRequest(
+                    self.codec.convert_messages(to_send),
+                    isolated,
+                    candidates,
+                    chosen,
+                    model,
+                    phase,
+                    self.codec.request_params(),
+                    self.deadline,
+                )
+            except Exception as e:
+                self._check_deadline(e)
+                raise
+            candidates = 1
 
-            response = self.session.send_messages(to_send)
-            raw_text = response.choices[0].message.content
+            raw_text = response.choices[chosen.index].message.content
             if not raw_text:
                 raise ValueError("Got empty response.")
+            if isolated and self.compactor:
+                self.compactor.record_response(raw_text)
+
+            results = chosen.results
+            if results is None:
+                try:
+                    with self.session.metrics.span("parse", stream=False):
+                        results = self.codec.parse(raw_text)
+                except FORMAT_ERRORS as e:
+                    self.router.record_outcome(phase, model, False)
+                    to_send, isolated = self._reflection(e, raw_text)
+                    phase = Phase.FORMAT_REPAIR
+                    continue
+
+            self.codec.record_used(raw_text)
+            self.last_request = (phase, model)
+            for result in results:
+                self._emit_block(result)
+            return results
+
+    def _emit_block(self, result: SearchReplaceResult) -> None:
+        self.session.console.emit({"event": "block", **result._asdict()})
+
+    def _reflection(
+        self,
+        error: FormatError,
+        raw_text: str,
+        num_handled: int = 0,
+    ) -> tuple[list[ChatCompletionMessageParam], bool]:
+        """The format reflection messages to send and whether to isolate them."""
+        self.session.metrics.record_reflection(error)
+        messages = [format_reflection_message(error, num_handled, self.codec)]
+        if not self.compactor:
+            return messages, False
+
+        return (
+            self.compactor.format_repair_messages(
+                self.session,
+                raw_text,
+                error,
+                messages,
+                num_handled,
+                self.codec,
+            ),
+            True,
+        )
+
+
+class FormatMiddleware(BaseFormatMiddleware):
+    session: ChatSession
+
+    def __init__(
+        self,
+        session: ChatSession,
+        max_requests: int,
+        compactor: Compactor | None = None,
+        codec: EditCodec | None = None,
+        deadline: Deadline | None = None,
+    ):
+        super().__init__(session, max_requests, compactor, codec, deadline)
+
+    def send_messages(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        isolated: bool = False,
+        candidates: int = 1,
+        count_failures: Callable[[list[SearchReplaceResult]], int] | None = None,
+        phase: Phase = Phase.INITIAL,
+    ) -> list[SearchReplaceResult]:
+        """Send messages and parse the result (see `exchange`)."""
+        return run_exchange(
+            self.session,
+            self.exchange(messages, isolated, candidates, count_failures, phase),
+        )
+
+    def stream_messages(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        isolated: bool = False,
+        phase: Phase = Phase.INITIAL,
+    ) -> Iterator[SearchReplaceResult]:
+        """Send messages and yield each result as soon as it's parsed.
+
+        The response is streamed and parsed incrementally. If a format error
+        is found the stream is stopped right away and a reflection message is
+        sent, the same as `send_messages`. Only *SEARCH/REPLACE blocks* can
+        be streamed, so `codec` is ignored. The stream is stopped once the
+        deadline passes.
+        """
+        to_send: list[ChatCompletionMessageParam] = messages
+
+        while True:
+            self._start_attempt()
 
+            parser = IncrementalParser()
+            num_yielded = 0
+            received: list[str] = []
+            sent_isolated = isolated
+            model = self.router.model_for(phase)
+            deltas = self.session.stream_messages(
+                to_send, isolated, model, phase, self.deadline
+            )
+            # Parsing is interleaved with receiving the response, so the time
+            # spent parsing is added up and recorded as a single span
+            parse_start = time.perf_counter()
+            parse_duration = 0.0
             try:
-                return parse_search_replace_text(raw_text)
+                for delta in deltas:
+                    if self.deadline is not None and self.deadline.expired:
+                        # The request timeout only bounds the wait for each
+                        # delta, so a stream that keeps sending is cut off here
+                        raise BudgetExhausted("Out of time.")
+
+                    received.append(delta)
+                    feed_start = time.perf_counter()
+                    results = parser.feed(delta)
+                    parse_duration += time.perf_counter() - feed_start
+                    for result in results:
+                        num_yielded += 1
+                        self._emit_block(result)
+                        yield result
+
+                if not received:
+                    raise ValueError("Got empty response.")
+
+                feed_start = time.perf_counter()
+                results = parser.close()
+                parse_duration += time.perf_counter() - feed_start
+                self.last_request = (phase, model)
+                for result in results:
+                    self._emit_block(result)
+                    yield result
+                return
             except (UnexpectedFenceError, UnexpectedEndOfInput) as e:
-                to_send = [
-                    {
-                        "role": "system",
-                        "content": f"Your response was not in the correct *SEARCH/REPLACE block* format. Trying to parse it gave the error: {str(e)}. Please try again, ensuring your response follows the correct format.",
-                    }
-                ]
+                self.router.record_outcome(phase, model, False)
+                to_send, isolated = self._reflection(e, "".join(received), num_yielded)
+                phase = Phase.FORMAT_REPAIR
+            except BudgetExhausted:
+                raise
+            except Exception as e:
+                self._check_deadline(e)
+                raise
+            finally:
+                deltas.close()
+                self.session.metrics.record_span(
+                    "parse", parse_start, parse_duration, stream=True
+                )
+                if sent_isolated and self.compactor:
+                    self.compactor.record_response("".join(received))
+
+
+class AsyncFormatMiddleware(BaseFormatMiddleware):
+    """A `FormatMiddleware` for an `AsyncChatSession`. Responses can't be
+    streamed."""
+
+    session: AsyncChatSession
+
+    def __init__(
+        self,
+        session: AsyncChatSession,
+        max_requests: int,
+        compactor: Compactor | None = None,
+        codec: EditCodec | None = None,
+        deadline: Deadline | None = None,
+    ):
+        super().__init__(session, max_requests, compactor, codec, deadline)
+
+    async def send_messages(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        isolated: bool = False,
+        candidates: int = 1,
+        count_failures: Callable[[list[SearchReplaceResult]], int] | None = None,
+        phase: Phase = Phase.INITIAL,
+    ) -> list[SearchReplaceResult]:
+        """Send messages and parse the result (see `exchange`)."""
+        return await run_exchange_async(
+            self.session,
+            self.exchange(messages, isolated, candidates, count_failures, phase),
+        )
+
+
+def format_reflection_message(
+    error: FormatError,
+    num_handled: int = 0,
+    codec: EditCodec = SearchReplaceCodec(),
+) -> ChatCompletionMessageParam:
+    """Ask the model to fix a response that `codec` couldn't parse. Only
+    streamed responses (always *SEARCH/REPLACE blocks*) can have had some
+    of their blocks handled already."""
+    content = codec.format_reflection(error)
+    if num_handled:
+        content += f" The first {num_handled} *SEARCH/REPLACE blocks* in your response were read before the error and have already been handled, do not repeat them."
+
+    return {"role": "system", "content": content}
+
+
+def apply_changes(
+    changes: list[SearchReplaceResult],
+    src: str,
+    tier_counts: Counter[MatchTier] | None = None,
+    protected: Sequence[tuple[int, int]] = (),
+) -> tuple[list[tuple[SearchReplaceResult, Exception]], str]:
+    """Try to apply `changes` to `src`.
+
+    Every change is located in `src` before anything is modified and the
+    result is built in a single pass (see `plan_edits`). How leniently each
+    applied change had to be matched is counted in `tier_counts`. Changes
+    that overlap one of the `protected` ranges of `src` fail.
+
+    Returns the changes that failed (along with why) and the changed text.
+    """
+    return plan_edits(changes, src, protected).apply(src, tier_counts)
+
+
+def failure_reflection_messages(
+    failures: list[tuple[SearchReplaceResult, Exception]],
+    document: str | None = None,
+) -> list[ChatCompletionMessageParam]:
+    """Messages asking the model to fix the changes that failed to apply.
+
+    If the `document` the changes will be retried against is given, the
+    messages also point out the text a SEARCH section that matched nothing
+    most likely meant, or what tells apart the places one matched more than
+    once.
+    """
+    index = MatchIndex(document) if document is not None else None
+    messages: list[ChatCompletionMessageParam] = []
+    for suggestion, e in failures:
+        content = f"There was an error applying the following *SEARCH/REPLACE block* {e}\n\n{suggestion.to_block()}"
+
+        # Errors restored from a checkpoint keep the name of their type
+        cause = getattr(e, "cause", type(e).__name__)
+        if index is not None and cause == NoReplacementError.__name__:
+            content += f"\n{describe_no_match(index, suggestion)}"
+        elif index is not None and cause == MultipleReplacementsError.__name__:
+            description = describe_multiple_matches(index, suggestion)
+            if description:
+                content += f"\n{description}"
+
+        messages.append({"role": "system", "content": content})
+    return messages
 
 
 def execute_changes(
@@ -63,35 +526,312 @@ def execute_changes(
 
     Will return a list of reflection messages if there were any failures.
     """
-    changed_src = src
-    error_messages: list[ChatCompletionMessageParam] = []
-    for suggestion in changes:
-        try:
-            changed_src = execute_search_replace(suggestion, changed_src)
-        except (MultipleReplacementsError, NoReplacementError) as e:
-            error_messages.append(
-                {
-                    "role": "system",
-                    "content": f"There was an error applying the following *SEARCH/REPLACE block* {e}\n\n{suggestion.to_block()}",
-                }
-            )
-
-    return error_messages, changed_src
+    failures, changed_src = apply_changes(changes, src)
+    return failure_reflection_messages(failures, changed_src), changed_src
 
 
 def modify_resume(
     session: ChatSession,
     resume_contents: str,
     messages: list[ChatCompletionMessageParam],
+    stream: bool = False,
+    compactor: Compactor | None = None,
+    tier_counts: Counter[MatchTier] | None = None,
+    candidates: int = 1,
+    checkpoint_path: Path | None = None,
+    resume_from: Checkpoint | None = None,
+    applied_rounds: list[list[SearchReplaceResult]] | None = None,
+    protected_ranges: Callable[[str], Sequence[tuple[int, int]]] | None = None,
+    edit_format: EditFormat = EditFormat.SEARCH_REPLACE,
+    codec: EditCodec | None = None,
+    deadline: Deadline | None = None,
+    best_effort: bool = False,
+    rejected: list[tuple[SearchReplaceResult, Exception]] | None = None,
 ) -> str:
-    middleware = FormatMiddleware(session, max_requests=4)
-    changes = middleware.send_messages(messages)
+    """Improve `resume_contents`, reflecting on errors until all changes apply.
+
+    If `compactor` is given, repair rounds only send what's needed to fix the
+    failed changes rather than the whole conversation. The tier each applied
+    change was matched with is counted in `tier_counts` (changes that didn't
+    match exactly would otherwise have needed a reflection round).
+
+    If `candidates` is more than 1, the first request asks for that many
+    candidate responses and uses the first one that parses and applies
+    cleanly (see `FormatMiddleware.send_messages`).
+
+    Each request goes to the model `session.models` gives for its phase, and
+    a phase is escalated to the stronger model once one of its requests
+    fails to parse or apply (see `ModelRouter`).
+
+    The changes applied by each call to `apply_changes` are added to
+    `applied_rounds`, so the same edits can be made again later (see
+    `section_store.replay_rounds`).
+
+    If `protected_ranges` is given, it's called with the text before each
+    round of changes is applied, and changes that overlap any of the ranges it
+    returns fail (see `project.Project.protected_ranges`).
+
+    Changes are asked for in `edit_format`. Formats other than *SEARCH/REPLACE
+    blocks* can't be parsed as they arrive, so they're never streamed, and the
+    lines format can't be used with `compactor` (its excerpts of the resume
+    aren't anchored). A `codec` from an earlier call can be passed to keep
+    using it, so a conversation that continues over several calls keeps
+    referring to lines the same way; otherwise a new one is created for
+    `edit_format`.
 
-    changed_contents = resume_contents
+    If `checkpoint_path` is given, a checkpoint is written there after every
+    round. Passing a checkpoint as `resume_from` continues from where it left
+    off without resending any of the requests before it.
+
+    If `deadline` is given, no requests are sent once it passes, and each
+    one's timeout is the time left until it. Running out of time or attempts
+    raises `BudgetExhausted`, unless `best_effort` is set, in which case the
+    resume with every change applied so far is returned. Either way, the
+    changes that still failed to apply are added to `rejected`.
+    """
+    codec = _create_codec(session, resume_contents, compactor, edit_format, codec)
+    middleware = FormatMiddleware(
+        session, max_requests=4, compactor=compactor, codec=codec, deadline=deadline
+    )
+    return run_exchange(
+        session,
+        _modify_resume_exchange(
+            middleware,
+            resume_contents,
+            messages,
+            middleware.stream_messages if stream and codec.streamable else None,
+            tier_counts,
+            candidates,
+            checkpoint_path,
+            resume_from,
+            applied_rounds,
+            protected_ranges,
+            best_effort,
+            rejected,
+        ),
+    )
+
+
+async def modify_resume_async(
+    session: AsyncChatSession,
+    resume_contents: str,
+    messages: list[ChatCompletionMessageParam],
+    compactor: Compactor | None = None,
+    tier_counts: Counter[MatchTier] | None = None,
+    candidates: int = 1,
+    checkpoint_path: Path | None = None,
+    resume_from: Checkpoint | None = None,
+    applied_rounds: list[list[SearchReplaceResult]] | None = None,
+    protected_ranges: Callable[[str], Sequence[tuple[int, int]]] | None = None,
+    edit_format: EditFormat = EditFormat.SEARCH_REPLACE,
+    codec: EditCodec | None = None,
+    deadline: Deadline | None = None,
+    best_effort: bool = False,
+    rejected: list[tuple[SearchReplaceResult, Exception]] | None = None,
+) -> str:
+    """`modify_resume` for an `AsyncChatSession`, which runs the same logic.
+    Responses aren't streamed.
+
+    Cancelling the task (including with `asyncio.timeout`) cancels the
+    request in flight and raises out of here. With `checkpoint_path`, the run
+    can be picked back up from the last round that finished.
+    """
+    codec = _create_codec(session, resume_contents, compactor, edit_format, codec)
+    middleware = AsyncFormatMiddleware(
+        session, max_requests=4, compactor=compactor, codec=codec, deadline=deadline
+    )
+    return await run_exchange_async(
+        session,
+        _modify_resume_exchange(
+            middleware,
+            resume_contents,
+            messages,
+            None,
+            tier_counts,
+            candidates,
+            checkpoint_path,
+            resume_from,
+            applied_rounds,
+            protected_ranges,
+            best_effort,
+            rejected,
+        ),
+    )
+
+
+def _create_codec(
+    session: BaseChatSession,
+    resume_contents: str,
+    compactor: Compactor | None,
+    edit_format: EditFormat,
+    codec: EditCodec | None,
+) -> EditCodec:
+    if compactor is not None and edit_format == EditFormat.LINES:
+        raise ValueError("Compacted repairs can't be used with the lines format.")
+
+    if codec is not None:
+        codec.update(resume_contents)
+        return codec
+    return create_codec(edit_format, resume_contents, session.metrics)
+
+
+def _modify_resume_exchange(
+    middleware: BaseFormatMiddleware,
+    resume_contents: str,
+    messages: list[ChatCompletionMessageParam],
+    stream_changes: Callable[
+        [list[ChatCompletionMessageParam], bool, Phase], Iterator[SearchReplaceResult]
+    ]
+    | None,
+    tier_counts: Counter[MatchTier] | None,
+    candidates: int,
+    checkpoint_path: Path | None,
+    resume_from: Checkpoint | None,
+    applied_rounds: list[list[SearchReplaceResult]] | None,
+    protected_ranges: Callable[[str], Sequence[tuple[int, int]]] | None,
+    best_effort: bool,
+    rejected: list[tuple[SearchReplaceResult, Exception]] | None,
+) -> Exchange[str]:
+    """The logic of `modify_resume`, as an exchange. If `stream_changes` is
+    given, it's used to stream each round's changes instead of sending a
+    request and waiting for the whole response."""
+    session = middleware.session
+    codec = middleware.codec
+    compactor = middleware.compactor
+
+    def protected(src: str) -> Sequence[tuple[int, int]]:
+        return protected_ranges(src) if protected_ranges is not None else ()
+
+    def save_checkpoint(
+        failures: list[tuple[SearchReplaceResult, Exception]], changed_contents: str
+    ) -> None:
+        if checkpoint_path is not None:
+            Checkpoint(
+                resume_contents,
+                session.messages,
+                changed_contents,
+                middleware.remaining_requests,
+                failures,
+            ).save(checkpoint_path)
+
+    def send_and_apply(
+        to_send: list[ChatCompletionMessageParam],
+        src: str,
+        isolated: bool = False,
+        phase: Phase = Phase.INITIAL,
+    ) -> Exchange[tuple[list[tuple[SearchReplaceResult, Exception]], str]]:
+        if stream_changes is None:
+            changes = yield from middleware.exchange(to_send, isolated, phase=phase)
+            failures, src = apply(changes, src)
+        else:
+            # Apply each change as soon as it arrives
+            failures = []
+            for change in stream_changes(to_send, isolated, phase):
+                change_failures, src = apply([change], src)
+                failures.extend(change_failures)
+
+        middleware.record_applied(not failures)
+        return failures, src
+
+    def apply(
+        changes: list[SearchReplaceResult], src: str
+    ) -> tuple[list[tuple[SearchReplaceResult, Exception]], str]:
+        with session.metrics.span("apply", changes=len(changes)) as span:
+            failures, changed = apply_changes(changes, src, tier_counts, protected(src))
+            span["failures"] = len(failures)
+        codec.update(changed)
+
+        errors = {id(change): error for change, error in failures}
+        applied: list[SearchReplaceResult] = []
+        for change in changes:
+            error = errors.get(id(change))
+            if error is not None:
+                session.console.emit(
+                    {
+                        "event": "edit",
+                        "status": "rejected",
+                        "search": change.search,
+                        "replace": change.replace,
+                        "error": str(error),
+                    }
+                )
+            elif change.search != change.replace:
+                applied.append(change)
+                session.console.emit(
+                    {
+                        "event": "edit",
+                        "status": "applied",
+                        "search": change.search,
+                        "replace": change.replace,
+                    }
+                )
+        if applied_rounds is not None and applied:
+            applied_rounds.append(applied)
+        return failures, changed
+
+    if resume_from is not None:
+        if resume_from.resume_contents != resume_contents:
+            raise CheckpointError("The checkpoint is for a different resume.")
+
+        session.messages = list(resume_from.messages)
+        middleware.remaining_requests = resume_from.remaining_requests
+        failures = resume_from.failures
+        changed_contents = resume_from.changed_contents
+        codec.update(changed_contents)
+    else:
+        failures = []
+        changed_contents = resume_contents
+
+    try:
+        if resume_from is None and candidates > 1:
+            # Candidates can only be compared once they've all arrived, so they
+            # aren't streamed.
+            changes = yield from middleware.exchange(
+                messages,
+                candidates=candidates,
+                count_failures=lambda changes: len(
+                    apply_changes(
+                        changes, resume_contents, protected=protected(resume_contents)
+                    )[0]
+                ),
+            )
+            failures, changed_contents = apply(changes, resume_contents)
+            middleware.record_applied(not failures)
+        elif resume_from is None:
+            failures, changed_contents = yield from send_and_apply(
+                messages, resume_contents
+            )
+        save_checkpoint(failures, changed_contents)
+
+        while failures:
+            for _, error in failures:
+                session.metrics.record_reflection(error)
+            reflection_messages = failure_reflection_messages(
+                failures, changed_contents
+            )
+            if compactor:
+                failures, changed_contents = yield from send_and_apply(
+                    compactor.apply_repair_messages(
+                        session, failures, changed_contents, reflection_messages, codec
+                    ),
+                    changed_contents,
+                    isolated=True,
+                    phase=Phase.APPLY_REPAIR,
+                )
+            else:
+                failures, changed_contents = yield from send_and_apply(
+                    reflection_messages, changed_contents, phase=Phase.APPLY_REPAIR
+                )
+            save_checkpoint(failures, changed_contents)
+    except BudgetExhausted as e:
+        if not best_effort:
+            raise
 
-    error_messages, changed_contents = execute_changes(changes, changed_contents)
-    while error_messages:
-        changes = middleware.send_messages(error_messages)
-        error_messages, changed_contents = execute_changes(changes, changed_contents)
+        session.console.print_status(
+            f"{e} Using the best result so far, with {len(failures)} "
+            f"change{'s' if len(failures) != 1 else ''} not applied."
+        )
 
+    if rejected is not None:
+        rejected.extend(failures)
     return changed_contents
@@ -0,0 +1,31 @@
+import difflib
+from typing import NamedTuple
+
+
+class RoundReport(NamedTuple):
+    """What one round of a multi-round run changed."""
+
+    number: int
+    "Which round this was, starting from 1."
+
+    changed_lines: int
+    "How many lines were added or removed."
+
+    diff: str
+    "A unified diff from the round's input to its output."
+
+
+def diff_round(number: int, before: str, after: str) -> RoundReport:
+    lines = list(
+        difflib.unified_diff(
+            before.splitlines(),
+            after.splitlines(),
+            f"round-{number - 1}",
+            f"round-{number}",
+            lineterm="",
+        )
+    )
+
+    # The first two lines are the file headers
+    changed_lines = sum(1 for line in lines[2:] if line[:1] in ("+", "-"))
+    return RoundReport(number, changed_lines, "\n".join(lines))
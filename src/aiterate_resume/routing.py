@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import tomllib
+from enum import Enum
+from pathlib import Path
+from typing import NamedTuple
+
+from .metrics import Metrics
+
+
+class Phase(Enum):
+    """Why a request is being sent."""
+
+    INITIAL = "initial"
+    "Asking for the first round of edits."
+
+    FORMAT_REPAIR = "format_repair"
+    "Asking for a response that couldn't be parsed to be fixed."
+
+    APPLY_REPAIR = "apply_repair"
+    "Asking for edits that couldn't be applied to be fixed."
+
+
+class ModelConfigError(Exception):
+    """Raised when a model config file can't be used."""
+
+
+class ModelRoutes(NamedTuple):
+    """Which model to use for each phase.
+
+    Repairs are mechanical fixes, so they go to a cheaper, faster model by
+    default. Once a request in a phase fails, the rest of that phase's
+    requests in the run go to `escalation` instead.
+    """
+
+    initial: str = "gpt-4o"
+    format_repair: str = "gpt-4o-mini"
+    apply_repair: str = "gpt-4o-mini"
+    escalation: str = "gpt-4o"
+
+    def model_for(self, phase: Phase, escalated: bool = False) -> str:
+        if escalated:
+            return self.escalation
+
+        return getattr(self, phase.value)
+
+    def with_overrides(self, **models: str | None) -> ModelRoutes:
+        """A copy with every model given (and not None) replaced."""
+        return self._replace(
+            **{phase: model for phase, model in models.items() if model is not None}
+        )
+
+    @staticmethod
+    def load(path: Path) -> ModelRoutes:
+        """Read routes from the `[models]` table of a TOML file, ex:
+
+            [models]
+            initial = "gpt-4o"
+            format_repair = "gpt-4o-mini"
+
+        Phases that aren't listed keep their defaults.
+
+        Raises:
+            ModelConfigError: If the file can't be read or has unknown keys.
+        """
+        try:
+            with path.open("rb") as file:
+                data = tomllib.load(file)
+        except (OSError, tomllib.TOMLDecodeError) as e:
+            raise ModelConfigError(f"Could not read model config {path}: {e}") from e
+
+        models = data.get("models", {})
+        if not isinstance(models, dict):
+            raise ModelConfigError(f"{path}: [models] must be a table.")
+
+        unknown = set(models) - set(ModelRoutes._fields)
+        if unknown:
+            raise ModelConfigError(
+                f"{path}: Unknown keys in [models]: {', '.join(sorted(unknown))}."
+            )
+        if not all(isinstance(model, str) for model in models.values()):
+            raise ModelConfigError(f"{path}: Models must be strings.")
+
+        return ModelRoutes(**models)
+
+
+class ModelRouter:
+    """Picks the model for each request in a run and records how each one
+    went, escalating a phase once one of its requests fails."""
+
+    def __init__(self, routes: ModelRoutes, metrics: Metrics):
+        self.routes = routes
+        self.metrics = metrics
+        self.escalated: set[Phase] = set()
+
+    def model_for(self, phase: Phase) -> str:
+        return self.routes.model_for(phase, phase in self.escalated)
+
+    def record_outcome(self, phase: Phase, model: str, succeeded: bool) -> None:
+        """Record whether a request's response parsed and applied cleanly."""
+        self.metrics.record_outcome(phase.value, model, succeeded)
+        if not succeeded:
+            self.escalated.add(phase)
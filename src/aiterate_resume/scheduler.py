@@ -0,0 +1,415 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, Iterator, Mapping
+
+from .deadline import BudgetExhausted, Deadline
+from .metrics import Metrics
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_duration(value: str) -> float | None:
+    """Parse a rate limit reset duration (ex: `1s`, `6m0s`, `20ms`) into
+    seconds."""
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """Tracks how much of a rate limit is left.
+
+    The bucket refills continuously at `capacity / period` per second and is
+    resynchronized with the server whenever a response reports how much is
+    remaining and when it resets.
+    """
+
+    def __init__(
+        self,
+        capacity: float,
+        period: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.capacity = capacity
+        self.level = capacity
+        self.refill_rate = capacity / period
+        self.clock = clock
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.level = min(
+            self.capacity, self.level + (now - self._updated) * self.refill_rate
+        )
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """How long until `amount` is available (0 if it already is)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.refill_rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+    def sync(self, limit: float, remaining: float, reset_seconds: float) -> None:
+        """Update the bucket from what the server reported."""
+        self.capacity = limit
+        self.level = remaining
+        self._updated = self.clock()
+        if reset_seconds > 0:
+            self.refill_rate = max(limit - remaining, 1) / reset_seconds
+
+
+def retry_delay_hint(headers: Mapping[str, str]) -> float | None:
+    """How long the server asked us to wait before retrying, if it said."""
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether `error` is a transient transport error (a connection problem,
+    rate limit, or server error) worth retrying."""
+    import openai
+
+    if isinstance(error, openai.APIConnectionError):
+        return True
+
+    status_code = getattr(error, "status_code", None)
+    return status_code in (408, 409, 429) or (
+        status_code is not None and status_code >= 500
+    )
+
+
+def _check_wait(wait: float, deadline: Deadline | None) -> None:
+    """Raise `BudgetExhausted` if `deadline` would pass during a wait of
+    `wait` seconds for room in the rate limit buckets."""
+    if deadline is not None and wait >= deadline.remaining():
+        raise BudgetExhausted("Out of time waiting for the rate limit.")
+
+
+class BaseRequestScheduler:
+    """What `RequestScheduler` and `AsyncRequestScheduler` share: the rate
+    limit buckets, backoff, and retry counting."""
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 30_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requests = TokenBucket(requests_per_minute, clock=clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock=clock)
+
+        self.retries = 0
+        "Transport retries made so far, across all sessions."
+
+        self._lock = threading.Lock()
+
+    def backoff(self, attempt: int, hint: float | None = None) -> float:
+        """How long to wait before retry number `attempt + 1`.
+
+        Uses "full jitter" (a random delay up to the exponential backoff) so
+        sessions that failed together don't retry together, but never less
+        than the server asked for.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        return max(delay, hint or 0.0)
+
+    def update_limits(self, headers: Mapping[str, str]) -> None:
+        with self._lock:
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}", ""))
+                if limit is None or remaining is None or reset is None:
+                    continue
+
+                try:
+                    bucket.sync(float(limit), float(remaining), reset)
+                except ValueError:
+                    pass
+
+    def _retry_delay(
+        self,
+        error: Exception,
+        attempt: int,
+        metrics: Metrics | None,
+        deadline: Deadline | None,
+    ) -> float | None:
+        """How long to wait before retrying after `error`, or None if it
+        shouldn't be retried (including if `deadline` would pass first)."""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+
+        response = getattr(error, "response", None)
+        hint = retry_delay_hint(response.headers) if response is not None else None
+        delay = self.backoff(attempt, hint)
+        if deadline is not None and delay >= deadline.remaining():
+            return None
+        with self._lock:
+            self.retries += 1
+        if metrics is not None:
+            metrics.record_retry(error, delay)
+        return delay
+
+    def _wait_time(self, estimated_tokens: int) -> float:
+        """How long until both buckets have room for a request. Must be
+        called with the lock held."""
+        return max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+
+    def _take(self, estimated_tokens: int) -> None:
+        """Use up room in both buckets. Must be called with the lock held."""
+        self.requests.take(1)
+        self.tokens.take(estimated_tokens)
+
+
+class HeldStream:
+    """A streamed response that keeps its request's slot in a
+    `RequestScheduler` until it's closed, since the request is in flight for
+    as long as the stream is being read."""
+
+    def __init__(self, stream: Any, release: Callable[[], None]):
+        self.stream = stream
+        self._release: Callable[[], None] | None = release
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.stream)
+
+    def close(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            try:
+                self.stream.close()
+            finally:
+                release()
+
+
+class RequestScheduler(BaseRequestScheduler):
+    """Paces and retries requests, shared by every session in a process.
+
+    Requests are let through in the order they arrive, at most
+    `max_in_flight` at a time, and only once the request and token buckets
+    (kept in sync with the server's rate limit headers) have room for them.
+    Transient failures are retried with jittered exponential backoff, up to
+    `max_retries` times per request. These retries are counted separately
+    from reflections, so they never use up a `FormatMiddleware`'s attempts.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 4,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 30_000,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        super().__init__(
+            max_retries,
+            base_delay,
+            max_delay,
+            requests_per_minute,
+            tokens_per_minute,
+            clock,
+        )
+        self.sleep = sleep
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._turn = threading.Condition(self._lock)
+        self._next_ticket = 0
+        self._serving = 0
+
+    def run(
+        self,
+        send: Callable[[], Any],
+        estimated_tokens: int = 0,
+        metrics: Metrics | None = None,
+        deadline: Deadline | None = None,
+        stream: bool = False,
+    ) -> Any:
+        """Send a request with `send` and return its parsed response.
+
+        `send` must return a raw response (ex: from
+        `client.chat.completions.with_raw_response.create`), whose headers
+        are used to keep the rate limit buckets up to date. Failures aren't
+        retried if `deadline` would pass before the retry, and if it would
+        pass before the buckets have room, `BudgetExhausted` is raised
+        rather than waiting.
+
+        If `stream`, the response is returned as a `HeldStream`, which must
+        be closed to free the request's slot.
+        """
+        attempt = 0
+        while True:
+            self._acquire(estimated_tokens, deadline)
+            held = False
+            try:
+                raw = send()
+                self.update_limits(raw.headers)
+                response = raw.parse()
+                if stream:
+                    held = True
+                    return HeldStream(response, self._slots.release)
+                return response
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, metrics, deadline)
+                if delay is None:
+                    raise
+
+                attempt += 1
+                self.sleep(delay)
+            finally:
+                if not held:
+                    self._slots.release()
+
+    def _acquire(self, estimated_tokens: int, deadline: Deadline | None) -> None:
+        """Wait for this request's turn, room in both buckets, and a free
+        slot.
+
+        Raises:
+            BudgetExhausted: If `deadline` would pass before the buckets have
+                room.
+        """
+        with self._lock:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while self._serving != ticket:
+                self._turn.wait()
+
+            try:
+                while True:
+                    wait = self._wait_time(estimated_tokens)
+                    if wait <= 0:
+                        break
+                    _check_wait(wait, deadline)
+
+                    # Let other threads update the buckets while waiting
+                    self._lock.release()
+                    try:
+                        self.sleep(wait)
+                    finally:
+                        self._lock.acquire()
+
+                self._take(estimated_tokens)
+            finally:
+                self._serving += 1
+                self._turn.notify_all()
+
+        self._slots.acquire()
+
+
+class AsyncRequestScheduler(BaseRequestScheduler):
+    """Paces and retries requests like `RequestScheduler`, for sessions that
+    share an event loop (see `async_chat.AsyncChatSession`).
+
+    Waiting for a turn, a slot, or a retry only suspends the waiting task, so
+    one event loop can drive many sessions. Cancelling a task releases its
+    turn and slot.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 4,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 30_000,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        super().__init__(
+            max_retries,
+            base_delay,
+            max_delay,
+            requests_per_minute,
+            tokens_per_minute,
+            clock,
+        )
+        self.sleep = sleep
+        self._slots = asyncio.Semaphore(max_in_flight)
+        # Locks are fair, so requests get their turns in the order they ask
+        self._turn = asyncio.Lock()
+
+    async def run(
+        self,
+        send: Callable[[], Awaitable[Any]],
+        estimated_tokens: int = 0,
+        metrics: Metrics | None = None,
+        deadline: Deadline | None = None,
+    ) -> Any:
+        """Send a request with `send` and return its parsed response.
+
+        `send` must return a raw response (ex: from
+        `client.chat.completions.with_raw_response.create` on an
+        `AsyncOpenAI`). `deadline` bounds retries and rate limit waits the
+        same way as in `RequestScheduler.run`.
+        """
+        attempt = 0
+        while True:
+            await self._acquire(estimated_tokens, deadline)
+            try:
+                raw = await send()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, metrics, deadline)
+                if delay is None:
+                    raise
+
+                attempt += 1
+                await self.sleep(delay)
+                continue
+            finally:
+                self._slots.release()
+
+            self.update_limits(raw.headers)
+            return raw.parse()
+
+    async def _acquire(self, estimated_tokens: int, deadline: Deadline | None) -> None:
+        """Wait for this request's turn, room in both buckets, and a free
+        slot.
+
+        Raises:
+            BudgetExhausted: If `deadline` would pass before the buckets have
+                room.
+        """
+        async with self._turn:
+            while True:
+                with self._lock:
+                    wait = self._wait_time(estimated_tokens)
+                    if wait <= 0:
+                        self._take(estimated_tokens)
+                        break
+                _check_wait(wait, deadline)
+                await self.sleep(wait)
+
+        await self._slots.acquire()
@@ -1,4 +1,7 @@
-from typing import NamedTuple
+import bisect
+import re
+from enum import Enum
+from typing import Mapping, NamedTuple
 
 
 class MultipleReplacementsError(Exception):
@@ -29,10 +32,171 @@ class SearchReplaceResult(NamedTuple):
         return f"<<<<<<< SEARCH\n{self.search}\n=======\n{self.replace}\n>>>>>>> REPLACE\n\n{self.reason}\n"
 
 
+class MatchTier(Enum):
+    """How leniently a SEARCH section was matched, from strictest to loosest."""
+
+    EXACT = "exact"
+    "Character for character."
+
+    NORMALIZED = "normalized"
+    "Line by line, ignoring line endings and indentation."
+
+    WHITESPACE = "whitespace"
+    "Ignoring all differences in whitespace (ex: reflowed lines)."
+
+
+def describe_tier_counts(tier_counts: Mapping[MatchTier, int]) -> str:
+    counts = ", ".join(f"{tier_counts.get(tier, 0)} {tier.value}" for tier in MatchTier)
+    return f"Matched SEARCH sections: {counts}."
+
+
+class Match(NamedTuple):
+    start: int
+    end: int
+    tier: MatchTier
+    replace: str
+    "The replacement, with its indentation re-based to the matched region."
+
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def _match_exact(result: SearchReplaceResult, source: str) -> Match | None:
+    start = source.find(result.search)
+    if start == -1:
+        return None
+
+    if source.find(result.search, start + 1) != -1:
+        raise MultipleReplacementsError(source.count(result.search))
+
+    return Match(start, start + len(result.search), MatchTier.EXACT, result.replace)
+
+
+def _indentation(line: str) -> str:
+    return line[: len(line) - len(line.lstrip())]
+
+
+def _rebase_indentation(replace: str, delta: int, indent_char: str) -> str:
+    """Indent every line but the first by `delta` more characters."""
+    if delta == 0:
+        return replace
+
+    lines = replace.split("\n")
+    for i in range(1, len(lines)):
+        stripped = lines[i].lstrip()
+        if stripped:
+            width = len(lines[i]) - len(stripped) + delta
+            lines[i] = indent_char * max(width, 0) + stripped
+
+    return "\n".join(lines)
+
+
+def _match_normalized(result: SearchReplaceResult, source: str) -> Match | None:
+    search_lines = result.search.split("\n")
+    wanted = [line.strip() for line in search_lines]
+    if not any(wanted):
+        return None
+
+    source_lines = source.split("\n")
+    normalized = [line.strip() for line in source_lines]
+
+    matches = [
+        i
+        for i in range(len(source_lines) - len(wanted) + 1)
+        if normalized[i] == wanted[0] and normalized[i : i + len(wanted)] == wanted
+    ]
+    if not matches:
+        return None
+    if len(matches) > 1:
+        raise MultipleReplacementsError(len(matches))
+
+    first = matches[0]
+    last = first + len(wanted) - 1
+    line_offset = sum(len(line) + 1 for line in source_lines[:first])
+    start = line_offset + len(source_lines[first]) - len(source_lines[first].lstrip())
+
+    end = line_offset + sum(len(line) + 1 for line in source_lines[first:last])
+    end += len(source_lines[last].rstrip())
+
+    # The first line's indentation is kept in place (and was stripped from
+    # the search), so use the first line after it that has content to tell
+    # how the indentation of the remaining lines should change.
+    replace = result.replace
+    for i in range(1, len(wanted)):
+        if wanted[i]:
+            search_indent = _indentation(search_lines[i])
+            source_indent = _indentation(source_lines[first + i])
+            replace = _rebase_indentation(
+                replace,
+                len(source_indent) - len(search_indent),
+                source_indent[:1] or search_indent[:1] or " ",
+            )
+            break
+
+    return Match(start, end, MatchTier.NORMALIZED, replace)
+
+
+def _match_whitespace(result: SearchReplaceResult, source: str) -> Match | None:
+    collapsed_search = " ".join(result.search.split())
+    if not collapsed_search:
+        return None
+
+    # Collapse every run of whitespace in the source to a single space while
+    # remembering where each word came from so a match can be mapped back.
+    words = list(_WORD_RE.finditer(source))
+    collapsed = " ".join(word.group() for word in words)
+    collapsed_starts = []
+    position = 0
+    for word in words:
+        collapsed_starts.append(position)
+        position += len(word.group()) + 1
+
+    start = collapsed.find(collapsed_search)
+    if start == -1:
+        return None
+    if collapsed.find(collapsed_search, start + 1) != -1:
+        raise MultipleReplacementsError(collapsed.count(collapsed_search))
+
+    def to_source(position: int) -> int:
+        # Matches never start or end on the space between words
+        i = bisect.bisect_right(collapsed_starts, position) - 1
+        return words[i].start() + position - collapsed_starts[i]
+
+    return Match(
+        to_source(start),
+        to_source(start + len(collapsed_search) - 1) + 1,
+        MatchTier.WHITESPACE,
+        result.replace,
+    )
+
+
+def find_match(result: SearchReplaceResult, source: str) -> Match:
+    """
+    Find the one place in `source` that `result.search` refers to.
+
+    Tiers are tried from strictest to loosest (see `MatchTier`) and the first
+    one that finds anything decides: a match only counts if it's unique
+    within its tier.
+
+    Raises:
+        MultipleReplacementsError: If the search matches more than once.
+        NoReplacementError: If no tier matches.
+    """
+    for matcher in (_match_exact, _match_normalized, _match_whitespace):
+        match = matcher(result, source)
+        if match:
+            return match
+
+    raise NoReplacementError()
+
+
 def execute_search_replace(result: SearchReplaceResult, source: str) -> str:
     """
     Execute a SearchReplaceResult on the given source text.
 
+    If the search doesn't match exactly, it's matched more leniently (see
+    `find_match`).
+
     Args:
         result (SearchReplaceResult): The search and replace instructions.
         source (str): The source text to modify.
@@ -44,9 +208,5 @@ def execute_search_replace(result: SearchReplaceResult, source: str) -> str:
         MultipleReplacementsError: If more than one replacement would occur.
         NoReplacementError: If no replacement occurs.
     """
-    count = source.count(result.search)
-    if count > 1:
-        raise MultipleReplacementsError(count)
-    elif count == 0:
-        raise NoReplacementError()
-    return source.replace(result.search, result.replace)
+    match = find_match(result, source)
+    return source[: match.start] + match.replace + source[match.end :]
@@ -51,55 +51,254 @@ for state in ParserState:
         raise ValueError(f"Could not find expected fence for {state}.")
 
 
-def parse_search_replace_text(text: str) -> list[SearchReplaceResult]:
-    results = []
-    state = ParserState.LOOKING_FOR_SEARCH
+class IncrementalParser:
+    """Push-based parser for *SEARCH/REPLACE blocks*.
+
+    Text can be fed in arbitrarily sized chunks (ex: the token deltas of a
+    streamed completion). Each result is returned as soon as its reason is
+    closed by the next SEARCH fence, and the remaining result is returned by
+    `close()`.
+    """
+
+    def __init__(self):
+        self.state = ParserState.LOOKING_FOR_SEARCH
+        self._partial_line = ""
+        self._current_search: list[str] = []
+        self._current_replace: list[str] = []
+        self._current_reason: list[str] = []
+
+    def feed(self, text: str) -> list[SearchReplaceResult]:
+        """Feed more text to the parser, returning any completed results."""
+        lines = (self._partial_line + text).split("\n")
+        self._partial_line = lines.pop()
+
+        results = []
+        for line in lines:
+            result = self._feed_line(line)
+            if result:
+                results.append(result)
+
+        return results
 
-    current_search = []
-    current_replace = []
-    current_reason = []
+    def close(self) -> list[SearchReplaceResult]:
+        """Signal the end of input, returning the final result if any."""
+        results = []
+        result = self._feed_line(self._partial_line)
+        if result:
+            results.append(result)
+        self._partial_line = ""
 
-    for line in text.split("\n"):
+        if self._current_search or self._current_replace or self._current_reason:
+            if self.state != ParserState.IN_REASON:
+                raise UnexpectedEndOfInput(STATE_TO_FENCE[self.state])
+
+            results.append(self._pop_result())
+
+        if self.state == ParserState.LOOKING_FOR_SEARCH:
+            raise UnexpectedEndOfInput(STATE_TO_FENCE[self.state])
+
+        return results
+
+    def _feed_line(self, line: str) -> SearchReplaceResult | None:
+        result = None
         spec = FENCE_STATE_SPECS.get(line.rstrip())
         if spec:
-            if state not in spec.allowed_in:
-                raise UnexpectedFenceError(STATE_TO_FENCE[state], line.rstrip())
+            if self.state not in spec.allowed_in:
+                raise UnexpectedFenceError(STATE_TO_FENCE[self.state], line.rstrip())
 
             # If we're moving _out of_ the reason state
-            if state == ParserState.IN_REASON:
-                results.append(
-                    SearchReplaceResult(
-                        search="\n".join(current_search).strip(),
-                        replace="\n".join(current_replace).strip(),
-                        reason="\n".join(current_reason).strip(),
-                    )
-                )
-                current_search = []
-                current_replace = []
-                current_reason = []
+            if self.state == ParserState.IN_REASON:
+                result = self._pop_result()
 
-            state = spec.next_state
+            self.state = spec.next_state
         else:
-            if state == ParserState.IN_SEARCH:
-                current_search.append(line)
-            elif state == ParserState.IN_REPLACE:
-                current_replace.append(line)
-            elif state == ParserState.IN_REASON:
-                current_reason.append(line)
+            if self.state == ParserState.IN_SEARCH:
+                self._current_search.append(line)
+            elif self.state == ParserState.IN_REPLACE:
+                self._current_replace.append(line)
+            elif self.state == ParserState.IN_REASON:
+                self._current_reason.append(line)
+
+        return result
+
+    def _pop_result(self) -> SearchReplaceResult:
+        result = SearchReplaceResult(
+            search="\n".join(self._current_search).strip(),
+            replace="\n".join(self._current_replace).strip(),
+            reason="\n".join(self._current_reason).strip(),
+        )
+        self._current_search = []
+        self._current_replace = []
+        self._current_reason = []
+        return result
+
+
+class SearchReplaceSpan:
+    """A *SEARCH/REPLACE block* stored as offsets into the text it was parsed
+    from. Each section is only sliced out (and stripped) when it's accessed.
+    """
+
+    __slots__ = (
+        "text",
+        "search_start",
+        "search_end",
+        "replace_start",
+        "replace_end",
+        "reason_start",
+        "reason_end",
+    )
+
+    def __init__(
+        self,
+        text: str,
+        search_start: int,
+        search_end: int,
+        replace_start: int,
+        replace_end: int,
+        reason_start: int,
+        reason_end: int,
+    ):
+        self.text = text
+        self.search_start = search_start
+        self.search_end = search_end
+        self.replace_start = replace_start
+        self.replace_end = replace_end
+        self.reason_start = reason_start
+        self.reason_end = reason_end
+
+    @property
+    def search(self) -> str:
+        return self.text[self.search_start : self.search_end].strip()
+
+    @property
+    def replace(self) -> str:
+        return self.text[self.replace_start : self.replace_end].strip()
+
+    @property
+    def reason(self) -> str:
+        return self.text[self.reason_start : self.reason_end].strip()
+
+    def to_result(self) -> SearchReplaceResult:
+        return SearchReplaceResult(self.search, self.replace, self.reason)
+
+    def __repr__(self) -> str:
+        return f"SearchReplaceSpan(search={self.search!r}, replace={self.replace!r}, reason={self.reason!r})"
+
 
-    if current_search or current_replace or current_reason:
-        if state != ParserState.IN_REASON:
-            raise UnexpectedEndOfInput(STATE_TO_FENCE[state])
+def _find_fence_lines(text: str) -> list[tuple[int, int, str]]:
+    """Find every line of `text` that's a fence followed only by whitespace.
+
+    Returns where each line starts and ends (not including its newline) and
+    its fence, in order.
+    """
+    lines = []
+    for fence in FENCE_STATE_SPECS:
+        needle = "\n" + fence
+        if text.startswith(fence):
+            line_start = 0
+        else:
+            line_start = text.find(needle)
+            if line_start != -1:
+                line_start += 1
+
+        while line_start != -1:
+            rest_start = line_start + len(fence)
+            line_end = text.find("\n", rest_start)
+            if line_end == -1:
+                line_end = len(text)
+            if rest_start == line_end or text[rest_start:line_end].isspace():
+                lines.append((line_start, line_end, fence))
+
+            line_start = text.find(needle, line_end)
+            if line_start != -1:
+                line_start += 1
+
+    lines.sort()
+    return lines
+
+
+# FENCE_STATE_SPECS by state value rather than by state, since enum members
+# are slow to hash
+_FENCE_TRANSITIONS: dict[str, tuple[frozenset[int], int]] = {
+    fence: (frozenset(state.value for state in spec.allowed_in), spec.next_state.value)
+    for fence, spec in FENCE_STATE_SPECS.items()
+}
+
+
+def scan_search_replace_text(text: str) -> list[SearchReplaceSpan]:
+    """Parse *SEARCH/REPLACE blocks* without copying any of `text`.
+
+    Fence lines are found with `str.find` rather than by splitting `text`
+    into lines, and each result refers back into `text` by offset. Results
+    and errors are the same as `IncrementalParser` fed all of `text` at once.
+    """
+    looking, search, replace, reason = (state.value for state in ParserState)
+    results: list[SearchReplaceSpan] = []
+    state = looking
+
+    # Where each section of the current block is and whether it has any
+    # lines at all (an empty line still counts), by the value of the state
+    # it's read in
+    starts = [0] * (reason + 1)
+    ends = [0] * (reason + 1)
+    has_lines = [False] * (reason + 1)
+
+    # Where the lines after the last fence start
+    content_start = 0
+    for line_start, line_end, fence in _find_fence_lines(text):
+        allowed_in, next_state = _FENCE_TRANSITIONS[fence]
+        if state not in allowed_in:
+            raise UnexpectedFenceError(STATE_TO_FENCE[ParserState(state)], fence)
+
+        starts[state] = content_start
+        ends[state] = max(line_start - 1, content_start)
+        has_lines[state] = line_start > content_start
+
+        # If we're moving _out of_ the reason state
+        if state == reason:
+            results.append(
+                SearchReplaceSpan(
+                    text,
+                    starts[search],
+                    ends[search],
+                    starts[replace],
+                    ends[replace],
+                    starts[reason],
+                    ends[reason],
+                )
+            )
+            has_lines[search] = has_lines[replace] = has_lines[reason] = False
+
+        state = next_state
+        content_start = line_end + 1
+
+    # Unless the text ends with a fence line, its last line counts even if
+    # it's empty
+    starts[state] = min(content_start, len(text))
+    ends[state] = len(text)
+    has_lines[state] = content_start <= len(text)
+
+    if has_lines[search] or has_lines[replace] or has_lines[reason]:
+        if state != reason:
+            raise UnexpectedEndOfInput(STATE_TO_FENCE[ParserState(state)])
 
         results.append(
-            SearchReplaceResult(
-                search="\n".join(current_search).strip(),
-                replace="\n".join(current_replace).strip(),
-                reason="\n".join(current_reason).strip(),
+            SearchReplaceSpan(
+                text,
+                starts[search],
+                ends[search],
+                starts[replace],
+                ends[replace],
+                starts[reason],
+                ends[reason],
             )
         )
 
-    if state == ParserState.LOOKING_FOR_SEARCH:
-        raise UnexpectedEndOfInput(STATE_TO_FENCE[state])
+    if state == looking:
+        raise UnexpectedEndOfInput(STATE_TO_FENCE[ParserState.LOOKING_FOR_SEARCH])
 
     return results
+
+
+def parse_search_replace_text(text: str) -> list[SearchReplaceResult]:
+    return [span.to_result() for span in scan_search_replace_text(text)]
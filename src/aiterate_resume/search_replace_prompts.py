@@ -1,4 +1,13 @@
-from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from .system_prompts import system_prompt
+
+if TYPE_CHECKING:
+    from openai.types.chat.chat_completion_message_param import (
+        ChatCompletionMessageParam,
+    )
 
 
 format_prompt: str = """Once you understand the request you MUST provide each change as a *SEARCH/REPLACE block* per the examples below. All changes must use this exact *SEARCH/REPLACE block* format. DO NOT PROVIDE CHANGES OUTSIDE OF THIS *SEARCH/REPLACE block* FORMAT.
@@ -80,3 +89,64 @@ Do not include long runs of unchanging lines in *SEARCH/REPLACE* blocks.
 
 To move code within the resume, use 2 *SEARCH/REPLACE* blocks: 1 to delete it from its current location, 1 to insert it in the new location.
 """
+
+
+def initial_messages(resume_contents: str) -> list[ChatCompletionMessageParam]:
+    """The messages that start a conversation about improving a resume."""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": format_prompt},
+        *examples,
+        {
+            "role": "user",
+            "content": f"Provide changes to improve the following resume:\n\n{resume_contents}",
+        },
+    ]
+
+
+def project_messages(
+    resume_contents: str, marker_example: str
+) -> list[ChatCompletionMessageParam]:
+    """The messages that start a conversation about improving a resume split
+    across several files, each starting with a marker line like
+    `marker_example`."""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": format_prompt},
+        *examples,
+        {
+            "role": "user",
+            "content": f"The following resume is split across several files. Each file starts with a line like `{marker_example}` giving its name. Never change those lines or include them in a *SEARCH* section, and keep each *SEARCH/REPLACE block* within a single file.\n\nProvide changes to improve the following resume:\n\n{resume_contents}",
+        },
+    ]
+
+
+def next_round_messages(resume_contents: str) -> list[ChatCompletionMessageParam]:
+    """The messages that continue a conversation with another round of
+    improvements to the resume as it now reads."""
+    return [
+        {
+            "role": "user",
+            "content": f"Those changes have been applied. Provide any further changes that would improve the resume as it now reads. If it doesn't need any more changes, reply with a single *SEARCH/REPLACE block* with empty SEARCH and REPLACE sections.\n\n{resume_contents}",
+        }
+    ]
+
+
+def section_messages(
+    resume_contents: str, section_contents: str
+) -> list[ChatCompletionMessageParam]:
+    """The messages that start a conversation about improving one section of
+    a resume, with the whole resume given as context."""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": format_prompt},
+        *examples,
+        {
+            "role": "user",
+            "content": f"Here is a resume for context:\n\n{resume_contents}",
+        },
+        {
+            "role": "user",
+            "content": f"Provide changes to improve only the following section of that resume. Every *SEARCH* section must match text within this section. If it doesn't need any changes, reply with a single *SEARCH/REPLACE block* with empty SEARCH and REPLACE sections.\n\n{section_contents}",
+        },
+    ]
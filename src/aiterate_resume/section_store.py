@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from .edit_plan import plan_edits
+from .search_replace import SearchReplaceResult
+
+SECTION_STORE_VERSION = 1
+
+
+class SectionStore:
+    """An on-disk store of the edits accepted for each section of a resume.
+
+    Entries are keyed by a hash of the section's text, so a section that
+    hasn't changed since an earlier run can be edited the same way again
+    without asking the model.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(section_text: str) -> str:
+        return hashlib.sha256(section_text.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, section_text: str) -> list[list[SearchReplaceResult]] | None:
+        """The rounds of edits stored for `section_text`, or None if there are
+        none."""
+        try:
+            with self._path(self.key(section_text)).open("r") as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = None
+
+        if not isinstance(data, dict) or data.get("version") != SECTION_STORE_VERSION:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return [
+            [
+                SearchReplaceResult(
+                    change["search"], change["replace"], change["reason"]
+                )
+                for change in changes
+            ]
+            for changes in data["rounds"]
+        ]
+
+    def put(self, section_text: str, rounds: list[list[SearchReplaceResult]]) -> None:
+        path = self._path(self.key(section_text))
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first so readers never see partial entries
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(
+                    {
+                        "version": SECTION_STORE_VERSION,
+                        "rounds": [
+                            [change._asdict() for change in changes]
+                            for changes in rounds
+                        ],
+                    },
+                    file,
+                )
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+def replay_rounds(rounds: list[list[SearchReplaceResult]], text: str) -> str | None:
+    """Apply stored rounds of changes to `text` the same way they were
+    originally applied. Returns None if any of them no longer applies."""
+    for changes in rounds:
+        failures, text = plan_edits(changes, text).apply(text)
+        if failures:
+            return None
+
+    return text
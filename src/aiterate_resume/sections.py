@@ -0,0 +1,117 @@
+import re
+from enum import Enum
+from typing import NamedTuple
+
+
+class Markup(Enum):
+    LATEX = "latex"
+    HTML = "html"
+    PLAIN = "plain"
+
+
+class Section(NamedTuple):
+    start: int
+    end: int
+    text: str
+
+    editable: bool = True
+    "False for parts that aren't resume content (ex: a LaTeX preamble)."
+
+
+_LATEX_RE = re.compile(r"\\(documentclass|begin\{document\}|section)\b")
+_HTML_RE = re.compile(r"<(html|body|section|h[1-6]|ul|li|div|p)\b", re.IGNORECASE)
+
+_BOUNDARY_RES = {
+    Markup.LATEX: [re.compile(r"^[ \t]*\\(?:sub)*section\*?\s*[{\[]", re.MULTILINE)],
+    Markup.HTML: [
+        re.compile(r"^[ \t]*<(?:h[1-6]|section)\b", re.IGNORECASE | re.MULTILINE),
+        # Only used if there are no headings or sections to split on
+        re.compile(r"^[ \t]*<li\b", re.IGNORECASE | re.MULTILINE),
+    ],
+}
+
+
+def detect_markup(text: str) -> Markup:
+    if _LATEX_RE.search(text):
+        return Markup.LATEX
+    if _HTML_RE.search(text):
+        return Markup.HTML
+    return Markup.PLAIN
+
+
+def _boundaries(text: str, markup: Markup) -> list[int]:
+    if markup == Markup.PLAIN:
+        # The first line after one or more blank lines
+        return [
+            match.end()
+            for match in re.finditer(r"\n(?:[ \t]*\n)+", text)
+            if match.end() < len(text)
+        ]
+
+    for boundary_re in _BOUNDARY_RES[markup]:
+        boundaries = [match.start() for match in boundary_re.finditer(text)]
+        if boundaries:
+            return boundaries
+
+    return []
+
+
+def split_sections(
+    text: str, max_sections: int | None = None, min_chars: int = 0
+) -> list[Section]:
+    """Split a resume into consecutive sections using its markup.
+
+    LaTeX resumes are split at `\\section`s, HTML resumes at headings and
+    `<section>`s (or `<li>`s if there are none), and plain text at blank
+    lines. The sections cover all of `text`, so joining their text gives
+    back `text`.
+
+    Sections shorter than `min_chars` are merged into their neighbor. If
+    `max_sections` is given, the smallest neighboring sections are then
+    merged until there are at most that many.
+    """
+    markup = detect_markup(text)
+
+    content_start = 0
+    content_end = len(text)
+    if markup == Markup.LATEX:
+        begin = text.find("\\begin{document}")
+        if begin != -1:
+            content_start = text.find("\n", begin) + 1 or len(text)
+        end = text.rfind("\\end{document}")
+        if end >= content_start:
+            content_end = end
+
+    points = [content_start]
+    points.extend(
+        content_start + offset
+        for offset in _boundaries(text[content_start:content_end], markup)
+        if offset > 0
+    )
+    points.append(content_end)
+
+    ranges = [(start, end) for start, end in zip(points, points[1:]) if start < end]
+    i = 0
+    while i < len(ranges) and len(ranges) > 1:
+        if ranges[i][1] - ranges[i][0] >= min_chars:
+            i += 1
+        elif i + 1 < len(ranges):
+            ranges[i : i + 2] = [(ranges[i][0], ranges[i + 1][1])]
+        else:
+            ranges[i - 1 : i + 1] = [(ranges[i - 1][0], ranges[i][1])]
+    if max_sections is not None:
+        while len(ranges) > max(max_sections, 1):
+            # Merge the pair of neighbors with the least text between them
+            i = min(
+                range(len(ranges) - 1),
+                key=lambda i: ranges[i + 1][1] - ranges[i][0],
+            )
+            ranges[i : i + 2] = [(ranges[i][0], ranges[i + 1][1])]
+
+    sections = [Section(start, end, text[start:end]) for start, end in ranges]
+    if content_start > 0:
+        sections.insert(0, Section(0, content_start, text[:content_start], False))
+    if content_end < len(text):
+        sections.append(Section(content_end, len(text), text[content_end:], False))
+
+    return sections
@@ -0,0 +1,111 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from . import search_replace_prompts
+from .chat import ChatSession, Console
+from .compaction import Compactor
+from .deadline import Deadline
+from .edit_formats import EditFormat
+from .reflection import modify_resume
+from .search_replace import MatchTier, SearchReplaceResult
+from .section_store import SectionStore, replay_rounds
+from .sections import Section, split_sections
+
+
+def modify_resume_sharded(
+    session: ChatSession,
+    resume_contents: str,
+    jobs: int = 4,
+    max_shards: int | None = 8,
+    min_shard_chars: int = 200,
+    stream: bool = False,
+    compactor: Compactor | None = None,
+    tier_counts: Counter[MatchTier] | None = None,
+    candidates: int = 1,
+    store: SectionStore | None = None,
+    edit_format: EditFormat = EditFormat.SEARCH_REPLACE,
+    deadline: Deadline | None = None,
+    best_effort: bool = False,
+    rejected: list[tuple[SearchReplaceResult, Exception]] | None = None,
+) -> str:
+    """Improve a resume by editing each of its sections concurrently.
+
+    The resume is split into sections using its markup (see
+    `split_sections`) and each section gets its own conversation, with the
+    whole resume given as shared context. Changes are applied to their
+    section's text only, so a change outside of its section fails and is
+    reflected on within that section's conversation. The changed sections are
+    then joined back together.
+
+    If `store` is given, the edits accepted for each section are stored, and
+    sections that are unchanged since an earlier run get the stored edits
+    again rather than being sent to the model. Pass `max_shards=None` with a
+    store, so that a small change to the resume doesn't change where the
+    other sections start and end.
+
+    `deadline`, `best_effort`, and `rejected` work the same as in
+    `modify_resume`, with the deadline shared by every section. Sections that
+    ran out of time or had changes rejected aren't stored.
+    """
+    sections = split_sections(resume_contents, max_shards, min_shard_chars)
+    shard_console = Console(quiet=True)
+
+    def modify_section(
+        section: Section,
+    ) -> tuple[str, ChatSession, Counter[MatchTier], bool]:
+        shard_session = session.fork(shard_console)
+        shard_tier_counts: Counter[MatchTier] = Counter()
+        if not section.editable or not section.text.strip():
+            return section.text, shard_session, shard_tier_counts, False
+
+        if store is not None:
+            stored_rounds = store.get(section.text)
+            if stored_rounds is not None:
+                replayed = replay_rounds(stored_rounds, section.text)
+                if replayed is not None:
+                    return replayed, shard_session, shard_tier_counts, True
+
+        applied_rounds: list[list[SearchReplaceResult]] = []
+        section_rejected: list[tuple[SearchReplaceResult, Exception]] = []
+        changed = modify_resume(
+            shard_session,
+            section.text,
+            search_replace_prompts.section_messages(resume_contents, section.text),
+            stream=stream,
+            compactor=compactor,
+            tier_counts=shard_tier_counts,
+            candidates=candidates,
+            applied_rounds=applied_rounds,
+            edit_format=edit_format,
+            deadline=deadline,
+            best_effort=best_effort,
+            rejected=section_rejected,
+        )
+        if rejected is not None:
+            rejected.extend(section_rejected)
+        finished = not section_rejected and not (deadline and deadline.expired)
+        if store is not None and finished:
+            store.put(section.text, applied_rounds)
+        return changed, shard_session, shard_tier_counts, False
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(modify_section, sections))
+
+    for i, (_, shard_session, shard_tier_counts, _) in enumerate(results):
+        session.requests_sent += shard_session.requests_sent
+        session.retries += shard_session.retries
+        if tier_counts is not None:
+            tier_counts.update(shard_tier_counts)
+        if shard_session.requests_sent:
+            session.console.print_status(
+                f"Section {i + 1}/{len(sections)}: "
+                f"{shard_session.requests_sent} requests"
+            )
+
+    if store is not None:
+        num_reused = sum(reused for _, _, _, reused in results)
+        session.console.print_status(
+            f"Reused stored edits for {num_reused}/{len(sections)} sections."
+        )
+
+    return "".join(changed for changed, _, _, _ in results)
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from .search_replace import SearchReplaceResult
+from .search_replace_format import parse_search_replace_text
+
+
+class StructuredFormatError(Exception):
+    """Raised when a response doesn't match `EDITS_SCHEMA`."""
+
+
+EDITS_SCHEMA: dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "edits": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "search": {"type": "string"},
+                    "replace": {"type": "string"},
+                    "reason": {"type": "string"},
+                },
+                "required": ["search", "replace", "reason"],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["edits"],
+    "additionalProperties": False,
+}
+
+RESPONSE_FORMAT: dict[str, Any] = {
+    "type": "json_schema",
+    "json_schema": {"name": "resume_edits", "strict": True, "schema": EDITS_SCHEMA},
+}
+"The `response_format` that asks for responses matching `EDITS_SCHEMA`."
+
+_EDIT_KEYS = frozenset(SearchReplaceResult._fields)
+
+structured_format_prompt: str = """Once you understand the request you MUST provide your changes as a JSON object with an `edits` array. Each item of `edits` is a *SEARCH/REPLACE block*: an object whose `search` is the text to find in the resume (its *SEARCH* section), whose `replace` is the text to replace it with (its *REPLACE* section), and whose `reason` says why the change is needed.
+
+You MUST provide a reason for each change. Reference specific resume-writing guidelines in each reason.
+
+Do not provide any other text or formatting outside of the JSON object.
+"""
+
+
+def edits_json(results: list[SearchReplaceResult]) -> str:
+    return json.dumps({"edits": [result._asdict() for result in results]}, indent=2)
+
+
+def validate_edits(data: Any) -> list[SearchReplaceResult]:
+    """Check that `data` matches `EDITS_SCHEMA` and convert it.
+
+    Raises:
+        StructuredFormatError: If it doesn't match, saying where.
+    """
+    if not isinstance(data, dict) or data.keys() != {"edits"}:
+        raise StructuredFormatError(
+            "The response must be an object with only an `edits` key."
+        )
+
+    edits = data["edits"]
+    if not isinstance(edits, list):
+        raise StructuredFormatError("`edits` must be an array.")
+
+    results = []
+    for i, edit in enumerate(edits):
+        if not isinstance(edit, dict) or edit.keys() != _EDIT_KEYS:
+            raise StructuredFormatError(
+                f"`edits[{i}]` must be an object with only the keys `search`, "
+                "`replace`, and `reason`."
+            )
+        if not all(isinstance(value, str) for value in edit.values()):
+            raise StructuredFormatError(
+                f"The `search`, `replace`, and `reason` of `edits[{i}]` must be "
+                "strings."
+            )
+        results.append(
+            SearchReplaceResult(edit["search"], edit["replace"], edit["reason"])
+        )
+
+    return results
+
+
+def parse_structured_edits(text: str) -> list[SearchReplaceResult]:
+    """Parse a response that should match `EDITS_SCHEMA`.
+
+    Responses that aren't JSON at all (ex: from a model or backend that
+    ignored the `response_format`) are parsed as *SEARCH/REPLACE blocks*
+    instead.
+
+    Raises:
+        StructuredFormatError: If the response is JSON that doesn't match.
+        UnexpectedFenceError, UnexpectedEndOfInput: If the response isn't
+            JSON and isn't valid *SEARCH/REPLACE blocks* either.
+    """
+    stripped = text.strip()
+    if stripped.startswith("```"):
+        # A JSON code block
+        stripped = stripped.strip("`").removeprefix("json").strip()
+    if not stripped.startswith("{"):
+        return parse_search_replace_text(text)
+
+    try:
+        data = json.loads(stripped)
+    except json.JSONDecodeError as e:
+        raise StructuredFormatError(f"The response is not valid JSON: {e}") from e
+
+    return validate_edits(data)
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from openai.types.chat.chat_completion_message_param import (
+        ChatCompletionMessageParam,
+    )
+
+
+def estimate_tokens(messages: list[ChatCompletionMessageParam]) -> int:
+    """Roughly estimate the prompt tokens used by `messages`.
+
+    Uses the common ~4 characters per token heuristic plus a few tokens of
+    overhead per message, which is close enough to compare prompt sizes.
+    """
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        total += 4 + (len(content) // 4 if isinstance(content, str) else 0)
+
+    return total
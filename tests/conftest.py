@@ -0,0 +1,37 @@
+from collections.abc import Callable
+
+import pytest
+
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.fake_llm import FakeClient
+from aiterate_resume.metrics import Metrics
+from aiterate_resume.reflection import modify_resume
+from aiterate_resume.search_replace_prompts import initial_messages
+
+MakeSession = Callable[..., ChatSession]
+RunResume = Callable[..., tuple[str, ChatSession]]
+
+
+@pytest.fixture
+def make_session() -> MakeSession:
+    """Build a quiet session around a fake client."""
+
+    def make(client: FakeClient, metrics: Metrics | None = None) -> ChatSession:
+        return ChatSession(client, Console(quiet=True), metrics=metrics)
+
+    return make
+
+
+@pytest.fixture
+def run_resume(make_session: MakeSession) -> RunResume:
+    """Run `modify_resume` on a resume with a quiet session around a fake
+    client. Returns the changed resume and the session."""
+
+    def run(
+        client: FakeClient, resume: str, metrics: Metrics | None = None, **kwargs
+    ) -> tuple[str, ChatSession]:
+        session = make_session(client, metrics)
+        changed = modify_resume(session, resume, initial_messages(resume), **kwargs)
+        return changed, session
+
+    return run
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from aiterate_resume.async_chat import AsyncChatSession
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.fake_llm import FakeAsyncClient, FakeClient, block
+from aiterate_resume.reflection import modify_resume, modify_resume_async
+from aiterate_resume.scheduler import AsyncRequestScheduler
+from aiterate_resume.search_replace_prompts import initial_messages
+
+
+def flaky_model(messages) -> str:
+    """Mangles its first response's fences and fixes them when asked to."""
+    if messages[-1]["role"] == "system":
+        return block("Led a team", "Led a team of five")
+    return "<<<<<<< SEARCH\nLed a team\n>>>>>>> REPLACE\n"
+
+
+def run_async(session: AsyncChatSession, resume: str = "Led a team.", **kwargs):
+    return modify_resume_async(session, resume, initial_messages(resume), **kwargs)
+
+
+def test_matches_sync_session():
+    resume = "Led a team."
+    sync_session = ChatSession(FakeClient(flaky_model), Console(quiet=True))
+    expected = modify_resume(sync_session, resume, initial_messages(resume))
+
+    session = AsyncChatSession(FakeAsyncClient(flaky_model), Console(quiet=True))
+    changed = asyncio.run(run_async(session))
+
+    assert changed == expected == "Led a team of five."
+    assert session.messages == sync_session.messages
+    assert session.requests_sent == sync_session.requests_sent == 2
+
+
+def test_runs_many_sessions_concurrently():
+    client = FakeAsyncClient(flaky_model, latency=0.05)
+    session = AsyncChatSession(client, Console(quiet=True))
+
+    async def run_all() -> list[str]:
+        return await asyncio.gather(*(run_async(session.fork()) for _ in range(200)))
+
+    start = time.perf_counter()
+    results = asyncio.run(run_all())
+
+    assert results == ["Led a team of five."] * 200
+    assert len(client.requests) == 400
+    # Two rounds of latency, not 400
+    assert time.perf_counter() - start < 2
+
+
+def test_timeouts_cancel_the_request_in_flight():
+    session = AsyncChatSession(
+        FakeAsyncClient(flaky_model, latency=5), Console(quiet=True)
+    )
+
+    async def run_with_timeout() -> str:
+        async with asyncio.timeout(0.05):
+            return await run_async(session)
+
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        asyncio.run(run_with_timeout())
+
+    assert time.perf_counter() - start < 1
+    assert session.messages[-1]["role"] == "user"
+    assert session.metrics.spans[-1].name == "request"
+
+
+def test_passes_request_timeout_through_the_scheduler():
+    client = FakeAsyncClient([block("Led a team", "Led a team of five")] * 4, 0.05)
+    session = AsyncChatSession(
+        client,
+        Console(quiet=True),
+        scheduler=AsyncRequestScheduler(max_in_flight=2),
+        request_timeout=5,
+    )
+
+    async def run_all() -> list[str]:
+        return await asyncio.gather(*(run_async(session.fork()) for _ in range(4)))
+
+    start = time.perf_counter()
+    assert asyncio.run(run_all()) == ["Led a team of five."] * 4
+
+    # Two at a time
+    assert time.perf_counter() - start >= 0.1
+    assert all(request["timeout"] == 5 for request in client.requests)
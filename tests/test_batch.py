@@ -0,0 +1,78 @@
+import time
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+from aiterate_resume.batch import batch_main, expand_inputs, output_paths
+from aiterate_resume.chat import Console
+from aiterate_resume.fake_llm import FakeClient, block
+
+
+def test_expand_directory(tmp_path: Path):
+    (tmp_path / "b.tex").write_text("b")
+    (tmp_path / "a.html").write_text("a")
+    (tmp_path / "nested").mkdir()
+
+    assert expand_inputs(str(tmp_path)) == [tmp_path / "a.html", tmp_path / "b.tex"]
+
+
+def test_expand_glob(tmp_path: Path):
+    (tmp_path / "a.tex").write_text("a")
+    (tmp_path / "b.html").write_text("b")
+
+    assert expand_inputs(str(tmp_path / "*.tex")) == [tmp_path / "a.tex"]
+
+
+def test_output_paths_keep_names_distinct(tmp_path: Path):
+    inputs = [tmp_path / "one" / "resume.tex", tmp_path / "two" / "resume.tex"]
+    out_dir = tmp_path / "out"
+
+    assert output_paths(inputs, out_dir) == [
+        out_dir / "one" / "resume.tex",
+        out_dir / "two" / "resume.tex",
+    ]
+
+
+def test_output_paths_flat(tmp_path: Path):
+    inputs = [tmp_path / "a.tex", tmp_path / "b.tex"]
+    out_dir = tmp_path / "out"
+
+    assert output_paths(inputs, out_dir) == [out_dir / "a.tex", out_dir / "b.tex"]
+
+
+def test_batch_main(tmp_path: Path, capsys: pytest.CaptureFixture[str]):
+    inputs = tmp_path / "in"
+    inputs.mkdir()
+    for i in range(4):
+        (inputs / f"{i}.html").write_text(f"Led team {i}.")
+    (inputs / "broken.html").write_text("Nothing to change.")
+
+    def model(messages) -> str:
+        if "Nothing to change." in str(messages[-1]["content"]):
+            raise ValueError("The model is down.")
+        if messages[-1]["role"] == "user" and "Led team 0." in messages[-1]["content"]:
+            # Needs a reflection, which is an extra request but not a retry
+            return block("Led teams", "Led a team")
+        return block("Led team", "Led a team")
+
+    client = FakeClient(model, latency=0.1)
+    args = Namespace(
+        inputs=str(inputs), out=str(tmp_path / "out"), jobs=5, stream=False
+    )
+
+    start = time.perf_counter()
+    succeeded = batch_main(client, args, Console())
+
+    # The resumes were improved at the same time
+    assert time.perf_counter() - start < 0.4
+    assert not succeeded
+    for i in range(4):
+        assert (tmp_path / "out" / f"{i}.html").read_text() == f"Led a team {i}."
+    assert not (tmp_path / "out" / "broken.html").exists()
+
+    # Long lines are wrapped
+    output = " ".join(capsys.readouterr().out.split())
+    assert "4 succeeded, 1 failed, 6 requests (1 extra requests, 0 retries)" in output
+    assert "0.html: 1 extra requests, 0 retries" in output
+    assert "broken.html failed" in output
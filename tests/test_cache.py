@@ -0,0 +1,88 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from aiterate_resume.cache import CacheMissError, CacheMode, ResponseCache
+
+
+def test_key_ignores_dict_order():
+    assert ResponseCache.key({"model": "a", "messages": []}) == ResponseCache.key(
+        {"messages": [], "model": "a"}
+    )
+    assert ResponseCache.key({"model": "a"}) != ResponseCache.key({"model": "b"})
+
+
+def test_read_write(tmp_path: Path):
+    cache = ResponseCache(tmp_path)
+    assert cache.get("abc") is None
+
+    cache.put("abc", {"content": "hi"})
+    assert cache.get("abc") == {"content": "hi"}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_read_only_does_not_store(tmp_path: Path):
+    cache = ResponseCache(tmp_path, CacheMode.READ_ONLY)
+    cache.put("abc", {"content": "hi"})
+    assert cache.get("abc") is None
+
+
+def test_refresh_ignores_existing_entries(tmp_path: Path):
+    ResponseCache(tmp_path).put("abc", {"content": "old"})
+
+    cache = ResponseCache(tmp_path, CacheMode.REFRESH)
+    assert cache.get("abc") is None
+    cache.put("abc", {"content": "new"})
+
+    assert ResponseCache(tmp_path).get("abc") == {"content": "new"}
+
+
+def test_replay_fails_on_miss(tmp_path: Path):
+    ResponseCache(tmp_path).put("abc", {"content": "hi"})
+
+    cache = ResponseCache(tmp_path, CacheMode.REPLAY)
+    assert cache.get("abc") == {"content": "hi"}
+    with pytest.raises(CacheMissError) as exc_info:
+        cache.get("def")
+    assert exc_info.value.key == "def"
+
+
+def test_evicts_least_recently_used(tmp_path: Path):
+    cache = ResponseCache(tmp_path, max_bytes=10**6)
+    for i, key in enumerate(["aa", "bb", "cc"]):
+        cache.put(key, {"content": "x" * 100})
+        os.utime(tmp_path / key[:2] / f"{key}.json", (i, i))
+
+    # Reading "aa" makes it the most recently used entry
+    assert cache.get("aa") is not None
+
+    cache.max_bytes = 250
+    cache.evict()
+
+    assert cache.get("bb") is None
+    assert cache.get("aa") is not None
+    assert cache.get("cc") is not None
+
+
+def test_only_scans_when_over_the_limit(tmp_path: Path, monkeypatch):
+    cache = ResponseCache(tmp_path, max_bytes=250)
+    scans = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: scans.append(1) or evict())
+
+    cache.put("aa", {"content": "x" * 100})
+    cache.put("bb", {"content": "x" * 100})
+    assert len(scans) == 1
+
+    cache.put("cc", {"content": "x" * 100})
+    assert len(scans) == 2
+    assert cache.get("aa") is None
+
+
+def test_failed_put_leaves_no_temporary_file(tmp_path: Path):
+    cache = ResponseCache(tmp_path)
+    with pytest.raises(TypeError):
+        cache.put("abc", {"content": object()})
+
+    assert list(tmp_path.glob("*/*")) == []
@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import pytest
+
+from aiterate_resume.checkpoint import Checkpoint, CheckpointError
+from aiterate_resume.fake_llm import FakeClient, block
+from aiterate_resume.metrics import Metrics
+from aiterate_resume.search_replace import NoReplacementError, SearchReplaceResult
+
+RESUME = "Led a team.\nWrote code."
+
+
+def test_round_trip(tmp_path: Path):
+    path = tmp_path / "checkpoint.json"
+    change = SearchReplaceResult("Lead", "Led", "Typo.")
+    checkpoint = Checkpoint(
+        RESUME,
+        [{"role": "user", "content": "Hi"}],
+        "changed",
+        2,
+        [(change, NoReplacementError())],
+    )
+    checkpoint.save(path)
+
+    loaded = Checkpoint.load(path)
+    assert loaded[:4] == checkpoint[:4]
+    [(loaded_change, loaded_error)] = loaded.failures
+    assert loaded_change == change
+    assert str(loaded_error) == str(NoReplacementError())
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_resume_after_interruption(tmp_path: Path, run_resume):
+    path = tmp_path / "checkpoint.json"
+
+    # The first round applies one change but fails another, then the
+    # reflection request fails
+    first_response = block("Led a team.", "Led a team of five.") + block(
+        "Wrote cod.", "Wrote Python code."
+    )
+    with pytest.raises(RuntimeError):
+        run_resume(FakeClient([first_response]), RESUME, checkpoint_path=path)
+
+    checkpoint = Checkpoint.load(path)
+    assert checkpoint.changed_contents == "Led a team of five.\nWrote code."
+    assert checkpoint.remaining_requests == 3
+    assert len(checkpoint.failures) == 1
+
+    client = FakeClient([block("Wrote code.", "Wrote Python code.")])
+    metrics = Metrics()
+    changed, _ = run_resume(
+        client, RESUME, metrics, checkpoint_path=path, resume_from=checkpoint
+    )
+
+    assert changed == "Led a team of five.\nWrote Python code."
+    # Only the reflection is sent, continuing the original conversation
+    [request] = client.requests
+    assert request["messages"][-2]["content"] == first_response
+    assert metrics.reflections == {"NoReplacementError": 1}
+    assert Checkpoint.load(path).failures == []
+
+
+def test_resume_different_resume(run_resume):
+    checkpoint = Checkpoint("Another resume.", [], "Another resume.", 4, [])
+    with pytest.raises(CheckpointError):
+        run_resume(FakeClient([]), RESUME, resume_from=checkpoint)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '{"version": 0}',
+        '{"version": 1, "resume_contents": ""}',
+        '{"version": 1, "resume_contents": "", "messages": [], '
+        '"changed_contents": "", "remaining_requests": 1, "failures": [1]}',
+    ],
+)
+def test_load_invalid(tmp_path: Path, text: str):
+    path = tmp_path / "checkpoint.json"
+    path.write_text(text)
+    with pytest.raises(CheckpointError):
+        Checkpoint.load(path)
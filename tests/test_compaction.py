@@ -0,0 +1,51 @@
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.compaction import (
+    Compactor,
+    estimate_tokens,
+    locate_lines,
+    merge_ranges,
+)
+from aiterate_resume.fake_llm import FakeClient
+from aiterate_resume.search_replace import NoReplacementError, SearchReplaceResult
+
+
+def test_estimate_tokens():
+    assert estimate_tokens([{"role": "user", "content": "x" * 40}]) == 14
+
+
+def test_locate_exact():
+    lines = ["a", "b", "c", "b", "c"]
+    assert locate_lines("b\nc", lines) == [(1, 3), (3, 5)]
+
+
+def test_locate_ignores_indentation():
+    lines = ["<ul>", "  <li>one</li>", "  <li>two</li>", "</ul>"]
+    assert locate_lines("<li>two</li>\n</ul>", lines) == [(2, 4)]
+
+
+def test_locate_by_words():
+    lines = ["Built a map editor", "Led a team of five"]
+    assert locate_lines("Led the team", lines) == [(1, 2)]
+
+
+def test_locate_nothing_similar():
+    assert locate_lines("xyz", ["abc", "def"]) == []
+
+
+def test_merge_ranges():
+    assert merge_ranges([(5, 8), (0, 3), (2, 4), (8, 9)]) == [(0, 4), (5, 9)]
+
+
+def test_apply_repair_stays_within_budget():
+    document = "\n".join(f"line {i} " + "x" * 50 for i in range(200))
+    session = ChatSession(FakeClient([]), Console(quiet=True))
+    session.messages = [{"role": "user", "content": document}]
+    failure = (SearchReplaceResult("line 100", "new", "reason"), NoReplacementError())
+
+    compactor = Compactor(token_budget=1000, window_lines=50)
+    messages = compactor.apply_repair_messages(session, [failure], document, [])
+
+    assert estimate_tokens(messages) <= 1000
+    content = messages[1].get("content")
+    assert isinstance(content, str) and "line 100 " in content
+    assert compactor.compact_tokens < compactor.full_tokens
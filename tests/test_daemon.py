@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+
+import openai
+import pytest
+
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.cli import main
+from aiterate_resume.daemon import JobServer
+from aiterate_resume.daemon_client import DaemonClient, DaemonError
+from aiterate_resume.fake_llm import FakeHTTPError, FakeLLMServer, block
+
+
+def job_server(llm: FakeLLMServer, jobs: int = 2) -> JobServer:
+    client = openai.OpenAI(base_url=llm.url, api_key="test", max_retries=0)
+    return JobServer(ChatSession(client, Console(quiet=True)), jobs=jobs)
+
+
+def test_runs_jobs_end_to_end():
+    replies = [block("Led a team", "Led a team of five")] * 3
+    with FakeLLMServer(replies) as llm, job_server(llm) as server:
+        daemon = DaemonClient(server.url)
+        job_ids = [daemon.submit("Led a team.")["id"] for _ in range(3)]
+        streams = [list(daemon.events(job_id)) for job_id in job_ids]
+        statuses = [daemon.status(job_id) for job_id in job_ids]
+
+    assert len(llm.requests) == 3
+    for events, status in zip(streams, statuses):
+        assert status["status"] == "done"
+        assert status["result"] == "Led a team of five."
+        assert events[-1] == {"event": "document", "content": status["result"]}
+        assert any(event["event"] == "edit" for event in events)
+
+
+def test_reports_failed_jobs():
+    with FakeLLMServer([FakeHTTPError(400)]) as llm, job_server(llm) as server:
+        daemon = DaemonClient(server.url)
+        job_id = daemon.submit("Led a team.")["id"]
+        events = list(daemon.events(job_id))
+        status = daemon.status(job_id)
+
+    assert status["status"] == "failed"
+    assert events[-1]["event"] == "error"
+    assert "BadRequestError" in events[-1]["message"]
+
+
+def test_unknown_job():
+    with FakeLLMServer([]) as llm, job_server(llm) as server:
+        with pytest.raises(DaemonError, match="404"):
+            DaemonClient(server.url).status("missing")
+
+
+def test_client_command(tmp_path: Path, monkeypatch, capfd):
+    resume = tmp_path / "resume.txt"
+    resume.write_text("Led a team.")
+
+    with FakeLLMServer([block("Led a team", "Led a team of five")]) as llm:
+        with job_server(llm) as server:
+            monkeypatch.setattr(
+                "sys.argv",
+                [
+                    "aiterate-resume",
+                    "client",
+                    str(resume),
+                    "--server",
+                    server.url,
+                    "--output",
+                    "ndjson",
+                ],
+            )
+            main()
+
+    events = [json.loads(line) for line in capfd.readouterr().out.splitlines()]
+    assert events[-1] == {"event": "document", "content": "Led a team of five."}
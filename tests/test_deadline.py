@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import pytest
+
+from aiterate_resume.async_chat import AsyncChatSession
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.deadline import BudgetExhausted, Deadline
+from aiterate_resume.fake_llm import FakeAsyncClient, FakeClient, block
+from aiterate_resume.pipeline import Pipeline, PipelineOptions
+from aiterate_resume.reflection import modify_resume, modify_resume_async
+from aiterate_resume.search_replace import NoReplacementError
+from aiterate_resume.search_replace_prompts import initial_messages
+
+RESUME = "Led a team.\nWrote code."
+
+# Applies one change but not the other
+FIRST_RESPONSE = block("Led a team.", "Led a team of five.") + block(
+    "Wrote cod.", "Wrote Python code."
+)
+
+
+def test_deadline():
+    now = 100.0
+    deadline = Deadline(10, clock=lambda: now)
+
+    assert deadline.remaining() == 10
+    assert deadline.request_timeout(4) == 4
+    now = 108.0
+    assert deadline.request_timeout(4) == 2
+    assert not deadline.expired
+    now = 111.0
+    assert deadline.remaining() == 0
+    assert deadline.expired
+
+
+def test_out_of_attempts():
+    client = FakeClient([FIRST_RESPONSE] + ["not a block"] * 3)
+    session = ChatSession(client, Console(quiet=True))
+    with pytest.raises(BudgetExhausted, match="Out of attempts"):
+        modify_resume(session, RESUME, initial_messages(RESUME))
+
+
+def test_best_effort_keeps_applied_changes():
+    client = FakeClient([FIRST_RESPONSE] + ["not a block"] * 3)
+    session = ChatSession(client, Console(quiet=True))
+    rejected = []
+    changed = modify_resume(
+        session, RESUME, initial_messages(RESUME), best_effort=True, rejected=rejected
+    )
+
+    assert changed == "Led a team of five.\nWrote code."
+    [(change, error)] = rejected
+    assert change.search == "Wrote cod."
+    assert isinstance(error, NoReplacementError)
+
+
+def test_deadline_limits_requests():
+    client = FakeClient([FIRST_RESPONSE, block("Wrote code.", "Wrote Python code.")])
+    client.latency = 0.2
+    pipeline = Pipeline(
+        ChatSession(client, Console(quiet=True)),
+        PipelineOptions(deadline=0.3, best_effort=True),
+    )
+
+    start = time.perf_counter()
+    changed = pipeline.run(RESUME)
+
+    assert time.perf_counter() - start < 0.45
+    assert changed == "Led a team of five.\nWrote code."
+    assert len(pipeline.rejected) == 1
+    # The repair request only got the time that was left
+    assert client.requests[1]["timeout"] < 0.15
+
+
+def test_deadline_stops_a_stream_that_keeps_sending():
+    # Each chunk arrives long before any request timeout, but the whole
+    # response would take a second
+    client = FakeClient(
+        [block("Led a team.", "Led a team of five.") * 10],
+        chunk_size=8,
+        chunk_latency=0.01,
+    )
+    session = ChatSession(client, Console(quiet=True))
+
+    start = time.perf_counter()
+    with pytest.raises(BudgetExhausted, match="Out of time"):
+        modify_resume(
+            session,
+            RESUME,
+            initial_messages(RESUME),
+            stream=True,
+            deadline=Deadline(0.2),
+        )
+
+    assert time.perf_counter() - start < 0.5
+    assert len(client.requests) == 1
+
+
+def test_no_requests_once_expired():
+    client = FakeClient([])
+    session = ChatSession(client, Console(quiet=True))
+    changed = modify_resume(
+        session,
+        RESUME,
+        initial_messages(RESUME),
+        deadline=Deadline(0),
+        best_effort=True,
+    )
+
+    assert changed == RESUME
+    assert client.requests == []
+
+
+def test_async_deadline():
+    client = FakeAsyncClient([FIRST_RESPONSE, block("Wrote code.", "x")], latency=0.2)
+    session = AsyncChatSession(client, Console(quiet=True), request_timeout=60)
+
+    changed = asyncio.run(
+        modify_resume_async(
+            session,
+            RESUME,
+            initial_messages(RESUME),
+            deadline=Deadline(0.3),
+            best_effort=True,
+        )
+    )
+
+    assert changed == "Led a team of five.\nWrote code."
+    assert client.requests[1]["timeout"] < 0.15
@@ -0,0 +1,104 @@
+from aiterate_resume.edit_plan import (
+    OverlappingEditError,
+    ProtectedTextError,
+    plan_edits,
+)
+from aiterate_resume.search_replace import (
+    MultipleReplacementsError,
+    NoReplacementError,
+    SearchReplaceResult,
+)
+
+
+def test_applies_all_edits_in_one_splice():
+    changes = [
+        SearchReplaceResult("third", "3rd", "reason"),
+        SearchReplaceResult("first", "1st", "reason"),
+    ]
+    plan = plan_edits(changes, "first second third")
+
+    assert [edit.change for edit in plan.edits] == [changes[1], changes[0]]
+    assert plan.apply("first second third") == ([], "1st second 3rd")
+
+
+def test_overlapping_edits():
+    first = SearchReplaceResult("one two", "1 2", "reason")
+    second = SearchReplaceResult("two three", "2 3", "reason")
+
+    failures, changed = plan_edits([first, second], "one two three").apply(
+        "one two three"
+    )
+
+    assert changed == "1 2 three"
+    assert len(failures) == 1
+    assert failures[0][0] == second
+    assert isinstance(failures[0][1], OverlappingEditError)
+    assert failures[0][1].other == first
+
+
+def test_adjacent_edits_do_not_overlap():
+    changes = [
+        SearchReplaceResult("ab", "AB", "reason"),
+        SearchReplaceResult("cd", "CD", "reason"),
+    ]
+    assert plan_edits(changes, "abcd").apply("abcd") == ([], "ABCD")
+
+
+def test_failures_are_reported_per_block():
+    changes = [
+        SearchReplaceResult("a", "A", "reason"),
+        SearchReplaceResult("missing", "M", "reason"),
+        SearchReplaceResult("unique", "U", "reason"),
+    ]
+    failures, changed = plan_edits(changes, "a a unique").apply("a a unique")
+
+    assert changed == "a a U"
+    assert [(change.search, type(e)) for change, e in failures] == [
+        ("a", MultipleReplacementsError),
+        ("missing", NoReplacementError),
+    ]
+
+
+def test_no_ops_must_still_match():
+    changes = [
+        SearchReplaceResult("", "", "reason"),
+        SearchReplaceResult("a", "a", "reason"),
+        SearchReplaceResult("missing", "missing", "reason"),
+    ]
+    plan = plan_edits(changes, "a a unique")
+
+    assert plan.edits == []
+    failures, changed = plan.apply("a a unique")
+    assert changed == "a a unique"
+    assert [(change.search, type(e)) for change, e in failures] == [
+        ("missing", NoReplacementError)
+    ]
+
+
+def test_deferred_edit_matches_earlier_replacement():
+    changes = [
+        SearchReplaceResult("old", "new", "reason"),
+        SearchReplaceResult("new text", "newer text", "reason"),
+    ]
+    assert plan_edits(changes, "old text").apply("old text") == ([], "newer text")
+
+
+def test_protected_ranges():
+    source = "aa\n# marker\nbb\n# marker 2\ncc"
+    protected = [(3, 12), (15, 26)]
+    changes = [
+        SearchReplaceResult("aa", "a longer line", "reason"),
+        SearchReplaceResult("bb\n# marker 2", "bb", "reason"),
+        # Only matches once the first change is applied, so it's checked
+        # against where the protected ranges moved to
+        SearchReplaceResult("longer line\n# marker", "line", "reason"),
+        SearchReplaceResult("cc", "CC", "reason"),
+    ]
+
+    failures, changed = plan_edits(changes, source, protected).apply(source)
+
+    assert [(change, type(error)) for change, error in failures] == [
+        (changes[1], ProtectedTextError),
+        (changes[2], ProtectedTextError),
+    ]
+    assert changed == "a longer line\n# marker\nbb\n# marker 2\nCC"
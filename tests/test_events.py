@@ -0,0 +1,89 @@
+import io
+import json
+import os
+
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.events import NdjsonWriter, RichRenderer
+from aiterate_resume.fake_llm import FakeClient, block
+from aiterate_resume.reflection import modify_resume
+from aiterate_resume.search_replace_prompts import initial_messages
+
+
+def test_run_events():
+    output = io.StringIO()
+    console = Console(consumer=NdjsonWriter(output))
+    session = ChatSession(
+        FakeClient(
+            [
+                block("Led a team.", "Led a team of five.")
+                + block("Wrote cod.", "Wrote Python code."),
+                block("Wrote code.", "Wrote Python code."),
+            ]
+        ),
+        console,
+    )
+    resume = "Led a team.\nWrote code."
+    console.print_document(modify_resume(session, resume, initial_messages(resume)))
+    console.close()
+
+    events = [json.loads(line) for line in output.getvalue().splitlines()]
+    edits = [
+        (event["status"], event["search"])
+        for event in events
+        if event["event"] == "edit"
+    ]
+    assert edits == [
+        ("applied", "Led a team."),
+        ("rejected", "Wrote cod."),
+        ("applied", "Wrote code."),
+    ]
+    assert [event["search"] for event in events if event["event"] == "block"] == [
+        "Led a team.",
+        "Wrote cod.",
+        "Wrote code.",
+    ]
+    assert events[0]["event"] == "message"
+    assert events[-1] == {
+        "event": "document",
+        "content": "Led a team of five.\nWrote Python code.",
+    }
+
+
+def test_ndjson_writer_buffers_fd():
+    read_fd, write_fd = os.pipe()
+    try:
+        writer = NdjsonWriter.open_fd(write_fd)
+        writer({"event": "status", "message": "héllo"})
+        writer.close()
+    finally:
+        os.close(write_fd)
+
+    with os.fdopen(read_fd) as file:
+        assert file.read() == '{"event": "status", "message": "héllo"}\n'
+
+
+def test_quiet_console_emits_nothing():
+    output = io.StringIO()
+    console = Console(quiet=True, consumer=NdjsonWriter(output))
+    console.print_status("Working")
+    console.close()
+
+    assert output.getvalue() == ""
+
+
+def test_rich_renderer_prints_text_literally(capsys):
+    renderer = RichRenderer()
+    renderer(
+        {
+            "event": "message",
+            "role": "assistant",
+            "content": "[red]not markup[/red]\nsecond line",
+            "verbose": False,
+        }
+    )
+    renderer({"event": "message", "role": "system", "content": "x", "verbose": True})
+    renderer({"event": "document", "content": "Resume"})
+
+    assert capsys.readouterr().out == (
+        "assistant\n> [red]not markup[/red]\n> second line\nResume\n"
+    )
@@ -0,0 +1,177 @@
+import re
+
+import pytest
+
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.edit_formats import EditFormat, LinesCodec
+from aiterate_resume.fake_llm import FakeClient
+from aiterate_resume.line_format import (
+    LineAnchors,
+    LineFormatError,
+    anchor,
+    lines_format_prompt,
+    parse_line_edits,
+)
+from aiterate_resume.metrics import Metrics
+from aiterate_resume.reflection import apply_changes, modify_resume
+from aiterate_resume.search_replace_prompts import format_prompt, initial_messages
+
+RESUME = "<ul>\n  <li>Led a team.</li>\n  <li>Shipped it.</li>\n</ul>\n"
+
+
+def lines_block(start: str, replace: list[str], end: str | None = None) -> str:
+    header = f"{start}-{end}" if end else start
+    return "\n".join([f"<<<<<<< LINES {header}", *replace, ">>>>>>> END"]) + (
+        "\n\nReason.\n"
+    )
+
+
+def apply(anchors: LineAnchors, text: str, document: str = RESUME) -> str:
+    failures, changed = apply_changes(anchors.parse(text), document)
+    assert failures == []
+    return changed
+
+
+def test_anchors_lines():
+    anchored = LineAnchors(RESUME).anchored().split("\n")
+
+    assert anchored[0] == f"{anchor(1, '<ul>')}|<ul>"
+    assert len(anchored) == 4
+    assert re.fullmatch(r"2:[0-9a-f]{3}\|  <li>Led a team\.</li>", anchored[1])
+
+
+def test_replaces_deletes_and_inserts_lines():
+    anchors = LineAnchors(RESUME)
+    second = anchor(2, "  <li>Led a team.</li>")
+    third = anchor(3, "  <li>Shipped it.</li>")
+
+    assert apply(anchors, lines_block(second, ["  <li>Led a team of five.</li>"])) == (
+        RESUME.replace("a team", "a team of five")
+    )
+    assert apply(anchors, lines_block(second, [], third)) == "<ul>\n</ul>\n"
+    assert apply(anchors, lines_block(anchor(4, "</ul>"), [])) == RESUME.replace(
+        "</ul>\n", ""
+    )
+    assert apply(
+        anchors, lines_block(third, ["  <li>Shipped it.</li>", "  <li>New.</li>"])
+    ) == RESUME.replace("it.</li>\n", "it.</li>\n  <li>New.</li>\n")
+    assert anchors.parse("<<<<<<< LINES NONE\n>>>>>>> END\n")[0].search == ""
+
+
+def test_adds_context_to_repeated_lines():
+    document = "a\nx\nb\nx\n"
+    anchors = LineAnchors(document)
+
+    assert apply(anchors, lines_block(anchor(4, "x"), ["y"]), document) == (
+        "a\nx\nb\ny\n"
+    )
+    assert apply(anchors, lines_block(anchor(2, "x"), []), document) == "a\nb\nx\n"
+
+
+def test_rejects_stale_and_unknown_anchors():
+    anchors = LineAnchors(RESUME)
+    anchors.update(RESUME.replace("Led", "Managed"))
+
+    with pytest.raises(LineFormatError) as e:
+        anchors.parse(
+            lines_block(anchor(2, "  <li>Led a team.</li>"), ["x"])
+            + lines_block("9:abc", ["y"])
+        )
+    assert "stale" in str(e.value)
+    assert "Line 9 doesn't exist" in str(e.value)
+
+
+def test_ids_are_stable_across_updates():
+    anchors = LineAnchors(RESUME)
+    anchors.update(
+        "<ul>\n  <li>New.</li>\n  <li>Led a team.</li>\n  <li>Shipped it.</li>\n</ul>\n"
+    )
+
+    assert (
+        anchors.anchored()
+        .split("\n")[2]
+        .startswith(anchor(2, "  <li>Led a team.</li>") + "|")
+    )
+    assert anchors.anchored().split("\n")[1].startswith("5:")
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "No blocks.",
+        "<<<<<<< SEARCH\na\n=======\nb\n>>>>>>> REPLACE\n",
+        "<<<<<<< LINES 2\nx\n>>>>>>> END\n",
+        "<<<<<<< LINES 2:abc\nx\n",
+        "<<<<<<< LINES 2:abc\n<<<<<<< LINES 3:abc\n>>>>>>> END\n",
+    ],
+)
+def test_rejects_malformed_blocks(text: str):
+    with pytest.raises(LineFormatError):
+        parse_line_edits(text)
+
+
+def test_parses_reasons():
+    edits = parse_line_edits(lines_block("2:abc", ["x"]) + lines_block("3:abc", []))
+
+    assert [edit.reason for edit in edits] == ["Reason.", "Reason."]
+    assert edits[1].replace == []
+
+
+def test_converts_messages():
+    anchors = LinesCodec(RESUME)
+    messages = anchors.convert_messages(initial_messages(RESUME))
+    contents = [str(message.get("content")) for message in messages]
+
+    assert lines_format_prompt in contents
+    assert format_prompt not in contents
+    assert contents[-1].endswith(anchors.anchored())
+    example = next(message for message in messages if message["role"] == "assistant")
+    example_content = str(example.get("content"))
+    assert len(parse_line_edits(example_content)) == 2
+    assert "end-to-end testing system" not in example_content
+
+
+def test_uses_fewer_output_tokens():
+    def model(messages) -> str:
+        if messages[-1]["role"] == "system":
+            # Fix the stale anchor it was sent
+            line = re.search(r"now (\d+:[0-9a-f]{3})\|", messages[-1]["content"])
+            assert line
+            return lines_block(line.group(1), ["  <li>Led a team of five.</li>"])
+        return lines_block("2:fff", ["  <li>Led a team of five.</li>"])
+
+    resume = "<ul>\n" + "  <li>Led a team.</li>\n" + "  <li>Other.</li>\n" * 40
+    session = ChatSession(FakeClient(model), Console(quiet=True))
+    changed = modify_resume(
+        session, resume, initial_messages(resume), edit_format=EditFormat.LINES
+    )
+
+    assert changed == resume.replace("a team", "a team of five")
+    assert session.requests_sent == 2
+    assert session.metrics.reflections["LineFormatError"] == 1
+    reflection = str(session.messages[-2].get("content"))
+    assert "*LINES blocks* could not be used" in reflection
+    assert "SEARCH/REPLACE" not in reflection
+    assert 0 < session.metrics.edit_tokens < session.metrics.search_replace_tokens
+    assert "saved" in str(session.metrics.describe_edit_tokens())
+
+
+def test_only_counts_output_tokens_of_the_chosen_candidate():
+    responses = [
+        lines_block(anchor(2, "  <li>Led a team.</li>"), ["  <li>Led five.</li>"]),
+        lines_block(anchor(3, "  <li>Shipped it.</li>"), ["  <li>Shipped.</li>"]),
+    ]
+    session = ChatSession(FakeClient(responses), Console(quiet=True))
+    modify_resume(
+        session,
+        RESUME,
+        initial_messages(RESUME),
+        candidates=2,
+        edit_format=EditFormat.LINES,
+    )
+
+    # Counted the same as the first candidate on its own
+    alone = Metrics()
+    LinesCodec(RESUME, alone).record_used(responses[0])
+    assert session.metrics.edit_tokens == alone.edit_tokens
+    assert session.metrics.search_replace_tokens == alone.search_replace_tokens
@@ -0,0 +1,123 @@
+import time
+
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.checkpoint import RestoredError
+from aiterate_resume.fake_llm import FakeClient, block
+from aiterate_resume.match_index import MatchIndex
+from aiterate_resume.reflection import (
+    execute_changes,
+    failure_reflection_messages,
+    modify_resume,
+)
+from aiterate_resume.search_replace import SearchReplaceResult
+from aiterate_resume.search_replace_prompts import initial_messages
+
+RESUME = """<h2>Acme</h2>
+<ul>
+  <li>Led a team of five engineers.</li>
+  <li>Shipped the billing system.</li>
+</ul>
+<h2>Initech</h2>
+<ul>
+  <li>Shipped the billing system.</li>
+</ul>"""
+
+
+def test_finds_closest_region():
+    index = MatchIndex(RESUME)
+    [region] = index.closest("<li>Led a team of 5 engineers.</li>\n<li>Shipped the", 1)
+
+    assert (region.start, region.end) == (2, 4)
+    assert index.text(region.start, region.end).startswith("  <li>Led a team of five")
+
+
+def test_nothing_similar():
+    assert MatchIndex(RESUME).closest("zzzzzz") == []
+
+
+def test_finds_occurrences():
+    index = MatchIndex(RESUME)
+
+    assert index.occurrences("<li>Shipped the billing system.</li>") == [(3, 4), (7, 8)]
+    assert index.occurrences("<li>Shipped the billing system.</li>\n</ul>") == [
+        (3, 5),
+        (7, 9),
+    ]
+    assert index.occurrences("<li>Shipped the billing system.</li>\n") == [
+        (3, 4),
+        (7, 8),
+    ]
+    assert index.occurrences("  <li>Shipped the billing system.</li>\n") == [
+        (3, 4),
+        (7, 8),
+    ]
+
+
+def test_distinguishing_context():
+    index = MatchIndex(RESUME)
+    first, second = index.distinguishing_context([(3, 4), (7, 8)])
+
+    assert first == (
+        "  <li>Led a team of five engineers.</li>\n"
+        "  <li>Shipped the billing system.</li>\n"
+        "</ul>"
+    )
+    assert second == "<ul>\n  <li>Shipped the billing system.</li>\n</ul>"
+    assert all(RESUME.count(excerpt) == 1 for excerpt in (first, second))
+    assert index.distinguishing_context([(3, 4)], max_context=0) == [
+        "  <li>Shipped the billing system.</li>"
+    ]
+
+
+def test_reflection_includes_closest_text():
+    change = SearchReplaceResult("<li>Led a team of 5 engineers.</li>", "x", "Reason.")
+    [message] = failure_reflection_messages(
+        [(change, RestoredError("NoReplacementError", "No match."))], RESUME
+    )
+
+    assert str(message.get("content")).endswith(
+        "\n\n  <li>Led a team of five engineers.</li>"
+    )
+
+
+def test_reflection_includes_each_occurrence():
+    reflection_messages, changed = execute_changes(
+        [SearchReplaceResult("<li>Shipped the billing system.</li>", "x", "Reason.")],
+        RESUME,
+    )
+
+    assert changed == RESUME
+    [message] = reflection_messages
+    content = str(message.get("content"))
+    assert "Occurrence 1:\n  <li>Led a team" in content
+    assert content.endswith(
+        "Occurrence 2:\n<ul>\n  <li>Shipped the billing system.</li>\n</ul>"
+    )
+
+
+def test_model_fixes_search_from_closest_text():
+    def model(messages) -> str:
+        if messages[-1]["role"] == "system":
+            # Copy the text it was pointed to
+            closest = messages[-1]["content"].rsplit("\n\n", 1)[1]
+            return block(closest.strip(), "<li>Led a team of six engineers.</li>")
+        return block("<li>Led the team of five engineers</li>", "x")
+
+    session = ChatSession(FakeClient(model), Console(quiet=True))
+    changed = modify_resume(session, RESUME, initial_messages(RESUME))
+
+    assert changed == RESUME.replace("five", "six")
+    assert session.requests_sent == 2
+
+
+def test_long_documents():
+    document = "\n".join(f"  <li>Did thing number {i} well.</li>" for i in range(20000))
+    index = MatchIndex(document)
+
+    start = time.perf_counter()
+    [region] = index.closest("<li>Did thing number 12345 badly.</li>", 1)
+
+    assert time.perf_counter() - start < 2
+    assert index.text(region.start, region.end) == (
+        "  <li>Did thing number 12345 well.</li>"
+    )
@@ -0,0 +1,74 @@
+import io
+import json
+
+import pytest
+
+from aiterate_resume.fake_llm import FakeClient, block
+from aiterate_resume.metrics import Metrics, json_lines_hook
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_records_spans_usage_and_reflections(stream: bool, run_resume):
+    client = FakeClient(
+        [
+            "<<<<<<< SEARCH\nLed a team\n>>>>>>> REPLACE\n",
+            block("Lead a team", "Led a team of five"),
+            block("Led a team", "Led a team of five"),
+        ]
+    )
+    metrics = Metrics()
+    changed, _ = run_resume(client, "Led a team.", metrics, stream=stream)
+    assert changed == "Led a team of five."
+
+    names = [span.name for span in metrics.spans]
+    assert names.count("request") == 3
+    assert names.count("parse") == 3
+    assert names.count("apply") >= 2
+    assert metrics.prompt_tokens > 0
+    assert metrics.completion_tokens > 0
+    assert metrics.reflections == {"UnexpectedFenceError": 1, "NoReplacementError": 1}
+
+    table = metrics.summary_table()
+    assert "request" in table
+    assert "1 UnexpectedFenceError" in table
+
+
+def test_hooks_receive_events(run_resume):
+    events = []
+    output = io.StringIO()
+    metrics = Metrics()
+    metrics.add_hook(events.append)
+    metrics.add_hook(json_lines_hook(output))
+
+    run_resume(
+        FakeClient([block("Led a team", "Led a team of five")]), "Led a team.", metrics
+    )
+
+    assert {event["event"] for event in events} == {"span", "usage", "outcome"}
+    lines = output.getvalue().splitlines()
+    assert [json.loads(line) for line in lines] == events
+
+
+def test_close_closes_hook_files(tmp_path, run_resume):
+    metrics = Metrics()
+    file = (tmp_path / "metrics.jsonl").open("a")
+    metrics.add_hook(json_lines_hook(file), file.close)
+
+    run_resume(
+        FakeClient([block("Led a team", "Led a team of five")]), "Led a team.", metrics
+    )
+    metrics.close()
+
+    assert file.closed
+    lines = (tmp_path / "metrics.jsonl").read_text().splitlines()
+    assert {json.loads(line)["event"] for line in lines} == {"span", "usage", "outcome"}
+
+
+def test_span_attributes():
+    metrics = Metrics()
+    with metrics.span("apply", changes=2) as span:
+        span["failures"] = 1
+
+    assert metrics.spans[0].name == "apply"
+    assert metrics.spans[0].attributes == {"changes": 2, "failures": 1}
+    assert metrics.spans[0].duration >= 0
@@ -0,0 +1,135 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.fake_llm import FakeClient, block
+from aiterate_resume.pipeline import Pipeline
+from aiterate_resume.project import Project, ProjectError
+
+
+def write_latex_project(root: Path) -> Path:
+    (root / "sections").mkdir()
+    (root / "main.tex").write_text(
+        "\\documentclass{article}\n"
+        "\\begin{document}\n"
+        "\\input{sections/experience}\n"
+        "% \\input{sections/unused}\n"
+        "\\include{shared}\n"
+        "\\end{document}\n"
+    )
+    (root / "sections" / "experience.tex").write_text(
+        "\\section{Experience}\nLed a team.\n\\input{shared}"
+    )
+    (root / "shared.tex").write_text("Contact: me@example.com\n")
+    return root / "main.tex"
+
+
+def test_resolves_include_graph(tmp_path: Path):
+    project = Project.load(write_latex_project(tmp_path))
+
+    # Commented out inputs are skipped, and shared files are only read once
+    assert [file.name for file in project.files] == [
+        "main.tex",
+        "sections/experience.tex",
+        "shared.tex",
+    ]
+
+
+def test_combined_text_splits_back(tmp_path: Path):
+    project = Project.load(write_latex_project(tmp_path))
+    combined = project.combined()
+
+    assert "%%% FILE: sections/experience.tex %%%\n\\section" in combined
+    assert project.split(combined) == {file.path: file.text for file in project.files}
+
+
+def test_html_includes(tmp_path: Path):
+    (tmp_path / "parts").mkdir()
+    (tmp_path / "index.html").write_text(
+        '<body>\n<!--#include file="parts/jobs.html" -->\n</body>\n'
+    )
+    (tmp_path / "parts" / "jobs.html").write_text("<li>Led a team.</li>\n")
+
+    project = Project.load(tmp_path / "index.html")
+    assert [file.name for file in project.files] == ["index.html", "parts/jobs.html"]
+    assert project.marker("index.html") == "<!-- FILE: index.html -->"
+
+
+def test_missing_include(tmp_path: Path):
+    (tmp_path / "main.tex").write_text("\\input{missing}\n")
+
+    with pytest.raises(ProjectError):
+        Project.load(tmp_path / "main.tex")
+
+
+@pytest.mark.parametrize("target", ["../outside", "/etc/passwd"])
+def test_rejects_includes_outside_the_project(tmp_path: Path, target: str):
+    (tmp_path / "project").mkdir()
+    (tmp_path / "outside.tex").write_text("Not part of the project.\n")
+    (tmp_path / "project" / "main.tex").write_text(f"\\input{{{target}}}\n")
+
+    with pytest.raises(ProjectError, match="outside"):
+        Project.load(tmp_path / "project" / "main.tex")
+
+
+def test_edits_and_writes_back_changed_files(tmp_path: Path):
+    project = Project.load(write_latex_project(tmp_path))
+    # Old enough that rewriting a file would change its mtime
+    for file in project.files:
+        os.utime(file.path, ns=(0, 0))
+    project = Project.load(tmp_path / "main.tex")
+
+    client = FakeClient(
+        [
+            # Spans two files, so it's rejected
+            block(
+                "\\input{shared}\n%%% FILE: shared.tex %%%\nContact",
+                "\\input{shared}\nEmail",
+            ),
+            block("Led a team.", "Led a team of five."),
+        ]
+    )
+    pipeline = Pipeline(ChatSession(client, Console(quiet=True)))
+    changed = pipeline.run(project.combined(), project=project)
+
+    assert (
+        "FILE: sections/experience.tex" in client.requests[0]["messages"][-1]["content"]
+    )
+    assert len(client.requests) == 2
+    assert project.write_back(changed) == [tmp_path / "sections" / "experience.tex"]
+    assert (tmp_path / "sections" / "experience.tex").read_text() == (
+        "\\section{Experience}\nLed a team of five.\n\\input{shared}"
+    )
+    assert (tmp_path / "shared.tex").stat().st_mtime_ns == 0
+    assert (tmp_path / "main.tex").stat().st_mtime_ns == 0
+
+
+def test_write_back_refuses_files_changed_on_disk(tmp_path: Path):
+    project = Project.load(write_latex_project(tmp_path))
+    changed = project.combined().replace("Led a team.", "Led a team of five.")
+    path = tmp_path / "sections" / "experience.tex"
+    path.write_text("Edited elsewhere.")
+    os.utime(path, ns=(1, 1))
+
+    with pytest.raises(ProjectError):
+        project.write_back(changed)
+    assert path.read_text() == "Edited elsewhere."
+
+
+def test_write_back_changes_nothing_if_a_write_fails(tmp_path: Path, monkeypatch):
+    project = Project.load(write_latex_project(tmp_path))
+    changed = project.combined().replace("Led", "Managed").replace("me@", "you@")
+    originals = {file.path: file.text for file in project.files}
+
+    def fail_on_shared(path, temp_path):
+        if Path(path).name == "shared.tex":
+            raise OSError("No space left on device")
+
+    monkeypatch.setattr("shutil.copymode", fail_on_shared)
+    with pytest.raises(OSError):
+        project.write_back(changed)
+
+    assert {path: path.read_text() for path in originals} == originals
+    assert not list(tmp_path.glob("**/*.tmp"))
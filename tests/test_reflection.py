@@ -0,0 +1,134 @@
+import pytest
+from openai.types.chat import ChatCompletion
+
+from aiterate_resume.compaction import Compactor
+from aiterate_resume.fake_llm import FakeClient, block
+from aiterate_resume.reflection import CandidateChooser
+from aiterate_resume.search_replace import SearchReplaceResult
+
+
+def make_completion(*contents: str) -> ChatCompletion:
+    return ChatCompletion.model_validate(
+        {
+            "id": "test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "test",
+            "choices": [
+                {
+                    "index": i,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+                for i, content in enumerate(contents)
+            ],
+        }
+    )
+
+
+def test_chooser_skips_unparsable_and_failing_candidates():
+    response = make_completion(
+        "not a block",
+        block("missing", "new"),
+        block("old", "new"),
+        block("old", "newer"),
+    )
+    chooser = CandidateChooser(
+        lambda changes: sum(change.search != "old" for change in changes)
+    )
+
+    assert chooser(response) == 2
+    assert chooser.results == [SearchReplaceResult("old", "new", "Reason.")]
+
+
+def test_chooser_falls_back_to_fewest_failures():
+    response = make_completion(
+        block("missing", "new") + block("also missing", "new"),
+        block("missing", "new"),
+    )
+    chooser = CandidateChooser(lambda changes: len(changes))
+
+    assert chooser(response) == 1
+    assert chooser.results == [SearchReplaceResult("missing", "new", "Reason.")]
+
+
+def test_chooser_uses_first_when_nothing_parses():
+    chooser = CandidateChooser(None)
+
+    assert chooser(make_completion("bad", "also bad")) == 0
+    assert chooser.results is None
+
+
+def test_applies_changes(run_resume):
+    client = FakeClient([block("Led a team", "Led a team of five")])
+    changed, session = run_resume(client, "Led a team.")
+
+    assert changed == "Led a team of five."
+    assert session.requests_sent == 1
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_reflects_on_malformed_fences(stream: bool, run_resume):
+    client = FakeClient(
+        [
+            "<<<<<<< SEARCH\nLed a team\n>>>>>>> REPLACE\n",
+            block("Led a team", "Led a team of five"),
+        ]
+    )
+    changed, session = run_resume(client, "Led a team.", stream=stream)
+
+    assert changed == "Led a team of five."
+    assert session.requests_sent == 2
+    assert "not in the correct" in client.requests[1]["messages"][-1]["content"]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_reflects_on_failed_changes(stream: bool, run_resume):
+    client = FakeClient(
+        [
+            block("Lead a team", "Led a team of five"),
+            block("Led a team", "Led a team of five"),
+        ]
+    )
+    changed, session = run_resume(client, "Led a team.", stream=stream)
+
+    assert changed == "Led a team of five."
+    assert session.requests_sent == 2
+    assert "Could not find" in client.requests[1]["messages"][-1]["content"]
+
+
+def test_compacted_repair_is_isolated(run_resume):
+    client = FakeClient(
+        [
+            block("Lead a team", "Led a team of five"),
+            block("Led a team", "Led a team of five"),
+        ]
+    )
+    compactor = Compactor()
+    changed, session = run_resume(client, "Led a team.", compactor=compactor)
+
+    assert changed == "Led a team of five."
+    assert len(client.requests[1]["messages"]) == 2
+    assert compactor.rounds == 1
+
+
+def test_candidates_avoid_reflection(run_resume):
+    client = FakeClient(
+        [
+            block("Lead a team", "Led a team of five"),
+            block("Led a team", "Led a team of five"),
+        ]
+    )
+    changed, session = run_resume(client, "Led a team.", candidates=2)
+
+    assert changed == "Led a team of five."
+    assert session.requests_sent == 1
+    assert session.messages[-1].get("content") == block(
+        "Led a team", "Led a team of five"
+    )
+
+
+def test_out_of_attempts(run_resume):
+    client = FakeClient(["not a block"] * 4)
+    with pytest.raises(RuntimeError):
+        run_resume(client, "Led a team.")
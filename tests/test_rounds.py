@@ -0,0 +1,100 @@
+import io
+import json
+
+import pytest
+
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.edit_formats import EditFormat
+from aiterate_resume.events import NdjsonWriter
+from aiterate_resume.fake_llm import FakeClient, block
+from aiterate_resume.line_format import anchor
+from aiterate_resume.pipeline import Pipeline, PipelineOptions
+from aiterate_resume.rounds import diff_round
+
+
+def test_diff_round():
+    report = diff_round(2, "a\nb\nc", "a\nB\nc\nd")
+
+    assert report.number == 2
+    assert report.changed_lines == 3
+    assert report.diff.splitlines()[:2] == ["--- round-1", "+++ round-2"]
+    assert "-b" in report.diff.splitlines()
+    assert diff_round(1, "a", "a").changed_lines == 0
+
+
+def test_stops_once_a_round_changes_nothing(make_session):
+    client = FakeClient(
+        [
+            block("Led a team", "Led a team of five"),
+            block("team of five", "team of five engineers"),
+            block("", ""),
+        ]
+    )
+    pipeline = Pipeline(make_session(client), PipelineOptions(rounds=5))
+    changed = pipeline.run("Led a team.")
+
+    assert changed == "Led a team of five engineers."
+    assert [report.changed_lines for report in pipeline.rounds] == [2, 2, 0]
+    assert len(client.requests) == 3
+
+    # Each round continues the previous round's conversation
+    first, second, _ = (request["messages"] for request in client.requests)
+    assert second[: len(first)] == first
+    assert "Led a team of five." in second[-1]["content"]
+
+
+def test_lines_keep_their_ids_between_rounds(make_session):
+    client = FakeClient(
+        [
+            f"<<<<<<< LINES {anchor(1, '<ul>')}\n<ul>\n  <li>New.</li>\n>>>>>>> END\n",
+            f"<<<<<<< LINES {anchor(2, '  <li>Led a team.</li>')}\n"
+            "  <li>Led a team of five.</li>\n>>>>>>> END\n",
+        ]
+    )
+    pipeline = Pipeline(
+        make_session(client), PipelineOptions(rounds=2, edit_format=EditFormat.LINES)
+    )
+    changed = pipeline.run("<ul>\n  <li>Led a team.</li>\n</ul>\n")
+
+    assert changed == "<ul>\n  <li>New.</li>\n  <li>Led a team of five.</li>\n</ul>\n"
+    assert len(client.requests) == 2
+
+
+def test_stops_below_min_changed_lines(make_session):
+    client = FakeClient(
+        [
+            block("Led a team", "Led a team of five"),
+            block("team of five", "team of five engineers"),
+        ]
+    )
+    pipeline = Pipeline(
+        make_session(client), PipelineOptions(rounds=3, min_changed_lines=3)
+    )
+    changed = pipeline.run("Led a team.")
+
+    assert changed == "Led a team of five."
+    assert len(pipeline.rounds) == 1
+
+
+def test_emits_round_events():
+    output = io.StringIO()
+    client = FakeClient([block("Led a team", "Led a team of five"), block("", "")])
+    pipeline = Pipeline(
+        ChatSession(client, Console(consumer=NdjsonWriter(output))),
+        PipelineOptions(rounds=2),
+    )
+    pipeline.run("Led a team.")
+
+    events = [json.loads(line) for line in output.getvalue().splitlines()]
+    rounds = [event for event in events if event["event"] == "round"]
+    assert [(event["number"], event["changed_lines"]) for event in rounds] == [
+        (1, 2),
+        (2, 0),
+    ]
+    assert "+Led a team of five." in rounds[0]["diff"]
+
+
+def test_multi_round_runs_cannot_be_checkpointed(tmp_path, make_session):
+    pipeline = Pipeline(make_session(FakeClient([])), PipelineOptions(rounds=2))
+    with pytest.raises(ValueError):
+        pipeline.run("Led a team.", tmp_path / "checkpoint.json")
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import pytest
+
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.fake_llm import FakeClient, block
+from aiterate_resume.metrics import Metrics
+from aiterate_resume.reflection import modify_resume
+from aiterate_resume.routing import ModelConfigError, ModelRoutes, Phase
+from aiterate_resume.search_replace_prompts import initial_messages
+
+
+def test_load_config(tmp_path: Path):
+    path = tmp_path / "models.toml"
+    path.write_text('[models]\ninitial = "big"\napply_repair = "small"\n')
+
+    routes = ModelRoutes.load(path)
+    assert routes == ModelRoutes(initial="big", apply_repair="small")
+    assert routes.model_for(Phase.APPLY_REPAIR) == "small"
+    assert routes.model_for(Phase.APPLY_REPAIR, escalated=True) == "gpt-4o"
+    assert routes.with_overrides(initial=None, escalation="bigger") == ModelRoutes(
+        initial="big", apply_repair="small", escalation="bigger"
+    )
+
+
+@pytest.mark.parametrize(
+    "contents", ['[models]\ninitial_model = "big"\n', "[models\n", "models = 1\n"]
+)
+def test_load_rejects_bad_config(tmp_path: Path, contents: str):
+    path = tmp_path / "models.toml"
+    path.write_text(contents)
+
+    with pytest.raises(ModelConfigError):
+        ModelRoutes.load(path)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_routes_repairs_and_escalates(stream: bool):
+    client = FakeClient(
+        [
+            "<<<<<<< SEARCH\nLed a team\n>>>>>>> REPLACE\n",
+            block("Lead a team", "Led a team of five"),
+            block("Lead a team", "Led a team of five"),
+            block("Led a team", "Led a team of five"),
+        ]
+    )
+    metrics = Metrics()
+    session = ChatSession(client, Console(quiet=True), metrics=metrics)
+    resume = "Led a team."
+    changed = modify_resume(session, resume, initial_messages(resume), stream=stream)
+
+    assert changed == "Led a team of five."
+    # The cheap apply repair model is only tried once before escalating
+    assert [request["model"] for request in client.requests] == [
+        "gpt-4o",
+        "gpt-4o-mini",
+        "gpt-4o-mini",
+        "gpt-4o",
+    ]
+    assert metrics.outcomes == {
+        ("initial", "gpt-4o", False): 1,
+        ("format_repair", "gpt-4o-mini", False): 1,
+        ("apply_repair", "gpt-4o-mini", False): 1,
+        ("apply_repair", "gpt-4o", True): 1,
+    }
+
+    table = metrics.summary_table()
+    assert "apply_repair" in table
+    assert "100%" in table
@@ -0,0 +1,190 @@
+import asyncio
+import threading
+
+import openai
+import pytest
+
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.deadline import BudgetExhausted, Deadline
+from aiterate_resume.fake_llm import (
+    FakeHTTPError,
+    FakeLLMServer,
+    FakeRawResponse,
+    FakeStream,
+    block,
+)
+from aiterate_resume.metrics import Metrics
+from aiterate_resume.reflection import modify_resume
+from aiterate_resume.scheduler import (
+    AsyncRequestScheduler,
+    RequestScheduler,
+    TokenBucket,
+    parse_duration,
+)
+from aiterate_resume.search_replace_prompts import initial_messages
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def clock(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def session_for(server: FakeLLMServer, scheduler: RequestScheduler) -> ChatSession:
+    client = openai.OpenAI(base_url=server.url, api_key="test", max_retries=0)
+    return ChatSession(client, Console(quiet=True), scheduler=scheduler)
+
+
+def test_parse_duration():
+    assert parse_duration("1s") == 1
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("20ms") == 0.02
+    assert parse_duration("") is None
+
+
+def test_token_bucket():
+    fake_time = FakeTime()
+    bucket = TokenBucket(10, period=1, clock=fake_time.clock)
+    assert bucket.wait_time(10) == 0
+
+    bucket.sync(limit=10, remaining=0, reset_seconds=2)
+    assert bucket.wait_time(1) == pytest.approx(0.2)
+    fake_time.now += 0.2
+    assert bucket.wait_time(1) == 0
+
+
+def test_retries_transient_errors():
+    replies = [
+        FakeHTTPError(429, {"retry-after-ms": "5"}),
+        FakeHTTPError(503),
+        "Hello",
+    ]
+    scheduler = RequestScheduler(base_delay=0.001)
+    with FakeLLMServer(replies) as server:
+        session = session_for(server, scheduler)
+        response = session.send_messages([{"role": "user", "content": "Hi"}])
+
+    assert response.choices[0].message.content == "Hello"
+    assert scheduler.retries == 2
+    assert session.retries == 2
+    assert session.requests_sent == 1
+    assert session.metrics.retries == {"RateLimitError": 1, "InternalServerError": 1}
+
+
+def test_does_not_retry_client_errors():
+    scheduler = RequestScheduler(base_delay=0.001)
+    with FakeLLMServer([FakeHTTPError(400)]) as server:
+        session = session_for(server, scheduler)
+        with pytest.raises(openai.BadRequestError):
+            session.send_messages([{"role": "user", "content": "Hi"}])
+
+        assert len(server.requests) == 1
+    assert scheduler.retries == 0
+
+
+def test_retries_do_not_use_reflection_attempts():
+    # More rate limited replies than modify_resume has attempts
+    replies = [FakeHTTPError(429)] * 5 + [block("Led a team", "Led a team of five")]
+    scheduler = RequestScheduler(base_delay=0.001, max_retries=5)
+    with FakeLLMServer(replies) as server:
+        session = session_for(server, scheduler)
+        resume = "Led a team."
+        changed = modify_resume(session, resume, initial_messages(resume))
+
+    assert changed == "Led a team of five."
+    assert scheduler.retries == 5
+
+
+def test_waits_for_rate_limit_reset():
+    fake_time = FakeTime()
+    headers = {
+        "x-ratelimit-limit-requests": "10",
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-reset-requests": "200ms",
+    }
+    scheduler = RequestScheduler(clock=fake_time.clock, sleep=fake_time.sleep)
+    with FakeLLMServer(["One", "Two"], headers) as server:
+        session = session_for(server, scheduler)
+        session.send_messages([{"role": "user", "content": "Hi"}])
+        assert fake_time.sleeps == []
+
+        session.send_messages([{"role": "user", "content": "Again"}])
+    # The 10 requests used up reset over 200ms
+    assert fake_time.sleeps == [pytest.approx(0.02)]
+
+
+def test_rate_limit_waits_respect_the_deadline():
+    fake_time = FakeTime()
+    scheduler = RequestScheduler(
+        requests_per_minute=1, clock=fake_time.clock, sleep=fake_time.sleep
+    )
+    scheduler.run(lambda: FakeRawResponse("One", {}))
+
+    with pytest.raises(BudgetExhausted):
+        scheduler.run(
+            lambda: FakeRawResponse("Two", {}), deadline=Deadline(30, fake_time.clock)
+        )
+    assert fake_time.sleeps == []
+
+    # Giving up passes the turn on
+    assert scheduler.run(lambda: FakeRawResponse("Three", {})) == "Three"
+    assert fake_time.sleeps == [pytest.approx(60)]
+
+
+def test_async_rate_limit_waits_respect_the_deadline():
+    fake_time = FakeTime()
+
+    async def sleep(seconds: float) -> None:
+        fake_time.sleep(seconds)
+
+    scheduler = AsyncRequestScheduler(
+        requests_per_minute=1, clock=fake_time.clock, sleep=sleep
+    )
+
+    async def send() -> FakeRawResponse:
+        return FakeRawResponse("Sent", {})
+
+    async def run_all() -> None:
+        await scheduler.run(send)
+        with pytest.raises(BudgetExhausted):
+            await scheduler.run(send, deadline=Deadline(30, fake_time.clock))
+        assert await scheduler.run(send) == "Sent"
+
+    asyncio.run(run_all())
+    assert fake_time.sleeps == [pytest.approx(60)]
+
+
+def test_streams_through_scheduler():
+    scheduler = RequestScheduler(base_delay=0.001)
+    metrics = Metrics()
+    with FakeLLMServer([FakeHTTPError(500), "Hello there"]) as server:
+        session = session_for(server, scheduler)
+        session.metrics = metrics
+        content = "".join(session.stream_messages([{"role": "user", "content": "Hi"}]))
+
+    assert content == "Hello there"
+    assert metrics.retries == {"InternalServerError": 1}
+    assert metrics.completion_tokens > 0
+
+
+def test_streams_hold_their_slot_until_closed():
+    scheduler = RequestScheduler(max_in_flight=1)
+    stream = scheduler.run(lambda: FakeRawResponse(FakeStream([], 0), {}), stream=True)
+
+    sent = threading.Event()
+    thread = threading.Thread(
+        target=lambda: scheduler.run(lambda: sent.set() or FakeRawResponse("", {}))
+    )
+    thread.start()
+    assert not sent.wait(0.1)
+
+    stream.close()
+    thread.join(1)
+    assert sent.is_set()
@@ -1,7 +1,9 @@
 import pytest
 from aiterate_resume.search_replace import (
+    MatchTier,
     SearchReplaceResult,
     execute_search_replace,
+    find_match,
     MultipleReplacementsError,
     NoReplacementError,
 )
@@ -42,3 +44,44 @@ def test_empty_search():
     with pytest.raises(MultipleReplacementsError) as exc_info:
         execute_search_replace(result, source)
     assert exc_info.value.count == len(source) + 1
+
+
+def test_exact_match_tier():
+    result = SearchReplaceResult("old", "new", "Test exact")
+    match = find_match(result, "This is an old text.")
+    assert (match.start, match.end, match.tier) == (11, 14, MatchTier.EXACT)
+
+
+def test_normalized_match_rebases_indentation():
+    result = SearchReplaceResult(
+        "<li>\n  Built a map editor.\n</li>",
+        "<li>\n  Built a collaborative map editor.\n</li>",
+        "Test indentation",
+    )
+    source = "<ul>\n    <li>\r\n      Built a map editor.  \n    </li>\n</ul>"
+    expected = (
+        "<ul>\n    <li>\n      Built a collaborative map editor.\n    </li>\n</ul>"
+    )
+
+    assert find_match(result, source).tier == MatchTier.NORMALIZED
+    assert execute_search_replace(result, source) == expected
+
+
+def test_whitespace_match_maps_back_to_source():
+    result = SearchReplaceResult(
+        "Led a team of five engineers", "Led five engineers", "Test reflow"
+    )
+    source = "Summary:\nLed a team\n  of five   engineers to ship.\n"
+
+    assert find_match(result, source).tier == MatchTier.WHITESPACE
+    assert (
+        execute_search_replace(result, source)
+        == "Summary:\nLed five engineers to ship.\n"
+    )
+
+
+def test_lenient_match_must_be_unique():
+    result = SearchReplaceResult("a  b", "c", "Test lenient uniqueness")
+    with pytest.raises(MultipleReplacementsError) as exc_info:
+        execute_search_replace(result, "a b and a\nb")
+    assert exc_info.value.count == 2
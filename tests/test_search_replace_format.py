@@ -1,7 +1,11 @@
+import random
+
 import pytest
 from aiterate_resume.search_replace_format import (
+    IncrementalParser,
     UnexpectedEndOfInput,
     parse_search_replace_text,
+    scan_search_replace_text,
     SearchReplaceResult,
     UnexpectedFenceError,
 )
@@ -125,3 +129,105 @@ This is invalid."""
         parse_search_replace_text(input_text)
 
     assert excinfo.value.expected_fence == "<<<<<<< SEARCH"
+
+
+def test_incremental_matches_full_parse():
+    input_text = """<<<<<<< SEARCH
+old text 1
+=======
+new text 1
+>>>>>>> REPLACE
+Reason 1
+
+<<<<<<< SEARCH
+old text 2
+=======
+new text 2
+>>>>>>> REPLACE
+Reason 2"""
+
+    parser = IncrementalParser()
+    results = []
+    for i in range(0, len(input_text), 3):
+        results.extend(parser.feed(input_text[i : i + 3]))
+    results.extend(parser.close())
+
+    assert results == parse_search_replace_text(input_text)
+
+
+def test_incremental_yields_when_reason_closes():
+    parser = IncrementalParser()
+
+    assert parser.feed("<<<<<<< SEARCH\nold\n=======\nnew\n>>>>>>> REPLACE\n") == []
+    assert parser.feed("Reason 1\n<<<<<<< SEA") == []
+    assert parser.feed("RCH\n") == [
+        SearchReplaceResult(search="old", replace="new", reason="Reason 1")
+    ]
+
+
+def test_incremental_unexpected_fence():
+    parser = IncrementalParser()
+    parser.feed("<<<<<<< SEARCH\nold text\n")
+
+    with pytest.raises(UnexpectedFenceError) as excinfo:
+        parser.feed(">>>>>>> REPLACE\n")
+
+    assert excinfo.value.expected_fence == "======="
+
+
+def test_scan_refers_to_original_text():
+    input_text = """Preamble
+<<<<<<< SEARCH
+  old text
+=======
+new text
+>>>>>>> REPLACE
+Reason.
+"""
+
+    [span] = scan_search_replace_text(input_text)
+    assert span.text is input_text
+    assert input_text[span.search_start : span.search_end] == "  old text"
+    assert span.search == "old text"
+    assert span.to_result() == SearchReplaceResult("old text", "new text", "Reason.")
+
+
+def incremental_parse(text: str):
+    parser = IncrementalParser()
+    try:
+        return parser.feed(text) + parser.close()
+    except (UnexpectedFenceError, UnexpectedEndOfInput) as e:
+        return type(e), str(e)
+
+
+def scan_parse(text: str):
+    try:
+        return parse_search_replace_text(text)
+    except (UnexpectedFenceError, UnexpectedEndOfInput) as e:
+        return type(e), str(e)
+
+
+def test_scan_matches_line_parser():
+    # Fences with trailing whitespace, near-fences, and empty lines are where
+    # the two parsers are most likely to disagree
+    pieces = [
+        "<<<<<<< SEARCH",
+        "<<<<<<< SEARCH\t",
+        "=======",
+        "======= ",
+        "=======\r",
+        "========",
+        "  =======",
+        ">>>>>>> REPLACE",
+        ">>>>>>> REPLACED",
+        "text",
+        "  more text ",
+        "",
+    ]
+    rng = random.Random(0)
+    for _ in range(5000):
+        text = "\n".join(rng.choice(pieces) for _ in range(rng.randint(0, 12)))
+        if rng.random() < 0.3:
+            text += "\n"
+
+        assert scan_parse(text) == incremental_parse(text), text
@@ -0,0 +1,76 @@
+import re
+from pathlib import Path
+
+import pytest
+
+from aiterate_resume.chat import ChatSession
+from aiterate_resume.fake_llm import FakeClient, block
+from aiterate_resume.search_replace import SearchReplaceResult
+from aiterate_resume.section_store import SectionStore, replay_rounds
+from aiterate_resume.sharding import modify_resume_sharded
+
+
+def test_store_round_trip(tmp_path: Path):
+    store = SectionStore(tmp_path)
+    rounds = [[SearchReplaceResult("a", "b", "Reason.")], []]
+
+    assert store.get("section") is None
+    store.put("section", rounds)
+    assert store.get("section") == rounds
+    assert store.get("other section") is None
+    assert (store.hits, store.misses) == (1, 2)
+
+
+def test_failed_put_leaves_no_temporary_file(tmp_path: Path):
+    store = SectionStore(tmp_path)
+    with pytest.raises(TypeError):
+        store.put("section", [[SearchReplaceResult("a", "b", object())]])  # type: ignore[arg-type]
+
+    assert list(tmp_path.glob("*/*")) == []
+
+
+def test_replay_rounds():
+    rounds = [
+        [SearchReplaceResult("one", "1", ""), SearchReplaceResult("two", "2", "")],
+        # Matches text added by the first round
+        [SearchReplaceResult("1 2", "1, 2", "")],
+    ]
+
+    assert replay_rounds(rounds, "one two") == "1, 2"
+    assert replay_rounds(rounds, "one three") is None
+
+
+def improve_section(messages: list) -> str:
+    """Rewords every line starting with "Did" in the section asked about."""
+    section = messages[-1]["content"].split("\n\n", 1)[1]
+    lines = re.findall(r"^Did .*$", section, re.MULTILINE)
+    if not lines:
+        return block("", "")
+    return "".join(block(line, line.replace("Did", "Completed")) for line in lines)
+
+
+def run_sharded(session: ChatSession, resume: str, store: SectionStore) -> str:
+    return modify_resume_sharded(
+        session, resume, jobs=2, max_shards=None, min_shard_chars=0, store=store
+    )
+
+
+def test_only_changed_sections_are_sent(tmp_path: Path, make_session):
+    store = SectionStore(tmp_path)
+    resume = "Did A.\n\nDid B.\n\nDid C.\n"
+
+    client = FakeClient(improve_section)
+    assert (
+        run_sharded(make_session(client), resume, store)
+        == "Completed A.\n\nCompleted B.\n\nCompleted C.\n"
+    )
+    assert len(client.requests) == 3
+
+    client = FakeClient(improve_section)
+    changed_resume = "Did A.\n\nDid B and more.\n\nDid C.\n"
+    assert (
+        run_sharded(make_session(client), changed_resume, store)
+        == "Completed A.\n\nCompleted B and more.\n\nCompleted C.\n"
+    )
+    [request] = client.requests
+    assert "Did B and more." in request["messages"][-1]["content"]
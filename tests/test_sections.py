@@ -0,0 +1,70 @@
+from aiterate_resume.sections import Markup, detect_markup, split_sections
+
+
+def test_detect_markup():
+    assert detect_markup("\\section{Experience}") == Markup.LATEX
+    assert detect_markup("<h2>Experience</h2>") == Markup.HTML
+    assert detect_markup("Experience\n- Built things") == Markup.PLAIN
+
+
+def test_latex_sections():
+    text = (
+        "\\documentclass{article}\n"
+        "\\begin{document}\n"
+        "\\name{Jane}\n"
+        "\\section{Experience}\n"
+        "Built things\n"
+        "\\section*{Education}\n"
+        "Studied things\n"
+        "\\end{document}\n"
+    )
+    sections = split_sections(text)
+
+    assert [(section.text, section.editable) for section in sections] == [
+        ("\\documentclass{article}\n\\begin{document}\n", False),
+        ("\\name{Jane}\n", True),
+        ("\\section{Experience}\nBuilt things\n", True),
+        ("\\section*{Education}\nStudied things\n", True),
+        ("\\end{document}\n", False),
+    ]
+    assert "".join(section.text for section in sections) == text
+    assert all(text[s.start : s.end] == s.text for s in sections)
+
+
+def test_html_sections():
+    text = "<h1>Jane</h1>\n<h2>Experience</h2>\n<ul>\n  <li>Built things</li>\n</ul>\n"
+    assert [section.text for section in split_sections(text)] == [
+        "<h1>Jane</h1>\n",
+        "<h2>Experience</h2>\n<ul>\n  <li>Built things</li>\n</ul>\n",
+    ]
+
+
+def test_html_falls_back_to_list_items():
+    text = "<ul>\n  <li>One</li>\n  <li>Two</li>\n</ul>\n"
+    assert [section.text for section in split_sections(text)] == [
+        "<ul>\n",
+        "  <li>One</li>\n",
+        "  <li>Two</li>\n</ul>\n",
+    ]
+
+
+def test_plain_sections():
+    text = "Jane\n\nExperience\nBuilt things\n\n\nEducation\n"
+    assert [section.text for section in split_sections(text)] == [
+        "Jane\n\n",
+        "Experience\nBuilt things\n\n\n",
+        "Education\n",
+    ]
+
+
+def test_merging_sections():
+    text = "a\n\nbbbbbbbbbb\n\ncc\n\ndddddddddd\n"
+
+    assert [section.text for section in split_sections(text, min_chars=5)] == [
+        "a\n\nbbbbbbbbbb\n\n",
+        "cc\n\ndddddddddd\n",
+    ]
+    assert [section.text for section in split_sections(text, max_sections=2)] == [
+        "a\n\nbbbbbbbbbb\n\n",
+        "cc\n\ndddddddddd\n",
+    ]
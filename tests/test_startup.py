@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+STARTUP_BUDGET_SECONDS = 0.5
+"How long `aiterate-resume --help` may take, including starting Python."
+
+HEAVY_MODULES = ["openai", "pydantic", "httpx", "rich"]
+
+
+def run_cli(*args: str, env: dict[str, str] | None = None):
+    code = f"""
+import sys
+sys.argv = ["aiterate-resume", *{list(args)!r}]
+from aiterate_resume.cli import main
+try:
+    main()
+finally:
+    loaded = [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+    print("LOADED:", ",".join(loaded), file=sys.stderr)
+"""
+    return subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, env=env
+    )
+
+
+def loaded_modules(stderr: str) -> list[str]:
+    line = [line for line in stderr.splitlines() if line.startswith("LOADED:")][-1]
+    return [name for name in line.removeprefix("LOADED:").strip().split(",") if name]
+
+
+def test_help_loads_no_heavy_modules():
+    result = run_cli("--help")
+    assert result.returncode == 0
+    assert loaded_modules(result.stderr) == []
+
+
+def test_missing_api_key_loads_no_openai(tmp_path):
+    resume = tmp_path / "resume.txt"
+    resume.write_text("Led a team.")
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+
+    result = run_cli(str(resume), env=env)
+    assert result.returncode == 1
+    assert "OPENAI_API_KEY" in result.stdout
+    # rich is needed to print the error, but nothing else is
+    assert loaded_modules(result.stderr) == ["rich"]
+
+
+@pytest.mark.parametrize(
+    "args", [["--help"], ["batch", "--help"], ["serve", "--help"], ["client", "--help"]]
+)
+def test_startup_budget(args: list[str]):
+    # The fastest of a few runs, so a busy machine doesn't fail the test
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        result = run_cli(*args)
+        best = min(best, time.perf_counter() - start)
+        assert result.returncode == 0
+
+    assert best < STARTUP_BUDGET_SECONDS
+
+
+def test_metrics_are_reported_when_a_run_quits(tmp_path):
+    metrics_file = tmp_path / "metrics.txt"
+    env = {**os.environ, "OPENAI_API_KEY": "test"}
+
+    result = run_cli(
+        "batch",
+        str(tmp_path / "missing" / "*.txt"),
+        "--out",
+        str(tmp_path / "out"),
+        "--metrics",
+        "table",
+        "--metrics-file",
+        str(metrics_file),
+        env=env,
+    )
+    assert result.returncode == 1
+    assert "No resumes found" in result.stdout
+    assert metrics_file.exists()
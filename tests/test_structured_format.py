@@ -0,0 +1,148 @@
+import json
+
+import pytest
+
+from aiterate_resume.chat import ChatSession, Console
+from aiterate_resume.compaction import Compactor
+from aiterate_resume.edit_formats import EditFormat, StructuredCodec
+from aiterate_resume.fake_llm import FakeClient, block
+from aiterate_resume.reflection import modify_resume
+from aiterate_resume.search_replace import SearchReplaceResult
+from aiterate_resume.search_replace_format import UnexpectedFenceError
+from aiterate_resume.search_replace_prompts import format_prompt, initial_messages
+from aiterate_resume.structured_format import (
+    RESPONSE_FORMAT,
+    StructuredFormatError,
+    parse_structured_edits,
+    structured_format_prompt,
+)
+
+
+def edits(*results: tuple[str, str]) -> str:
+    return json.dumps(
+        {
+            "edits": [
+                {"search": search, "replace": replace, "reason": "Reason."}
+                for search, replace in results
+            ]
+        }
+    )
+
+
+def test_parses_json():
+    expected = [SearchReplaceResult("a", "b", "Reason.")]
+
+    assert parse_structured_edits(edits(("a", "b"))) == expected
+    assert parse_structured_edits(f"```json\n{edits(('a', 'b'))}\n```") == expected
+    assert parse_structured_edits(edits()) == []
+
+
+def test_falls_back_to_search_replace_blocks():
+    assert parse_structured_edits(block("a", "b")) == [
+        SearchReplaceResult("a", "b", "Reason.")
+    ]
+    with pytest.raises(UnexpectedFenceError):
+        parse_structured_edits("<<<<<<< SEARCH\na\n>>>>>>> REPLACE\n")
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '{"edits": [',
+        '{"changes": []}',
+        '{"edits": {}}',
+        '{"edits": [{"search": "a", "replace": "b"}]}',
+        '{"edits": [{"search": "a", "replace": 1, "reason": "c"}]}',
+    ],
+)
+def test_rejects_invalid_json(text: str):
+    with pytest.raises(StructuredFormatError):
+        parse_structured_edits(text)
+
+
+def test_converts_messages():
+    messages = StructuredCodec().convert_messages(initial_messages("Led a team."))
+    contents = [message.get("content") for message in messages]
+
+    assert structured_format_prompt in contents
+    assert format_prompt not in contents
+    example = next(message for message in messages if message["role"] == "assistant")
+    assert len(parse_structured_edits(str(example.get("content")))) == 2
+
+
+def mangling_model(messages) -> str:
+    """Answers JSON when asked for it, and otherwise mangles its first
+    *SEARCH/REPLACE block* fences (as real models sometimes do) but fixes
+    them when asked to."""
+    if any(message["content"] == structured_format_prompt for message in messages):
+        return edits(("Led a team", "Led a team of five"))
+    if messages[-1]["role"] == "system":
+        return block("Led a team", "Led a team of five")
+    return "<<<<<<< SEARCH\nLed a team\n>>>>>>> REPLACE\n"
+
+
+@pytest.mark.parametrize(
+    "edit_format, requests_per_resume",
+    [(EditFormat.SEARCH_REPLACE, 2), (EditFormat.JSON, 1)],
+)
+def test_json_edits_need_fewer_requests(
+    edit_format: EditFormat, requests_per_resume: int
+):
+    client = FakeClient(mangling_model)
+    for _ in range(3):
+        session = ChatSession(client, Console(quiet=True))
+        resume = "Led a team."
+        changed = modify_resume(
+            session, resume, initial_messages(resume), edit_format=edit_format
+        )
+
+        assert changed == "Led a team of five."
+        assert session.requests_sent == requests_per_resume
+
+    if edit_format == EditFormat.JSON:
+        assert all(
+            request["response_format"] == RESPONSE_FORMAT for request in client.requests
+        )
+
+
+def test_reflects_on_json_errors_as_json():
+    def model(messages) -> str:
+        if messages[-1]["role"] == "system":
+            return edits(("Led a team", "Led a team of five"))
+        return '{"edits": [{"search": "Led a team"}]}'
+
+    session = ChatSession(FakeClient(model), Console(quiet=True))
+    resume = "Led a team."
+    modify_resume(
+        session, resume, initial_messages(resume), edit_format=EditFormat.JSON
+    )
+
+    reflection = str(session.messages[-2].get("content"))
+    assert "JSON object" in reflection
+    assert "SEARCH/REPLACE" not in reflection
+
+
+def test_compacted_repairs_are_written_as_json():
+    client = FakeClient(
+        [
+            edits(("Led the team", "Led a team of five")),
+            edits(("Led a team", "Led a team of five")),
+        ]
+    )
+    session = ChatSession(client, Console(quiet=True))
+    resume = "Led a team."
+    changed = modify_resume(
+        session,
+        resume,
+        initial_messages(resume),
+        compactor=Compactor(),
+        edit_format=EditFormat.JSON,
+    )
+
+    assert changed == "Led a team of five."
+    repair = "\n".join(
+        str(message.get("content")) for message in client.requests[-1]["messages"]
+    )
+    assert structured_format_prompt in repair
+    assert '"search": "Led the team"' in repair
+    assert "<<<<<<< SEARCH" not in repair